@@ -0,0 +1,8 @@
+"""
+Benchmark suite for IwiConnect's hot request paths.
+
+Usage:
+    python -m benchmarks.run                      # default scale, all views
+    python -m benchmarks.run --scale 5 --iterations 50
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files produced by ``benchmarks.run``.
+
+Usage:
+    python -m benchmarks.compare BASELINE.json CANDIDATE.json
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def change(before, after):
+    """Relative change as a signed percentage string"""
+    if not before:
+        return '   n/a'
+    return f'{(after - before) / before * 100:+6.1f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark runs.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    print(f"Baseline:  {baseline['commit']} ({baseline['timestamp']}, scale {baseline['scale']})")
+    print(f"Candidate: {candidate['commit']} ({candidate['timestamp']}, scale {candidate['scale']})")
+    if baseline['scale'] != candidate['scale']:
+        print('Warning: runs used different dataset scales.')
+    print()
+    print(f"{'view':<28} {'p50 ms':>18} {'p90 ms':>18} {'queries':>14} {'alloc KB':>20}")
+
+    for name, after in candidate['views'].items():
+        before = baseline['views'].get(name)
+        if before is None:
+            print(f'{name:<28} (new)')
+            continue
+        row = [f'{name:<28}']
+        for metric in ('p50', 'p90'):
+            b, a = before['latency_ms'][metric], after['latency_ms'][metric]
+            row.append(f'{a:9.2f} {change(b, a)}')
+        b, a = before['queries']['median'], after['queries']['median']
+        row.append(f'{a:>6} ({a - b:+})')
+        b, a = before['peak_alloc_kb']['median'], after['peak_alloc_kb']['median']
+        row.append(f'{a:11.1f} {change(b, a)}')
+        print(' '.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Generate a synthetic dataset for the benchmark runs"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+BENCH_PASSWORD = 'benchpass123'
+
+
+def generate_dataset(scale=1, seed=1234):
+    """Create iwi, hapu, users, leaders, consultations, events and notices.
+
+    Everything is inserted with bulk_create so that building a large dataset
+    does not dominate the benchmark run. Returns a dict of the objects the
+    scenarios need (admin, member, leader, sample proposals, ...).
+    """
+    from core.models import CustomUser, Iwi, Hapu, IwiLeader, HapuLeader
+    from core.search import index_members
+    from consultation.models import Proposal, VotingOption, Vote
+    from events.models import Event, EventParticipant
+    from notice.models import Notice, NoticeAcknowledgment
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(BENCH_PASSWORD)
+
+    iwi_count = 20 * scale
+    hapu_per_iwi = 10
+    user_count = 2000 * scale
+    proposal_count = 50 * scale
+    event_count = 200 * scale
+    notice_count = 200 * scale
+
+    # MySQL does not return primary keys from bulk_create, so every batch is
+    # re-read before it is used as a foreign key target.
+    Iwi.objects.bulk_create([
+        Iwi(name=f'Bench Iwi {i}', description=f'Benchmark iwi {i}')
+        for i in range(iwi_count)
+    ])
+    iwis = list(Iwi.objects.filter(name__startswith='Bench Iwi ').order_by('pk'))
+    Hapu.objects.bulk_create([
+        Hapu(iwi=iwi, name=f'Bench Hapu {iwi.pk}-{j}', description='')
+        for iwi in iwis for j in range(hapu_per_iwi)
+    ])
+    hapus = list(Hapu.objects.filter(name__startswith='Bench Hapu ').order_by('pk'))
+
+    admin = CustomUser.objects.create_superuser(
+        email='bench-admin@example.com', password=BENCH_PASSWORD,
+        full_name='Bench Admin', state='VERIFIED',
+    )
+    states = ['VERIFIED'] * 8 + ['PENDING_VERIFICATION', 'REJECTED']
+    users = []
+    for i in range(user_count):
+        hapu = rng.choice(hapus)
+        users.append(CustomUser(
+            email=f'bench-user-{i}@example.com',
+            full_name=f'Bench User {i}',
+            password=password,
+            iwi_id=hapu.iwi_id,
+            hapu=hapu,
+            state=states[i % len(states)],
+        ))
+    CustomUser.objects.bulk_create(users, batch_size=1000)
+    users = list(CustomUser.objects.filter(email__startswith='bench-user-').order_by('pk'))
+    index_members([user.pk for user in users])
+    member = users[0]
+    member.state = 'VERIFIED'
+    member.save(update_fields=['state'])
+
+    leader = users[1]
+    IwiLeader.objects.create(iwi_id=leader.iwi_id, user=leader)
+    HapuLeader.objects.create(hapu_id=leader.hapu_id, user=leader)
+    IwiLeader.objects.bulk_create([
+        IwiLeader(iwi=iwi, user=rng.choice(users)) for iwi in iwis
+    ], ignore_conflicts=True)
+    HapuLeader.objects.bulk_create([
+        HapuLeader(hapu=hapu, user=rng.choice(users)) for hapu in hapus
+    ], ignore_conflicts=True)
+
+    proposals = []
+    for i in range(proposal_count):
+        kind = ['PUBLIC', 'IWI', 'HAPU'][i % 3]
+        hapu = rng.choice(hapus)
+        if i % 2:
+            start, end = now - timedelta(days=10), now - timedelta(days=1)
+        else:
+            start, end = now - timedelta(days=1), now + timedelta(days=10)
+        proposals.append(Proposal(
+            title=f'Bench Consultation {i}',
+            description='Benchmark consultation description.',
+            consultation_type=kind,
+            iwi_id=hapu.iwi_id if kind != 'PUBLIC' else None,
+            hapu=hapu if kind == 'HAPU' else None,
+            start_date=start,
+            end_date=end,
+            enable_comments=True,
+            is_draft=False,
+            created_by=admin,
+        ))
+    Proposal.objects.bulk_create(proposals)
+    proposals = list(Proposal.objects.filter(title__startswith='Bench Consultation ').order_by('pk'))
+    VotingOption.objects.bulk_create([
+        VotingOption(proposal=proposal, text=text)
+        for proposal in proposals for text in ('Yes', 'No', 'Abstain', 'Defer')
+    ])
+    options_by_proposal = {}
+    for option in VotingOption.objects.filter(proposal__in=proposals):
+        options_by_proposal.setdefault(option.proposal_id, []).append(option)
+
+    public_active = next(p for p in proposals if p.consultation_type == 'PUBLIC' and p.end_date > now)
+    public_past = next(p for p in proposals if p.consultation_type == 'PUBLIC' and p.end_date < now)
+    voters = rng.sample(users, min(len(users), 500 * scale))
+    Vote.objects.bulk_create([
+        Vote(proposal=public_past, user=voter, voting_option=rng.choice(options_by_proposal[public_past.pk]))
+        for voter in voters
+    ], batch_size=1000)
+
+    Event.objects.bulk_create([
+        Event(
+            title=f'Bench Event {i}',
+            description='Benchmark event description.',
+            start_datetime=now + timedelta(days=i % 60, hours=1),
+            end_datetime=now + timedelta(days=i % 60, hours=3),
+            location_type='PHYSICAL' if i % 2 else 'ONLINE',
+            location='Marae' if i % 2 else '',
+            online_url='' if i % 2 else 'https://example.com/meeting',
+            visibility='PUBLIC',
+            created_by=admin,
+        )
+        for i in range(event_count)
+    ])
+    events = list(Event.objects.filter(title__startswith='Bench Event ').order_by('pk'))
+    EventParticipant.objects.bulk_create([
+        EventParticipant(event=rng.choice(events), user=rng.choice(users))
+        for _ in range(event_count * 5)
+    ], ignore_conflicts=True)
+
+    notices = []
+    for i in range(notice_count):
+        audience = ['ALL', 'IWI', 'HAPU'][i % 3]
+        hapu = rng.choice(hapus)
+        notices.append(Notice(
+            title=f'Bench Notice {i}',
+            content='Benchmark notice content.',
+            expiry_date=now + timedelta(days=1 + i % 30) if i % 4 else now - timedelta(days=1),
+            audience=audience,
+            iwi_id=hapu.iwi_id if audience != 'ALL' else None,
+            hapu=hapu if audience == 'HAPU' else None,
+            created_by=admin,
+            priority=1 + i % 10,
+        ))
+    Notice.objects.bulk_create(notices)
+    notices = list(Notice.objects.filter(title__startswith='Bench Notice ').order_by('pk'))
+    NoticeAcknowledgment.objects.bulk_create([
+        NoticeAcknowledgment(notice=rng.choice(notices), user=rng.choice(users))
+        for _ in range(notice_count * 20)
+    ], ignore_conflicts=True, batch_size=1000)
+
+    return {
+        'admin': admin,
+        'member': member,
+        'leader': leader,
+        'iwi': iwis[0],
+        'active_proposal': public_active,
+        'past_proposal': public_past,
+    }
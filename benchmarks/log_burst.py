@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Measure request latency while other threads write a burst of log records.
+
+Requests go through the Django test client and, like the email paths, log
+a record from the request thread. Meanwhile --burst-threads threads each
+write --records records to the same logger. Every write and flush of the
+log file is delayed by --disk-delay milliseconds to stand in for a slow or
+busy disk. Each handler mode is measured in turn:
+
+    file     logging.FileHandler on the calling thread (the previous setup)
+    queue    core.logs.QueueFileHandler writing one record at a time
+    batched  core.logs.QueueFileHandler writing everything queued at once
+
+Usage:
+    python -m benchmarks.log_burst [--requests N] [--burst-threads N] [--records N] [--disk-delay MS] [--output FILE]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.append(str(BASE_DIR))
+
+MODES = ('file', 'queue', 'batched')
+
+
+class SlowStream:
+    """Wraps a file stream so that every write and flush takes at least ``delay`` seconds"""
+
+    def __init__(self, stream, delay):
+        self._stream = stream
+        self._delay = delay
+
+    def write(self, text):
+        time.sleep(self._delay)
+        return self._stream.write(text)
+
+    def flush(self):
+        time.sleep(self._delay)
+        return self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def make_handler(mode, path, delay):
+    from core.logs import JsonFormatter, QueueFileHandler
+
+    if mode == 'file':
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(JsonFormatter())
+        target = handler
+    else:
+        handler = QueueFileHandler(path, max_bytes=0, batch_size=1 if mode == 'queue' else 500)
+        target = handler.target
+    target.stream = SlowStream(target.stream, delay)
+    return handler
+
+
+def burst(logger, records, start):
+    start.wait()
+    for number in range(records):
+        logger.info('Welcome email sent to member%s@example.com', number, extra={'email_type': 'welcome'})
+
+
+def run_mode(mode, url, args):
+    from django.test import Client
+    from benchmarks.run import percentile
+
+    logger = logging.getLogger('core.views')
+    saved = logger.handlers[:], logger.propagate, logger.level
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'email.log')
+        handler = make_handler(mode, path, args.disk_delay / 1000)
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        client = Client()
+        try:
+            for _ in range(3):
+                client.get(url)
+            start = threading.Event()
+            threads = [
+                threading.Thread(target=burst, args=(logger, args.records, start))
+                for _ in range(args.burst_threads)
+            ]
+            for thread in threads:
+                thread.start()
+            started = time.perf_counter()
+            start.set()
+            timings = []
+            for number in range(args.requests):
+                began = time.perf_counter()
+                client.get(url)
+                logger.info('Approval email sent to request%s@example.com', number)
+                timings.append((time.perf_counter() - began) * 1000)
+            for thread in threads:
+                thread.join()
+            logged = time.perf_counter() - started
+            handler.close()
+            written = time.perf_counter() - started
+        finally:
+            logger.handlers, logger.propagate, logger.level = saved
+        with open(path, encoding='utf-8') as file:
+            lines = sum(1 for _ in file)
+
+    return {
+        'latency_ms': {
+            'p50': percentile(timings, 50),
+            'p90': percentile(timings, 90),
+            'p99': percentile(timings, 99),
+            'max': max(timings),
+        },
+        'records': lines,
+        'burst_seconds': logged,
+        'written_seconds': written,
+        'records_per_second': lines / written if written else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Request latency under a burst of log writes.')
+    parser.add_argument('--requests', type=int, default=100, help='Measured requests per mode (default: 100)')
+    parser.add_argument('--burst-threads', type=int, default=4, help='Threads writing log records (default: 4)')
+    parser.add_argument('--records', type=int, default=500, help='Records written by each thread (default: 500)')
+    parser.add_argument('--disk-delay', type=float, default=1.0, help='Milliseconds added to every write and flush (default: 1.0)')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated subset of: ' + ', '.join(MODES))
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Unknown mode(s): {', '.join(unknown)}")
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iwi_web_app.settings')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment, teardown_test_environment, setup_databases, teardown_databases
+    from django.urls import reverse
+    from core.models import Iwi, Hapu
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        iwi = Iwi.objects.create(name='Benchmark Iwi')
+        Hapu.objects.bulk_create([Hapu(iwi=iwi, name=f'Hapu {number}') for number in range(20)])
+        url = f"{reverse('get_hapus')}?iwi_id={iwi.pk}"
+        results = {}
+        for mode in modes:
+            results[mode] = run_mode(mode, url, args)
+            latency = results[mode]['latency_ms']
+            print(
+                f"{mode:<8} p50 {latency['p50']:8.2f}ms  p90 {latency['p90']:8.2f}ms  p99 {latency['p99']:8.2f}ms  "
+                f"max {latency['max']:8.2f}ms  {results[mode]['records']} records in "
+                f"{results[mode]['written_seconds']:.2f}s ({results[mode]['records_per_second']:.0f}/s)"
+            )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'requests': args.requests,
+            'burst_threads': args.burst_threads,
+            'records': args.records,
+            'disk_delay_ms': args.disk_delay,
+            'modes': results,
+        }, indent=2))
+        print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
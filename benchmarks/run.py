@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Drive the hot request paths through the Django test client and record
+latency percentiles, query counts and allocations per view.
+
+The run happens against a throwaway test database (the same one
+``manage.py test`` would create), so it never touches real data.
+
+Usage:
+    python -m benchmarks.run [--scale N] [--iterations N] [--views a,b] [--output FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+
+sys.path.append(str(BASE_DIR))
+
+
+def scenarios(data):
+    """Map view name -> (user to log in as or None, url)"""
+    from django.urls import reverse
+
+    return {
+        'dashboard': (data['admin'], reverse('dashboard')),
+        'active_consultations': (data['member'], reverse('consultation:active_consultations')),
+        'member_consultation_detail': (
+            data['member'],
+            reverse('consultation:member_consultation_detail', args=[data['active_proposal'].pk]),
+        ),
+        'consultation_result': (
+            data['member'],
+            reverse('consultation:consultation_result', args=[data['past_proposal'].pk]),
+        ),
+        'event_list_json': (data['member'], reverse('events:event_list_json')),
+        'notice_list': (data['member'], reverse('notice:notice_list')),
+        'get_hapus': (None, f"{reverse('get_hapus')}?iwi_id={data['iwi'].pk}"),
+        'member_search': (data['admin'], f"{reverse('usermgmt:member_search')}?q=1234"),
+    }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(client, url, iterations, warmup):
+    """Request ``url`` repeatedly and summarise the timings"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    query_counts = []
+    status_code = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        status_code = response.status_code
+        timings.append(elapsed * 1000)
+        query_counts.append(len(queries))
+
+    # Allocations are traced in a separate pass so tracemalloc's overhead
+    # does not leak into the latency figures.
+    peak_allocations = []
+    for _ in range(min(iterations, 5)):
+        tracemalloc.start()
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_allocations.append(peak / 1024)
+
+    return {
+        'status_code': status_code,
+        'iterations': iterations,
+        'latency_ms': {
+            'mean': statistics.mean(timings),
+            'p50': percentile(timings, 50),
+            'p90': percentile(timings, 90),
+            'p99': percentile(timings, 99),
+            'max': max(timings),
+        },
+        'queries': {
+            'median': statistics.median(query_counts),
+            'max': max(query_counts),
+        },
+        'peak_alloc_kb': {
+            'median': statistics.median(peak_allocations),
+            'max': max(peak_allocations),
+        },
+    }
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or 'unknown'"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot request paths.')
+    parser.add_argument('--scale', type=int, default=1, help='Dataset size multiplier (default: 1)')
+    parser.add_argument('--iterations', type=int, default=30, help='Measured requests per view (default: 30)')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per view (default: 3)')
+    parser.add_argument('--views', help='Comma-separated subset of views to run')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<timestamp>-<commit>.json)')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iwi_web_app.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment, setup_databases, teardown_databases
+    from benchmarks.dataset import generate_dataset
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        started = time.perf_counter()
+        data = generate_dataset(scale=args.scale)
+        dataset_seconds = time.perf_counter() - started
+        print(f'Generated dataset (scale {args.scale}) in {dataset_seconds:.1f}s')
+
+        available = scenarios(data)
+        selected = args.views.split(',') if args.views else list(available)
+        unknown = [name for name in selected if name not in available]
+        if unknown:
+            parser.error(f"Unknown view(s): {', '.join(unknown)}")
+
+        results = {}
+        for name in selected:
+            user, url = available[name]
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            results[name] = measure(client, url, args.iterations, args.warmup)
+            latency = results[name]['latency_ms']
+            print(
+                f"{name:<28} p50 {latency['p50']:8.2f}ms  p90 {latency['p90']:8.2f}ms  "
+                f"p99 {latency['p99']:8.2f}ms  queries {results[name]['queries']['median']:>5}  "
+                f"alloc {results[name]['peak_alloc_kb']['median']:9.1f}KB"
+            )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+    commit = git_commit()
+    timestamp = datetime.now(dt_timezone.utc)
+    report = {
+        'commit': commit,
+        'timestamp': timestamp.isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'scale': args.scale,
+        'dataset_seconds': dataset_seconds,
+        'views': results,
+    }
+    if args.output:
+        output = Path(args.output)
+    else:
+        output = RESULTS_DIR / f"{timestamp.strftime('%Y%m%dT%H%M%S')}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,8 @@ from django.db.models import Q, Count
 from .forms import ProposalForm
 from .models import Proposal, VotingOption, Vote, ProposalComment, Iwi, Hapu
 from core.models import CustomUser
+from core.hierarchy import get_hierarchy, set_cached_choices
+from core.roles import get_role_profile
 from functools import wraps
 from django.core.paginator import Paginator
 
@@ -14,9 +16,10 @@ def is_leader(user, iwi_id=None, hapu_id=None):
         return False
     if user.is_staff:
         return True
-    if iwi_id and user.iwi_leaderships.filter(iwi_id=iwi_id).exists():
+    profile = get_role_profile(user)
+    if iwi_id and profile.leads_iwi(iwi_id):
         return True
-    if hapu_id and user.hapu_leaderships.filter(hapu_id=hapu_id).exists():
+    if hapu_id and profile.leads_hapu(hapu_id):
         return True
     return False
 
@@ -44,24 +47,28 @@ def create_proposal(request):
         initial['hapu'] = hapu_id
     # Set allowed consultation types and queryset restrictions
     allowed_types = [('PUBLIC', 'Public'), ('IWI', 'Restricted to Iwi'), ('HAPU', 'Restricted to Hapu')]
+    hierarchy = get_hierarchy()
     iwi_qs = Iwi.objects.filter(is_archived=False)
     hapu_qs = Hapu.objects.filter(is_archived=False)
+    iwi_rows = hierarchy.iwi_rows()
+    hapu_rows = hierarchy.hapu_rows()
     if not is_admin:
-        iwi_ids = list(user.iwi_leaderships.values_list('iwi_id', flat=True))
-        hapu_ids = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+        profile = get_role_profile(user)
+        iwi_ids = sorted(profile.iwi_ids)
+        hapu_ids = sorted(profile.hapu_ids)
         # Only include non-archived iwis
-        active_iwis = list(Iwi.objects.filter(id__in=iwi_ids, is_archived=False))
-        active_hapus = list(Hapu.objects.filter(id__in=hapu_ids, is_archived=False))
+        active_iwis = iwi_rows = hierarchy.iwi_rows(iwi_ids)
+        active_hapus = hapu_rows = hierarchy.hapu_rows(ids=hapu_ids)
         if active_iwis:
-            iwi_qs = Iwi.objects.filter(id__in=[iwi.id for iwi in active_iwis], is_archived=False)
+            iwi_qs = Iwi.objects.filter(id__in=[iwi['id'] for iwi in active_iwis], is_archived=False)
         else:
             iwi_qs = Iwi.objects.none()
         if active_hapus:
-            hapu_qs = Hapu.objects.filter(id__in=[hapu.id for hapu in active_hapus], is_archived=False)
+            hapu_qs = Hapu.objects.filter(id__in=[hapu['id'] for hapu in active_hapus], is_archived=False)
         else:
             hapu_qs = Hapu.objects.none()
         # Determine allowed_types
-        if active_iwis and len(iwi_ids) == 1 and Iwi.objects.filter(id=iwi_ids[0], is_archived=True).exists():
+        if active_iwis and len(iwi_ids) == 1 and not hierarchy.iwi_rows(iwi_ids[:1]):
             # Only one iwi, and it is archived: do not allow IWI
             allowed_types = [('HAPU', 'Restricted to Hapu')] if active_hapus else []
         elif active_iwis and active_hapus:
@@ -95,6 +102,8 @@ def create_proposal(request):
             form.fields['iwi'].queryset = iwi_qs
             form.fields['hapu'].queryset = hapu_qs
             form.fields['consultation_type'].choices = allowed_types
+            set_cached_choices(form.fields['iwi'], iwi_rows)
+            set_cached_choices(form.fields['hapu'], hapu_rows, label_key='label')
             return render(request, 'consultation/create_proposal.html', {'form': form})
     else:
         form = ProposalForm(initial=initial)
@@ -105,13 +114,19 @@ def create_proposal(request):
         if iwi_id:
             form.fields['iwi'].queryset = Iwi.objects.filter(id=iwi_id)
             form.fields['hapu'].queryset = Hapu.objects.filter(iwi_id=iwi_id, is_archived=False)
+            iwi_rows = hierarchy.iwi_rows([iwi_id])
+            hapu_rows = hierarchy.hapu_rows(iwi_ids=[iwi_id])
         if hapu_id:
-            hapu = Hapu.objects.filter(id=hapu_id, is_archived=False).first()
-            if hapu:
-                form.fields['iwi'].initial = hapu.iwi.id
-                form.fields['iwi'].queryset = Iwi.objects.filter(id=hapu.iwi.id)
+            hapu_rows = hierarchy.hapu_rows(ids=[hapu_id])
+            if hapu_rows:
+                hapu = hapu_rows[0]
+                form.fields['iwi'].initial = hapu['iwi_id']
+                form.fields['iwi'].queryset = Iwi.objects.filter(id=hapu['iwi_id'])
                 form.fields['iwi'].disabled = True
+                iwi_rows = [{'id': hapu['iwi_id'], 'name': hapu['iwi_name']}]
             form.fields['hapu'].queryset = Hapu.objects.filter(id=hapu_id, is_archived=False)
+        set_cached_choices(form.fields['iwi'], iwi_rows)
+        set_cached_choices(form.fields['hapu'], hapu_rows, label_key='label')
     return render(request, 'consultation/create_proposal.html', {'form': form})
 
 @user_passes_test(is_leader)
@@ -151,7 +166,7 @@ def active_consultations(request):
         # Regular users see consultations based on their access level
         user_iwi = user.iwi
         # Get all hapus where the user is a leader
-        leader_hapus = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+        leader_hapus = sorted(get_role_profile(user).hapu_ids)
         # Also include user's main hapu if set
         if user.hapu and user.hapu.id not in leader_hapus:
             leader_hapus.append(user.hapu.id)
@@ -211,7 +226,7 @@ def member_consultation_detail(request, pk):
         # Regular users can only access consultations they're supposed to see
         user_iwi = user.iwi
         # Get all hapus where the user is a leader
-        leader_hapus = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+        leader_hapus = sorted(get_role_profile(user).hapu_ids)
         if user.hapu and user.hapu.id not in leader_hapus:
             leader_hapus.append(user.hapu.id)
         
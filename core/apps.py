@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect the cache invalidation signal handlers
+        from . import hierarchy, membership, roles, stats, storage  # noqa: F401
+        stats.connect_signals()
+        membership.connect_signals()
+        # Reference counts of deduplicated attachments
+        storage.connect_signals()
+        # Name and email words of the member search
+        from . import search
+        search.connect_signals()
+        # Vote counter of the /metrics endpoint
+        from . import metrics
+        metrics.connect_signals()
@@ -0,0 +1,83 @@
+"""
+Set-based archiving and transfer of iwi and hapu.
+
+Archiving an iwi together with its hapu, or moving many hapu to another
+iwi, is done with a fixed number of UPDATE statements in one transaction
+rather than one save() per row. Queryset updates do not send model signals,
+so the caches and statistics that normally follow Iwi and Hapu saves are
+refreshed explicitly once the transaction commits.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import hierarchy, stats
+from .membership import schedule_refresh
+from .models import Iwi, Hapu
+
+
+def _changed(iwi_ids=()):
+    def invalidate():
+        hierarchy.invalidate()
+        stats.invalidate()
+
+    transaction.on_commit(invalidate)
+    # Hapu counts per iwi only change when hapu move between iwi
+    schedule_refresh(iwi_ids=iwi_ids)
+
+
+def archive_iwi(iwi, archived_by=None, include_hapus=False):
+    """Archive ``iwi`` and, optionally, all of its active hapu.
+
+    Cascaded hapu share the iwi's archived_at timestamp so unarchive_iwi can
+    tell them apart from hapu archived on their own. Returns the number of
+    hapu archived.
+    """
+    now = timezone.now()
+    fields = {'is_archived': True, 'archived_at': now, 'archived_by': archived_by}
+    archived = 0
+    with transaction.atomic():
+        Iwi.objects.filter(pk=iwi.pk).update(**fields)
+        if include_hapus:
+            archived = Hapu.objects.filter(iwi_id=iwi.pk, is_archived=False).update(**fields)
+        _changed()
+    iwi.is_archived = True
+    iwi.archived_at = now
+    iwi.archived_by = archived_by
+    return archived
+
+
+def unarchive_iwi(iwi, include_hapus=False):
+    """Unarchive ``iwi`` and, optionally, the hapu archived along with it.
+
+    Returns the number of hapu restored.
+    """
+    fields = {'is_archived': False, 'archived_at': None, 'archived_by': None}
+    restored = 0
+    with transaction.atomic():
+        if include_hapus and iwi.archived_at is not None:
+            restored = cascaded_hapus(iwi).update(**fields)
+        Iwi.objects.filter(pk=iwi.pk).update(**fields)
+        _changed()
+    iwi.is_archived = False
+    iwi.archived_at = None
+    iwi.archived_by = None
+    return restored
+
+
+def cascaded_hapus(iwi):
+    """Archived hapu of ``iwi`` that were archived together with it"""
+    return Hapu.objects.filter(iwi_id=iwi.pk, is_archived=True, archived_at=iwi.archived_at)
+
+
+def transfer_hapus(hapu_ids, new_iwi):
+    """Move the hapu in ``hapu_ids`` to ``new_iwi`` with a single UPDATE.
+
+    Returns the number of hapu moved.
+    """
+    with transaction.atomic():
+        hapus = Hapu.objects.filter(pk__in=hapu_ids).exclude(iwi_id=new_iwi.pk)
+        old_iwi_ids = set(hapus.order_by().values_list('iwi_id', flat=True).distinct())
+        moved = hapus.update(iwi=new_iwi)
+        if moved:
+            _changed(old_iwi_ids | {new_iwi.pk})
+    return moved
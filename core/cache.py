@@ -0,0 +1,111 @@
+"""
+Namespaced access to the shared cache.
+
+Each subsystem (the iwi/hapu hierarchy, role profiles, dashboard counters,
+...) gets its own Namespace. Keys are prefixed with the namespace name and
+a version token stored in the cache itself; invalidating a namespace
+replaces the token, which orphans every key written under the old one in a
+single write. Because the token lives in the shared backend, every worker
+process sees the invalidation immediately.
+"""
+import logging
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Hit/miss counters for this process, keyed by namespace name
+_counters = {}
+_counters_lock = threading.Lock()
+_lookups = 0
+LOG_STATS_EVERY = 1000
+
+
+class Namespace:
+    """A versioned group of cache keys belonging to one subsystem"""
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._version_key = f'{name}:version'
+
+    def version(self):
+        """The current version token, creating one if the namespace is new"""
+        token = cache.get(self._version_key)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not cache.add(self._version_key, token, None):
+                token = cache.get(self._version_key) or token
+        return token
+
+    def make_key(self, key):
+        if isinstance(key, (tuple, list)):
+            key = ':'.join(str(part) for part in key)
+        return f'{self.name}:{self.version()}:{key}'
+
+    def get(self, key, default=None):
+        value = cache.get(self.make_key(key), _MISSING)
+        _record(self.name, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        cache.set(self.make_key(key), value, timeout)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        """Return the cached value, computing and storing ``default()`` on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default()
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, key):
+        cache.delete(self.make_key(key))
+
+    def invalidate(self):
+        """Orphan every key in the namespace"""
+        cache.set(self._version_key, uuid.uuid4().hex, None)
+
+
+def invalidate_on_change(namespace, *models):
+    """Invalidate ``namespace`` whenever an instance of ``models`` is saved or deleted"""
+    def handler(sender, **kwargs):
+        namespace.invalidate()
+        # Another process may rebuild the namespace from the data as it was
+        # before this transaction commits; invalidate again once it has
+        transaction.on_commit(namespace.invalidate)
+
+    for model in models:
+        for signal in (post_save, post_delete):
+            signal.connect(
+                handler, sender=model, weak=False,
+                dispatch_uid=f'cache-{namespace.name}-{model._meta.label}-{id(signal)}',
+            )
+
+
+def _record(name, hit):
+    global _lookups
+    with _counters_lock:
+        counter = _counters.setdefault(name, {'hits': 0, 'misses': 0})
+        counter['hits' if hit else 'misses'] += 1
+        _lookups += 1
+        should_log = _lookups % LOG_STATS_EVERY == 0
+    if should_log:
+        logger.info('Cache stats: %s', ', '.join(
+            f"{name} {c['hits']}/{c['hits'] + c['misses']} hits" for name, c in stats().items()
+        ))
+
+
+def stats():
+    """Hit/miss counts per namespace for this process"""
+    with _counters_lock:
+        return {name: dict(counter) for name, counter in _counters.items()}
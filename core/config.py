@@ -59,4 +59,80 @@ class Config:
 
     @staticmethod
     def get_email_use_ssl():
-        return os.getenv('EMAIL_USE_SSL', 'False').lower() == 'true' 
\ No newline at end of file
+        return os.getenv('EMAIL_USE_SSL', 'False').lower() == 'true'
+
+    @staticmethod
+    def get_cache_backend():
+        return os.getenv('CACHE_BACKEND', 'file').lower()
+
+    @staticmethod
+    def get_cache_location():
+        return os.getenv('CACHE_LOCATION', '')
+
+    @staticmethod
+    def get_notice_ack_buffer_size():
+        return int(os.getenv('NOTICE_ACK_BUFFER_SIZE', '0'))
+
+    @staticmethod
+    def get_notice_ack_flush_interval():
+        return float(os.getenv('NOTICE_ACK_FLUSH_INTERVAL', '5'))
+
+    @staticmethod
+    def get_notice_archive_retention_days():
+        return int(os.getenv('NOTICE_ARCHIVE_RETENTION_DAYS', '90'))
+
+    @staticmethod
+    def get_protected_file_server():
+        return os.getenv('PROTECTED_FILE_SERVER', '').lower()
+
+    @staticmethod
+    def get_protected_file_accel_prefix():
+        return os.getenv('PROTECTED_FILE_ACCEL_PREFIX', '/protected-media/')
+
+    @staticmethod
+    def get_document_url_max_age():
+        return int(os.getenv('DOCUMENT_URL_MAX_AGE', '300'))
+
+    @staticmethod
+    def get_max_upload_size_mb():
+        return int(os.getenv('MAX_UPLOAD_SIZE_MB', '20'))
+
+    @staticmethod
+    def get_chunked_upload_dir():
+        return os.getenv('CHUNKED_UPLOAD_DIR', '')
+
+    @staticmethod
+    def get_chunked_upload_expiry_hours():
+        return int(os.getenv('CHUNKED_UPLOAD_EXPIRY_HOURS', '24'))
+
+    @staticmethod
+    def get_anonymous_uploads_per_ip():
+        return int(os.getenv('ANONYMOUS_UPLOADS_PER_IP', '10'))
+
+    @staticmethod
+    def get_anonymous_upload_limit_mb():
+        return int(os.getenv('ANONYMOUS_UPLOAD_LIMIT_MB', '1000'))
+
+    @staticmethod
+    def get_log_rotation():
+        return os.getenv('LOG_ROTATION', 'size').lower()
+
+    @staticmethod
+    def get_log_max_mb():
+        return int(os.getenv('LOG_MAX_MB', '50'))
+
+    @staticmethod
+    def get_log_backup_count():
+        return int(os.getenv('LOG_BACKUP_COUNT', '10'))
+
+    @staticmethod
+    def get_metrics_dir():
+        return os.getenv('METRICS_DIR', '')
+
+    @staticmethod
+    def get_metrics_flush_interval():
+        return float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+    @staticmethod
+    def get_metrics_token():
+        return os.getenv('METRICS_TOKEN', '')
@@ -0,0 +1,144 @@
+"""
+Signed, short-lived links to protected files and their delivery.
+
+A document link carries a signature binding the document owner, the viewer
+and the time it was issued, so it cannot be shared or reused once it
+expires (DOCUMENT_URL_MAX_AGE). Permission is checked when the link is
+issued; serving only verifies the signature.
+
+When PROTECTED_FILE_SERVER is set, the response only names the file in an
+X-Accel-Redirect or X-Sendfile header and the web server streams it, which
+frees the application worker straight away. Otherwise Django serves the file
+itself, honouring conditional requests and single byte ranges so that PDF
+viewers can fetch pages on demand and re-opened documents are revalidated
+rather than downloaded again.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.signing import BadSignature, TimestampSigner
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .roles import get_role_profile
+
+CHUNK_SIZE = 64 * 1024
+
+_signer = TimestampSigner(salt='core.documents')
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_view_document(viewer, owner):
+    """Whether ``viewer`` may see ``owner``'s citizenship document"""
+    if viewer.pk == owner.pk or viewer.is_staff:
+        return True
+    return owner.hapu_id is not None and get_role_profile(viewer).leads_hapu(owner.hapu_id)
+
+
+def signed_document_url(owner, viewer, thumbnail=False):
+    """A link to ``owner``'s document (or its thumbnail) that only ``viewer`` can open, valid for DOCUMENT_URL_MAX_AGE"""
+    token = _signer.sign(f'{owner.pk}.{viewer.pk}')
+    view = 'usermgmt:citizenship_document_thumbnail' if thumbnail else 'usermgmt:citizenship_document'
+    return reverse(view, args=[token])
+
+
+def document_owner_id(token, viewer):
+    """The owner id a link was issued for; raises BadSignature if it is invalid, expired or not ``viewer``'s"""
+    value = _signer.unsign(token, max_age=settings.DOCUMENT_URL_MAX_AGE)
+    owner_id, viewer_id = value.split('.')
+    if int(viewer_id) != viewer.pk:
+        raise BadSignature('Document link was issued to another user')
+    return int(owner_id)
+
+
+def _byte_range(header, size):
+    """(start, end) of a single-range Range header, None to send everything, or False if unsatisfiable"""
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        # Multiple or malformed ranges: a full response is always acceptable
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_protected_file(request, name):
+    """Response delivering the MEDIA_ROOT-relative file ``name``"""
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        raise Http404()
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    if settings.PROTECTED_FILE_SERVER == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.PROTECTED_FILE_ACCEL_PREFIX + quote(name)
+    elif settings.PROTECTED_FILE_SERVER == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = _django_response(request, path, stat.st_size, content_type, etag, last_modified)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = 'inline'
+    # The file is only reachable through a link that expires, so only the viewer's browser may keep it
+    patch_cache_control(response, private=True, max_age=settings.DOCUMENT_URL_MAX_AGE)
+    return response
+
+
+def _django_response(request, path, size, content_type, etag, last_modified):
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and _if_range_matches(request, etag, last_modified):
+        byte_range = _byte_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    response = StreamingHttpResponse(_read(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A Range only applies if an If-Range validator still matches the file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
@@ -1,5 +1,8 @@
 from django import forms
 from .models import CustomUser, Iwi, Hapu
+from .hierarchy import get_hierarchy, set_cached_choices
+from .uploads import max_size_label
+from django.conf import settings
 
 class RegistrationForm(forms.ModelForm):
     password = forms.CharField(
@@ -16,7 +19,7 @@ class RegistrationForm(forms.ModelForm):
     )
     citizenship_document = forms.FileField(
         required=True,
-        help_text='Upload a PDF, JPG, or PNG (max 2MB).',
+        help_text=f'Upload a PDF, JPG, or PNG (max {max_size_label()}).',
         widget=forms.ClearableFileInput(attrs={
             'accept': '.pdf,.jpg,.jpeg,.png',
             'required': True,
@@ -52,12 +55,13 @@ class RegistrationForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Only show non-archived iwis in the dropdown
         self.fields['iwi'].queryset = Iwi.objects.filter(is_archived=False)
+        set_cached_choices(self.fields['iwi'], get_hierarchy().iwi_rows())
 
     def clean_citizenship_document(self):
         doc = self.cleaned_data.get('citizenship_document')
         if doc:
-            if doc.size > 2 * 1024 * 1024:
-                raise forms.ValidationError('File size must be under 2MB.')
+            if doc.size > settings.MAX_UPLOAD_SIZE:
+                raise forms.ValidationError(f'File size must be under {max_size_label()}.')
             valid_types = ['application/pdf', 'image/jpeg', 'image/png']
             if hasattr(doc, 'content_type') and doc.content_type not in valid_types:
                 raise forms.ValidationError('Only PDF, JPG, or PNG files are allowed.')
@@ -0,0 +1,117 @@
+"""
+Cached snapshot of the iwi/hapu hierarchy.
+
+The registration, event, notice and consultation forms and the get_hapus
+APIs all need the list of active iwi and hapu. Rather than re-querying on
+every request (and on every HTMX keystroke), a snapshot is built once with
+two queries and reused until an Iwi or Hapu is saved or deleted, which bumps
+the version and forces a rebuild on next use.
+
+The version lives in the shared cache so all worker processes agree on it
+(and on the ETags derived from it); each process keeps the decoded snapshot
+in memory for as long as the shared version is unchanged.
+"""
+from .cache import Namespace, invalidate_on_change
+from .models import Iwi, Hapu
+
+_namespace = Namespace('hierarchy', timeout=24 * 60 * 60)
+_snapshot = None
+
+
+class Hierarchy:
+    """Immutable snapshot of active iwi and non-archived hapu"""
+
+    def __init__(self, version, iwis, hapus):
+        self.version = version
+        self.iwis = iwis
+        self.hapus = hapus
+        self._hapus_by_iwi = {}
+        for hapu in hapus:
+            self._hapus_by_iwi.setdefault(hapu['iwi_id'], []).append(hapu)
+
+    def hapus_for_iwi(self, iwi_id):
+        """Non-archived hapu of one iwi, as dicts with id and name"""
+        try:
+            iwi_id = int(iwi_id)
+        except (TypeError, ValueError):
+            return []
+        return self._hapus_by_iwi.get(iwi_id, [])
+
+    def iwi_rows(self, ids=None):
+        """Active iwi, optionally limited to ``ids``"""
+        if ids is None:
+            return self.iwis
+        ids = _id_set(ids)
+        return [iwi for iwi in self.iwis if iwi['id'] in ids]
+
+    def hapu_rows(self, ids=None, iwi_ids=None):
+        """Non-archived hapu whose id is in ``ids`` or whose iwi is in ``iwi_ids``.
+
+        With neither argument every non-archived hapu is returned.
+        """
+        if ids is None and iwi_ids is None:
+            return self.hapus
+        ids = _id_set(ids)
+        iwi_ids = _id_set(iwi_ids)
+        return [hapu for hapu in self.hapus if hapu['id'] in ids or hapu['iwi_id'] in iwi_ids]
+
+    def etag(self, *parts):
+        return '"hierarchy-{}"'.format('-'.join([self.version, *map(str, parts)]))
+
+
+def _id_set(values):
+    """Integer ids from ``values``, skipping anything that is not a valid id"""
+    ids = set()
+    for value in values or ():
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _load():
+    iwis = list(Iwi.objects.filter(is_archived=False).order_by('name').values('id', 'name'))
+    hapus = [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'iwi_id': row['iwi_id'],
+            'iwi_name': row['iwi__name'],
+            'label': f"{row['name']} ({row['iwi__name']})",
+        }
+        for row in Hapu.objects.filter(is_archived=False).order_by('name').values('id', 'name', 'iwi_id', 'iwi__name')
+    ]
+    return {'iwis': iwis, 'hapus': hapus}
+
+
+def get_hierarchy():
+    """Return the current snapshot, rebuilding it if it has been invalidated"""
+    global _snapshot
+    version = _namespace.version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    data = _namespace.get_or_set('snapshot', _load)
+    snapshot = _snapshot = Hierarchy(version, data['iwis'], data['hapus'])
+    return snapshot
+
+
+def invalidate():
+    """Discard the cached snapshot; call after changes that bypass model signals"""
+    _namespace.invalidate()
+
+
+def set_cached_choices(field, rows, label_key='name'):
+    """Render a ModelChoiceField from cached rows instead of its queryset.
+
+    The field's queryset is left untouched and still validates submissions,
+    so this must be called after the queryset has been narrowed.
+    """
+    choices = [(row['id'], row[label_key]) for row in rows]
+    if field.empty_label is not None:
+        choices.insert(0, ('', field.empty_label))
+    field.choices = choices
+
+
+invalidate_on_change(_namespace, Iwi, Hapu)
@@ -0,0 +1,190 @@
+"""
+Structured, rotated log files written off the request thread.
+
+Each record is written as one JSON object per line (ts, level, logger,
+message, plus exception text and any ``extra`` fields), so view_logs.py can
+filter by level, logger and time without parsing free text.
+
+Files rotate by size (LOG_MAX_BYTES) or, when LOG_ROTATION names a
+TimedRotatingFileHandler interval such as 'midnight', by time, keeping
+LOG_BACKUP_COUNT old files. 'external' leaves rotation to logrotate and
+reopens the file when it is moved. Use this when several worker processes
+write to the same file, because in-process rotation is not coordinated
+between processes.
+
+Logging calls only put the record on a queue. A listener thread per
+handler takes everything waiting in the queue and writes it with a single
+write and flush, so a slow disk or terminal never delays a response. Under
+a burst the number of writes grows with the number of batches, not the
+number of records (see benchmarks/log_burst.py).
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler, WatchedFileHandler,
+)
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def file_handler(filename, rotation='size', max_bytes=50 * 1024 * 1024, backup_count=10):
+    """The handler that writes ``filename``, rotating it as LOG_ROTATION says"""
+    if rotation == 'external':
+        return WatchedFileHandler(filename, encoding='utf-8')
+    if rotation == 'size':
+        return RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    return TimedRotatingFileHandler(filename, when=rotation, backupCount=backup_count, encoding='utf-8', utc=True)
+
+
+_handlers = weakref.WeakSet()
+
+
+def _rotate_if_due(handler, record, size):
+    """Rotate or reopen ``handler``'s file before ``size`` more characters are written, as its own emit() would"""
+    if isinstance(handler, RotatingFileHandler):
+        stream = handler.stream
+        if handler.maxBytes > 0 and stream is not None and 0 < stream.tell() and stream.tell() + size >= handler.maxBytes:
+            handler.doRollover()
+    elif isinstance(handler, TimedRotatingFileHandler):
+        if handler.shouldRollover(record):
+            handler.doRollover()
+    elif isinstance(handler, WatchedFileHandler):
+        handler.reopenIfNeeded()
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that writes every record waiting in the queue (up to batch_size) with one write and one flush"""
+
+    def __init__(self, queue, handler, batch_size=500):
+        super().__init__(queue, handler)
+        self.batch_size = batch_size
+
+    def _monitor(self):
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size and batch[-1] is not self._sentinel:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            if batch[-1] is self._sentinel:
+                batch.pop()
+                stopping = True
+            if batch:
+                self.write(batch)
+
+    def write(self, records):
+        for handler in self.handlers:
+            records = [record for record in records if record.levelno >= handler.level]
+            if not records:
+                continue
+            try:
+                text = ''.join(handler.format(record) + handler.terminator for record in records)
+                handler.acquire()
+                try:
+                    _rotate_if_due(handler, records[-1], len(text))
+                    if handler.stream is None:
+                        handler.stream = handler._open()
+                    handler.stream.write(text)
+                    handler.stream.flush()
+                finally:
+                    handler.release()
+            except Exception:
+                handler.handleError(records[0])
+
+
+class QueuedHandler(QueueHandler):
+    """Queues records for a listener thread that passes them to ``target`` in batches"""
+
+    def __init__(self, target, batch_size=500):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.listener = BatchingQueueListener(self.queue, target, batch_size)
+        self.listener.start()
+        _handlers.add(self)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: the objects they refer to may change before the listener runs
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def flush(self):
+        """Wait until every queued record has been written"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.listener.start()
+        self.target.flush()
+
+    def close(self):
+        # Called by logging.shutdown() at exit, so queued records are written before the process ends
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
+
+
+class QueueFileHandler(QueuedHandler):
+    """JSON lines written to a rotated file by a listener thread"""
+
+    def __init__(self, filename, rotation='size', max_bytes=50 * 1024 * 1024, backup_count=10, batch_size=500):
+        target = file_handler(filename, rotation, max_bytes, backup_count)
+        target.setFormatter(JsonFormatter())
+        super().__init__(target, batch_size)
+
+
+class QueueConsoleHandler(QueuedHandler):
+    """Plain "LEVEL message" lines written to stderr by a listener thread"""
+
+    def __init__(self, batch_size=500):
+        target = logging.StreamHandler()
+        target.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        super().__init__(target, batch_size)
+
+
+def _restart_listeners():
+    # A forked worker inherits the queues but not the listener threads
+    for handler in list(_handlers):
+        if handler.listener._thread is not None:
+            handler.listener._thread = None
+            handler.listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners)
@@ -0,0 +1,106 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import storage
+from core.models import Blob
+
+
+class Command(BaseCommand):
+    help = 'Delete deduplicated attachment blobs that no event or notice has referred to for a grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help='Keep unreferenced blobs for this many hours, covering uploads whose form is still being saved (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute every reference count from the attachment columns first',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without deleting',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        if options['recount']:
+            self.recount(options['dry_run'])
+
+        candidates = list(
+            Blob.objects.filter(ref_count__lte=0, last_used_at__lt=cutoff).values_list('id', 'name', 'size')
+        )
+        # Counts can drift through bulk writes, so never trust a zero without checking the columns
+        referenced = self.still_referenced([name for _, name, _ in candidates])
+        candidates = [candidate for candidate in candidates if candidate[1] not in referenced]
+
+        if options['dry_run']:
+            size = sum(size for _, _, size in candidates)
+            self.stdout.write(self.style.WARNING(f'Would delete {len(candidates)} unreferenced blobs ({size} bytes)'))
+            for _, name, _ in candidates[:10]:  # Show first 10 as examples
+                self.stdout.write(f'  - {name}')
+            if len(candidates) > 10:
+                self.stdout.write(f'  ... and {len(candidates) - 10} more')
+            return
+
+        deleted = freed = 0
+        for blob_id, name, size in candidates:
+            # Re-check in the delete itself in case the blob was uploaded again meanwhile
+            def delete_row(blob_id=blob_id):
+                return bool(Blob.objects.filter(id=blob_id, ref_count__lte=0, last_used_at__lt=cutoff).delete()[0])
+
+            if storage.attachment_storage.purge(name, delete_row):
+                deleted += 1
+                freed += size
+        temp_files = self.remove_stale_temp_files(cutoff)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully deleted {deleted} unreferenced blobs ({freed} bytes) and {temp_files} abandoned uploads'
+            )
+        )
+
+    def recount(self, dry_run):
+        references = storage.referenced_names()
+        wrong = [
+            (blob_id, references.get(name, 0))
+            for blob_id, name, ref_count in Blob.objects.values_list('id', 'name', 'ref_count').iterator()
+            if ref_count != references.get(name, 0)
+        ]
+        if not dry_run:
+            for blob_id, ref_count in wrong:
+                Blob.objects.filter(id=blob_id).update(ref_count=ref_count)
+        verb = 'Would correct' if dry_run else 'Corrected'
+        self.stdout.write(f'{verb} {len(wrong)} reference counts')
+
+    def still_referenced(self, names):
+        referenced = set()
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            for model, field in storage.tracked_fields():
+                referenced.update(
+                    model._default_manager.filter(**{f'{field}__in': batch}).values_list(field, flat=True)
+                )
+        return referenced
+
+    def remove_stale_temp_files(self, cutoff):
+        """Remove files left behind by uploads, or blob deletions, that were interrupted before the grace period"""
+        removed = 0
+        oldest = cutoff.timestamp()
+        for directory in (storage.TEMP_DIR, storage.TOMBSTONE_DIR):
+            try:
+                entries = os.scandir(storage.attachment_storage.path(directory))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime < oldest:
+                        os.remove(entry.path)
+                        removed += 1
+        return removed
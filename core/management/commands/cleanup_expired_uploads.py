@@ -0,0 +1,79 @@
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import uploads
+from core.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were never finished or never used by a form'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=settings.CHUNKED_UPLOAD_EXPIRY_HOURS,
+            help='Delete uploads started more than this many hours ago (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting',
+        )
+
+    def handle(self, *args, **options):
+        expired = uploads.expired_uploads(options['hours'])
+        count = expired.count()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Would delete {count} expired uploads'))
+            for upload in expired[:10]:  # Show first 10 as examples
+                self.stdout.write(f'  - {upload} (started: {upload.created_at})')
+            if count > 10:
+                self.stdout.write(f'  ... and {count - 10} more')
+            return
+
+        for upload in expired.iterator():
+            uploads.discard(upload)
+        stray = self.remove_stray_files(options['hours'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully deleted {count} expired uploads and {stray} files without an upload')
+        )
+
+    def remove_stray_files(self, hours):
+        """Remove old files in CHUNKED_UPLOAD_DIR whose upload no longer exists"""
+        oldest = time.time() - hours * 3600
+        try:
+            entries = os.scandir(settings.CHUNKED_UPLOAD_DIR)
+        except FileNotFoundError:
+            return 0
+        with entries:
+            stale = {
+                entry.name[:-len('.part')]: entry.path
+                for entry in entries
+                if entry.is_file() and entry.name.endswith('.part') and entry.stat().st_mtime < oldest
+            }
+        names = list(stale)
+        known = set()
+        for start in range(0, len(names), 500):
+            ids = [self.upload_id(name) for name in names[start:start + 500]]
+            known.update(
+                upload_id.hex
+                for upload_id in ChunkedUpload.objects.filter(id__in=[i for i in ids if i]).values_list('id', flat=True)
+            )
+        removed = 0
+        for name, path in stale.items():
+            if name not in known:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def upload_id(self, name):
+        try:
+            return uuid.UUID(name)
+        except ValueError:
+            return None
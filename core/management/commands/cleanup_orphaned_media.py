@@ -0,0 +1,93 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import storage
+from core.models import CustomUser
+from core.thumbnails import thumbnail_name
+from events.models import Event
+from notice.models import ArchivedNotice, Notice
+
+
+class Command(BaseCommand):
+    help = 'Find files in MEDIA_ROOT that no member, event or notice refers to, and optionally delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age-hours',
+            type=int,
+            default=24,
+            help='Ignore files modified more recently than this, e.g. uploads whose row is not saved yet (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete the orphaned files; without it they are only reported',
+        )
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        if not os.path.isdir(root):
+            raise CommandError(f'MEDIA_ROOT {root} does not exist')
+        referenced = self.referenced_paths()
+        oldest = time.time() - options['min_age_hours'] * 3600
+        # Blobs have their own reference counts, see cleanup_blobs
+        skipped = {os.path.join(root, storage.BLOB_DIR)}
+
+        scanned = orphans = size = 0
+        for path, stat in self.walk(root, skipped):
+            scanned += 1
+            if os.path.relpath(path, root).replace(os.sep, '/') in referenced or stat.st_mtime >= oldest:
+                continue
+            orphans += 1
+            size += stat.st_size
+            if orphans <= 10:  # Show first 10 as examples
+                self.stdout.write(f'  - {os.path.relpath(path, root)}')
+            if options['delete']:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        if options['delete']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully deleted {orphans} orphaned files ({size} bytes) of {scanned} scanned'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Found {orphans} orphaned files ({size} bytes) of {scanned} scanned; run with --delete to remove them'
+            ))
+
+    def referenced_paths(self):
+        """MEDIA_ROOT-relative names of every file a row refers to, read in one pass per column"""
+        referenced = set()
+        for name in self.names(CustomUser, 'citizenship_document'):
+            referenced.add(name)
+            referenced.add(thumbnail_name(name))
+        for model in (Event, Notice, ArchivedNotice):
+            referenced.update(self.names(model, 'attachment'))
+        return referenced
+
+    def names(self, model, field):
+        return (
+            model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            .values_list(field, flat=True).iterator(chunk_size=5000)
+        )
+
+    def walk(self, root, skipped):
+        """(path, stat) of every file below ``root``; only the directories still to visit are held in memory"""
+        pending = [root]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in skipped:
+                            pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False)
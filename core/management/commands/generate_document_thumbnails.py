@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import thumbnails
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Create preview thumbnails for uploaded citizenship documents that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending-only',
+            action='store_true',
+            help='Only documents of users still pending verification',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recreate thumbnails that already exist',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many thumbnails would be created without creating them',
+        )
+
+    def handle(self, *args, **options):
+        if thumbnails.Image is None:
+            raise CommandError('Pillow is not installed; run "pip install Pillow" to create thumbnails')
+
+        users = CustomUser.objects.exclude(citizenship_document='').exclude(citizenship_document__isnull=True)
+        if options['pending_only']:
+            users = users.filter(state='PENDING_VERIFICATION')
+        names = [
+            name for name in users.order_by('-registered_at').values_list('citizenship_document', flat=True).iterator()
+            if options['force'] or not thumbnails.has_thumbnail(name)
+        ]
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Would create {len(names)} thumbnails'))
+            return
+
+        created = skipped = failed = 0
+        for name in names:
+            try:
+                if thumbnails.generate_thumbnail(name):
+                    created += 1
+                else:
+                    skipped += 1
+            except Exception as exc:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'  - {name}: {exc}'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully created {created} thumbnails ({skipped} unsupported, {failed} failed)'
+            )
+        )
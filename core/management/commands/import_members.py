@@ -0,0 +1,233 @@
+import csv
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from core import stats
+from core.membership import refresh_iwis, refresh_hapus
+from core.models import CustomUser, Iwi, Hapu, PasswordResetToken
+from core.roles import invalidate_users
+from core.search import index_members
+
+STATES = {value for value, _ in CustomUser.STATE_CHOICES}
+
+
+def _init_worker():
+    # Spawned workers start without Django configured; forked ones already have it
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Import members from a CSV file with full_name, email, iwi and optional hapu, state and password columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file; the first row must name the columns')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated and inserted per batch (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes used to hash passwords (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--state',
+            default='VERIFIED',
+            choices=sorted(STATES),
+            help='State of rows without a state column (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--token-days',
+            type=int,
+            default=14,
+            help='Validity of the set-password tokens issued to members without a password (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--token-file',
+            help='Write the email and set-password token of each member without a password to this CSV file',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file without importing anything',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.iwis, self.hapus = self.load_lookups()
+        self.seen_emails = set()
+        self.errors = []
+        self.imported = 0
+        self.iwi_ids, self.hapu_ids, self.user_ids = set(), set(), set()
+        self.tokens = []
+        started = time.perf_counter()
+
+        try:
+            source = open(options['csv_file'], newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {exc}')
+        pool = None
+        if options['workers'] > 1 and not options['dry_run']:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+        try:
+            with source:
+                reader = csv.DictReader(source)
+                missing = {'full_name', 'email', 'iwi'} - set(reader.fieldnames or ())
+                if missing:
+                    raise CommandError(f'Missing required columns: {", ".join(sorted(missing))}')
+                rows = enumerate(reader, start=2)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if not options['dry_run']:
+            self.after_import()
+        elapsed = time.perf_counter() - started
+        for line, message in self.errors[:20]:
+            self.stdout.write(self.style.ERROR(f'  line {line}: {message}'))
+        if len(self.errors) > 20:
+            self.stdout.write(f'  ... and {len(self.errors) - 20} more errors')
+        rate = self.imported / elapsed if elapsed else 0
+        verb = 'Would import' if options['dry_run'] else 'Successfully imported'
+        style = self.style.WARNING if options['dry_run'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{verb} {self.imported} members, skipped {len(self.errors)} rows '
+            f'in {elapsed:.1f}s ({rate:.0f} rows/s)'
+        ))
+
+    def load_lookups(self):
+        """Active iwi by id and folded name, and active hapu by (iwi id, id or folded name)"""
+        iwis = {}
+        for iwi_id, name in Iwi.objects.filter(is_archived=False).values_list('id', 'name'):
+            iwis[str(iwi_id)] = iwi_id
+            iwis[name.casefold()] = iwi_id
+        hapus = {}
+        for hapu_id, iwi_id, name in Hapu.objects.filter(is_archived=False).values_list('id', 'iwi_id', 'name'):
+            hapus[iwi_id, str(hapu_id)] = hapu_id
+            hapus[iwi_id, name.casefold()] = hapu_id
+        return iwis, hapus
+
+    def validate(self, line, row):
+        """Cleaned field values of ``row``, or None after recording why it was skipped"""
+        full_name = (row.get('full_name') or '').strip()
+        email = CustomUser.objects.normalize_email((row.get('email') or '').strip())
+        iwi_name = (row.get('iwi') or '').strip()
+        hapu_name = (row.get('hapu') or '').strip()
+        state = (row.get('state') or '').strip().upper() or self.options['state']
+        try:
+            validate_email(email)
+        except ValidationError:
+            return self.skip(line, f'invalid email "{email}"')
+        if email.lower() in self.seen_emails:
+            return self.skip(line, f'{email} appears more than once in the file')
+        self.seen_emails.add(email.lower())
+        if not full_name:
+            return self.skip(line, 'full_name is empty')
+        iwi_id = self.iwis.get(iwi_name.casefold())
+        if iwi_id is None:
+            return self.skip(line, f'unknown or archived iwi "{iwi_name}"')
+        hapu_id = None
+        if hapu_name:
+            hapu_id = self.hapus.get((iwi_id, hapu_name.casefold()))
+            if hapu_id is None:
+                return self.skip(line, f'hapu "{hapu_name}" is not an active hapu of {iwi_name}')
+        if state not in STATES:
+            return self.skip(line, f'unknown state "{state}"')
+        return {
+            'full_name': full_name,
+            'email': email,
+            'iwi_id': iwi_id,
+            'hapu_id': hapu_id,
+            'state': state,
+            'password': row.get('password') or None,
+        }
+
+    def skip(self, line, message):
+        self.errors.append((line, message))
+        return None
+
+    def import_batch(self, batch, pool):
+        members = {}
+        for line, row in batch:
+            cleaned = self.validate(line, row)
+            if cleaned is not None:
+                members[line] = cleaned
+        # One query per batch finds the emails that are already registered
+        existing = {
+            email.lower()
+            for email in CustomUser.objects.filter(
+                email__in=[member['email'] for member in members.values()]
+            ).values_list('email', flat=True)
+        }
+        for line in [line for line, member in members.items() if member['email'].lower() in existing]:
+            self.skip(line, f'{members.pop(line)["email"]} is already registered')
+        if self.options['dry_run']:
+            self.imported += len(members)
+            return
+        if not members:
+            return
+
+        members = list(members.values())
+        passwords = [member.pop('password') for member in members]
+        # Password hashing is deliberately slow, so it is spread over worker processes
+        if pool is not None:
+            hashes = list(pool.map(make_password, passwords, chunksize=64))
+        else:
+            hashes = [make_password(password) for password in passwords]
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(
+                [CustomUser(password=hashed, **member) for member, hashed in zip(members, hashes)]
+            )
+            # bulk_create does not return primary keys on MySQL, so look them up
+            created = dict(
+                CustomUser.objects.filter(email__in=[member['email'] for member in members]).values_list('email', 'id')
+            )
+            expires_at = timezone.now() + timedelta(days=self.options['token_days'])
+            tokens = [
+                PasswordResetToken(user_id=created[member['email']], token=secrets.token_urlsafe(32), expires_at=expires_at)
+                for member, password in zip(members, passwords)
+                if not password
+            ]
+            PasswordResetToken.objects.bulk_create(tokens)
+        self.imported += len(members)
+        self.user_ids.update(created.values())
+        self.iwi_ids.update(member['iwi_id'] for member in members)
+        self.hapu_ids.update(member['hapu_id'] for member in members if member['hapu_id'])
+        emails = {user_id: email for email, user_id in created.items()}
+        self.tokens.extend((emails[token.user_id], token.token) for token in tokens)
+        self.stdout.write(f'  imported {self.imported} members')
+
+    def after_import(self):
+        # bulk_create sends no signals, so refresh what the user signals normally keep up to date
+        invalidate_users(self.user_ids)
+        index_members(self.user_ids)
+        refresh_iwis(self.iwi_ids)
+        refresh_hapus(self.hapu_ids)
+        stats.invalidate()
+        if self.options['token_file'] and self.tokens:
+            with open(self.options['token_file'], 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['email', 'token', 'path'])
+                writer.writerows((email, token, f'/reset-password/{token}/') for email, token in self.tokens)
+            self.stdout.write(f'Wrote {len(self.tokens)} set-password tokens to {self.options["token_file"]}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from core.membership import refresh_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the membership statistics of every iwi and hapu'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Iwi or hapu refreshed per query batch (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        iwi_count, hapu_count = refresh_all(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully refreshed statistics for {iwi_count} iwis and {hapu_count} hapus'
+            )
+        )
@@ -0,0 +1,225 @@
+"""
+Materialised membership statistics per iwi and hapu.
+
+IwiStats and HapuStats hold member counts by state, leader counts, active
+consultations and upcoming events so that list and detail pages can show
+them without aggregating over the user table on every view. A row is
+recomputed (with one grouped query per figure, for any number of rows) when
+a user joins, leaves or changes state, when a leadership is added or
+removed, and when a consultation or event is saved. The time-dependent
+figures drift as consultations close and events start, so the
+refresh_membership_stats command should also run periodically.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from .models import CustomUser, Iwi, Hapu, IwiLeader, HapuLeader, IwiStats, HapuStats
+
+_STAT_FIELDS = [
+    'verified_members', 'pending_members', 'rejected_members', 'leader_count',
+    'active_consultations', 'upcoming_events', 'refreshed_at',
+]
+
+
+def _grouped(queryset, key, **aggregates):
+    """{key value: row} for ``queryset`` grouped by ``key``"""
+    if not aggregates:
+        aggregates = {'total': Count('pk')}
+    return {row[key]: row for row in queryset.order_by().values(key).annotate(**aggregates)}
+
+
+def _counts(key, ids, leader_model):
+    from consultation.models import Proposal
+    from events.models import Event
+
+    now = timezone.now()
+    members = _grouped(
+        CustomUser.objects.filter(**{f'{key}__in': ids}), key,
+        verified=Count('pk', filter=Q(state='VERIFIED')),
+        pending=Count('pk', filter=Q(state='PENDING_VERIFICATION')),
+        rejected=Count('pk', filter=Q(state='REJECTED')),
+    )
+    leaders = _grouped(leader_model.objects.filter(**{f'{key}__in': ids}), key)
+    consultations = _grouped(
+        Proposal.objects.filter(**{f'{key}__in': ids}, is_draft=False, start_date__lte=now, end_date__gte=now), key
+    )
+    events = _grouped(Event.objects.filter(**{f'{key}__in': ids}, start_datetime__gt=now), key)
+    for object_id in ids:
+        member_row = members.get(object_id, {})
+        yield object_id, {
+            'verified_members': member_row.get('verified', 0),
+            'pending_members': member_row.get('pending', 0),
+            'rejected_members': member_row.get('rejected', 0),
+            'leader_count': leaders.get(object_id, {}).get('total', 0),
+            'active_consultations': consultations.get(object_id, {}).get('total', 0),
+            'upcoming_events': events.get(object_id, {}).get('total', 0),
+            'refreshed_at': now,
+        }
+
+
+def _existing(model, ids):
+    """The subset of ``ids`` that still exist, sorted"""
+    ids = {object_id for object_id in ids if object_id}
+    if not ids:
+        return []
+    return sorted(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def _upsert(model, rows, unique_field, update_fields):
+    """Insert ``rows``, updating ``update_fields`` of those whose ``unique_field`` already has a row"""
+    options = {}
+    # MySQL takes no conflict target: ON DUPLICATE KEY UPDATE fires on the unique column by itself
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = [unique_field]
+    model.objects.bulk_create(rows, update_conflicts=True, update_fields=update_fields, **options)
+
+
+def refresh_iwis(iwi_ids):
+    """Recompute the statistics rows of ``iwi_ids``"""
+    ids = _existing(Iwi, iwi_ids)
+    if not ids:
+        return
+    hapus = _grouped(Hapu.objects.filter(iwi_id__in=ids), 'iwi_id')
+    _upsert(
+        IwiStats,
+        [
+            IwiStats(iwi_id=iwi_id, hapu_count=hapus.get(iwi_id, {}).get('total', 0), **counts)
+            for iwi_id, counts in _counts('iwi_id', ids, IwiLeader)
+        ],
+        'iwi', _STAT_FIELDS + ['hapu_count'],
+    )
+
+
+def refresh_hapus(hapu_ids):
+    """Recompute the statistics rows of ``hapu_ids``"""
+    ids = _existing(Hapu, hapu_ids)
+    if not ids:
+        return
+    _upsert(
+        HapuStats,
+        [HapuStats(hapu_id=hapu_id, **counts) for hapu_id, counts in _counts('hapu_id', ids, HapuLeader)],
+        'hapu', _STAT_FIELDS,
+    )
+
+
+def _attach(objects, stats_model, refresh):
+    missing = []
+    for obj in objects:
+        try:
+            obj.stats
+        except stats_model.DoesNotExist:
+            missing.append(obj.pk)
+    if missing:
+        refresh(missing)
+        rows = stats_model.objects.in_bulk(missing)
+        for obj in objects:
+            if obj.pk in rows:
+                obj.stats = rows[obj.pk]
+    return objects
+
+
+def attach_iwi_stats(iwis):
+    """Make ``iwi.stats`` available on every iwi, computing any rows that do not exist yet.
+
+    Load the iwi with select_related('stats') so existing rows cost no extra query.
+    """
+    return _attach(iwis, IwiStats, refresh_iwis)
+
+
+def attach_hapu_stats(hapus):
+    """Make ``hapu.stats`` available on every hapu; see attach_iwi_stats"""
+    return _attach(hapus, HapuStats, refresh_hapus)
+
+
+def refresh_all(batch_size=500):
+    """Recompute every statistics row; returns the number of iwi and hapu refreshed"""
+    iwi_ids = list(Iwi.objects.values_list('pk', flat=True))
+    hapu_ids = list(Hapu.objects.values_list('pk', flat=True))
+    for start in range(0, len(iwi_ids), batch_size):
+        refresh_iwis(iwi_ids[start:start + batch_size])
+    for start in range(0, len(hapu_ids), batch_size):
+        refresh_hapus(hapu_ids[start:start + batch_size])
+    return len(iwi_ids), len(hapu_ids)
+
+
+def schedule_refresh(iwi_ids=(), hapu_ids=()):
+    """Refresh the given rows once the current transaction commits"""
+    iwi_ids = {iwi_id for iwi_id in iwi_ids if iwi_id}
+    hapu_ids = {hapu_id for hapu_id in hapu_ids if hapu_id}
+
+    def refresh():
+        refresh_iwis(iwi_ids)
+        refresh_hapus(hapu_ids)
+
+    if iwi_ids or hapu_ids:
+        transaction.on_commit(refresh)
+
+
+# Snapshot of the membership fields as loaded, so saves that leave them
+# untouched (logins, profile edits) do not trigger a refresh. Read through
+# __dict__ so deferred fields are not fetched.
+def _remember_membership(sender, instance, **kwargs):
+    fields = instance.__dict__
+    instance._membership = (fields.get('iwi_id'), fields.get('hapu_id'), fields.get('state'))
+
+
+def _user_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_membership', (None, None, None))
+    current = (instance.iwi_id, instance.hapu_id, instance.state)
+    if created or previous != current:
+        schedule_refresh({previous[0], current[0]}, {previous[1], current[1]})
+    instance._membership = current
+
+
+def _user_deleted(sender, instance, **kwargs):
+    schedule_refresh([instance.iwi_id], [instance.hapu_id])
+
+
+def _iwi_leader_changed(sender, instance, **kwargs):
+    schedule_refresh(iwi_ids=[instance.iwi_id])
+
+
+def _hapu_leader_changed(sender, instance, **kwargs):
+    schedule_refresh(hapu_ids=[instance.hapu_id])
+
+
+def _remember_hapu_iwi(sender, instance, **kwargs):
+    instance._membership_iwi_id = instance.__dict__.get('iwi_id')
+
+
+def _hapu_changed(sender, instance, **kwargs):
+    # A transfer changes the hapu count of both the old and the new iwi
+    schedule_refresh(
+        iwi_ids=[instance.iwi_id, getattr(instance, '_membership_iwi_id', None)],
+        hapu_ids=[instance.pk] if kwargs.get('created') else [],
+    )
+    instance._membership_iwi_id = instance.iwi_id
+
+
+def _iwi_created(sender, instance, created, **kwargs):
+    if created:
+        schedule_refresh(iwi_ids=[instance.pk])
+
+
+def _activity_changed(sender, instance, **kwargs):
+    schedule_refresh([instance.iwi_id], [instance.hapu_id])
+
+
+def connect_signals():
+    from consultation.models import Proposal
+    from events.models import Event
+
+    post_init.connect(_remember_membership, sender=CustomUser, dispatch_uid='membership-user-init')
+    post_save.connect(_user_saved, sender=CustomUser, dispatch_uid='membership-user-save')
+    post_delete.connect(_user_deleted, sender=CustomUser, dispatch_uid='membership-user-delete')
+    post_init.connect(_remember_hapu_iwi, sender=Hapu, dispatch_uid='membership-hapu-init')
+    post_save.connect(_iwi_created, sender=Iwi, dispatch_uid='membership-iwi-save')
+    for signal in (post_save, post_delete):
+        suffix = 'save' if signal is post_save else 'delete'
+        signal.connect(_iwi_leader_changed, sender=IwiLeader, dispatch_uid=f'membership-iwileader-{suffix}')
+        signal.connect(_hapu_leader_changed, sender=HapuLeader, dispatch_uid=f'membership-hapuleader-{suffix}')
+        signal.connect(_hapu_changed, sender=Hapu, dispatch_uid=f'membership-hapu-{suffix}')
+        signal.connect(_activity_changed, sender=Proposal, dispatch_uid=f'membership-proposal-{suffix}')
+        signal.connect(_activity_changed, sender=Event, dispatch_uid=f'membership-event-{suffix}')
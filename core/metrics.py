@@ -0,0 +1,313 @@
+"""
+Prometheus metrics for the application internals, served at /metrics.
+
+Values are kept in plain dicts in each process and updated under a lock, so
+recording one costs a dict lookup and an addition. MetricsMiddleware times
+every request by URL name and counts its database queries with an execute
+wrapper. The email senders, vote creation and core.cache report their own
+counts.
+
+Every process has its own values, so without help a scrape would only see
+the worker that answered it. With METRICS_DIR set, each process writes its
+values to <METRICS_DIR>/<pid>.json at most every METRICS_FLUSH_INTERVAL
+seconds (and at exit), and /metrics adds up the files of all processes. The
+counters of processes that have exited are kept so totals never go
+backwards, but their gauges are dropped. Empty the directory when the
+service restarts, as with the multiprocess mode of prometheus_client.
+
+Active sessions are counted in the session table at scrape time.
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from . import cache
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'iwi_http_requests_total': ('counter', 'Requests by URL name, method and status code'),
+    'iwi_http_request_duration_seconds': ('histogram', 'Request latency by URL name and method'),
+    'iwi_db_queries_total': ('counter', 'Database queries made while handling requests, by URL name'),
+    'iwi_cache_requests_total': ('counter', 'Cache lookups by namespace and result (hit or miss)'),
+    'iwi_email_queue_depth': ('gauge', 'Emails waiting to be sent or being sent'),
+    'iwi_emails_total': ('counter', 'Emails by type and result (sent or failed)'),
+    'iwi_email_send_duration_seconds': ('histogram', 'Time taken to send an email, by type'),
+    'iwi_votes_total': ('counter', 'Consultation votes recorded'),
+    'iwi_active_sessions': ('gauge', 'Unexpired sessions in the session table'),
+}
+
+_HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}  # key -> [count per bucket (the last one is +Inf), sum]
+_last_flush = time.monotonic()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to the counter ``name``"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def gauge_add(name, amount, **labels):
+    """Add ``amount`` (which may be negative) to the gauge ``name``"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record ``value`` in the histogram ``name``"""
+    key = _key(name, labels)
+    index = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][index] += 1
+        histogram[1] += value
+
+
+def reset():
+    """Forget the values recorded by this process"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def record_request(view, method, status, duration, queries):
+    if method not in _HTTP_METHODS:
+        method = 'other'
+    inc('iwi_http_requests_total', view=view, method=method, status=str(status))
+    observe('iwi_http_request_duration_seconds', duration, view=view, method=method)
+    if queries:
+        inc('iwi_db_queries_total', queries, view=view)
+    flush_if_due()
+
+
+@contextmanager
+def track_email(email_type):
+    """Count the email sent in the ``with`` block and time it; an exception marks it failed"""
+    gauge_add('iwi_email_queue_depth', 1)
+    started = time.perf_counter()
+    result = 'failed'
+    try:
+        yield
+        result = 'sent'
+    finally:
+        gauge_add('iwi_email_queue_depth', -1)
+        observe('iwi_email_send_duration_seconds', time.perf_counter() - started, type=email_type)
+        inc('iwi_emails_total', type=email_type, result=result)
+        flush_if_due()
+
+
+class MetricsMiddleware:
+    """Times each request and counts its queries; goes first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths share one label, so scanners cannot add a series per URL
+        view = match.view_name if match and match.view_name else '<unmatched>'
+        record_request(view, request.method, response.status_code, time.perf_counter() - started, queries)
+        return response
+
+
+def snapshot():
+    """This process's values in the form written to METRICS_DIR"""
+    cache_counters = [
+        ['iwi_cache_requests_total', {'namespace': namespace, 'result': result}, counts[total]]
+        for namespace, counts in cache.stats().items()
+        for result, total in (('hit', 'hits'), ('miss', 'misses'))
+    ]
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()] + cache_counters,
+            'gauges': [[name, dict(labels), value] for (name, labels), value in _gauges.items()],
+            'histograms': [
+                [name, dict(labels), list(counts), total] for (name, labels), (counts, total) in _histograms.items()
+            ],
+        }
+
+
+def flush():
+    """Write this process's values to METRICS_DIR"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    data = snapshot()
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w') as file:
+            json.dump(data, file)
+        # Readers only ever see a complete file
+        os.replace(temporary, os.path.join(directory, f"{data['pid']}.json"))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def flush_if_due():
+    if settings.METRICS_DIR and time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _snapshots():
+    """This process's values and those written by every other process to METRICS_DIR"""
+    own = snapshot()
+    yield own, True
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        paths = [entry.path for entry in entries if entry.name.endswith('.json')]
+    for path in paths:
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue  # Removed or not one of ours
+        if data.get('pid') != own['pid']:
+            yield data, _is_running(data.get('pid'))
+
+
+def collect():
+    """Counters, gauges and histograms added up over all processes, keyed like the in-process dicts"""
+    counters, gauges, histograms = {}, {}, {}
+    for data, running in _snapshots():
+        for name, labels, value in data['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        if running:
+            for name, labels, value in data['gauges']:
+                key = _key(name, labels)
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, counts, total in data['histograms']:
+            key = _key(name, labels)
+            histogram = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+            histogram[1] += total
+    sessions = active_sessions()
+    if sessions is not None:
+        gauges[_key('iwi_active_sessions', {})] = sessions
+    return counters, gauges, histograms
+
+
+def active_sessions():
+    """Unexpired sessions, or None when sessions are not stored in the database"""
+    if settings.SESSION_ENGINE not in ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db'):
+        return None
+    from django.contrib.sessions.models import Session
+    return Session.objects.filter(expire_date__gt=timezone.now()).count()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    counters, gauges, histograms = collect()
+    samples = {}
+    for (name, labels), value in sorted({**counters, **gauges}.items()):
+        samples.setdefault(name, []).append(f'{name}{_labels(labels)} {_number(value)}')
+    for (name, labels), (counts, total) in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    output = []
+    for name, (kind, description) in METRICS.items():
+        if kind == 'gauge' and name not in samples and name != 'iwi_active_sessions':
+            samples[name] = [f'{name} 0']
+        if name not in samples:
+            continue
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
+
+
+def _count_vote(sender, created=False, **kwargs):
+    if created:
+        inc('iwi_votes_total')
+        flush_if_due()
+
+
+def connect_signals():
+    from consultation.models import Vote
+
+    post_save.connect(_count_vote, sender=Vote, dispatch_uid='metrics-votes')
+
+
+if hasattr(os, 'register_at_fork'):
+    # A forked worker starts from zero; the parent's values stay in the parent's file
+    os.register_at_fork(after_in_child=reset)
+
+atexit.register(flush)
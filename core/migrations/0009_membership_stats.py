@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HapuStats',
+            fields=[
+                ('verified_members', models.PositiveIntegerField(default=0)),
+                ('pending_members', models.PositiveIntegerField(default=0)),
+                ('rejected_members', models.PositiveIntegerField(default=0)),
+                ('leader_count', models.PositiveIntegerField(default=0)),
+                ('active_consultations', models.PositiveIntegerField(default=0)),
+                ('upcoming_events', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hapu', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.hapu')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='IwiStats',
+            fields=[
+                ('verified_members', models.PositiveIntegerField(default=0)),
+                ('pending_members', models.PositiveIntegerField(default=0)),
+                ('rejected_members', models.PositiveIntegerField(default=0)),
+                ('leader_count', models.PositiveIntegerField(default=0)),
+                ('active_consultations', models.PositiveIntegerField(default=0)),
+                ('upcoming_events', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iwi', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.iwi')),
+                ('hapu_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_existing_members(apps, schema_editor):
+    CustomUser = apps.get_model('core', 'CustomUser')
+    MemberSearchWord = apps.get_model('core', 'MemberSearchWord')
+    words = []
+    for user_id, full_name, email in CustomUser.objects.order_by().values_list('pk', 'full_name', 'email').iterator():
+        # Same words as core.search.search_words
+        for word in set((full_name or '').lower().split()) | ({email.lower()} if email else set()):
+            words.append(MemberSearchWord(user_id=user_id, word=word))
+        if len(words) >= 5000:
+            MemberSearchWord.objects.bulk_create(words)
+            words = []
+    MemberSearchWord.objects.bulk_create(words)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(db_index=True, max_length=254)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_words', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(index_existing_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_membersearchword'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='client_ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+    ]
@@ -108,6 +108,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['full_name']
 
+    class Meta:
+        indexes = [
+            # Prefix searches; MySQL also has a FULLTEXT index, see core.search
+            models.Index(fields=['full_name'], name='customuser_full_name_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -123,6 +129,35 @@ class HapuLeader(models.Model):
     class Meta:
         unique_together = ('hapu', 'user')
 
+class MemberSearchWord(models.Model):
+    """A lowercased word of a member's name, or their whole email, for indexed prefix search (see core.search)"""
+    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='search_words')
+    word = models.CharField(max_length=254, db_index=True)
+
+class MembershipStats(models.Model):
+    """Membership and activity counts maintained by core.membership"""
+    verified_members = models.PositiveIntegerField(default=0)
+    pending_members = models.PositiveIntegerField(default=0)
+    rejected_members = models.PositiveIntegerField(default=0)
+    leader_count = models.PositiveIntegerField(default=0)
+    active_consultations = models.PositiveIntegerField(default=0)
+    upcoming_events = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_members(self):
+        return self.verified_members + self.pending_members + self.rejected_members
+
+class IwiStats(MembershipStats):
+    iwi = models.OneToOneField(Iwi, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    hapu_count = models.PositiveIntegerField(default=0)
+
+class HapuStats(MembershipStats):
+    hapu = models.OneToOneField(Hapu, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
 class PasswordResetToken(models.Model):
     """Model to store password reset tokens"""
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='password_reset_tokens')
@@ -144,3 +179,41 @@ class PasswordResetToken(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+
+class Blob(models.Model):
+    """A distinct file in core.storage.ContentAddressedStorage and the number of rows referring to it"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Unreferenced blobs past the grace period, see cleanup_blobs
+            models.Index(fields=['ref_count', 'last_used_at'], name='blob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class ChunkedUpload(models.Model):
+    """A file sent in chunks through core.uploads, owned by a user or (before registration) a session"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    purpose = models.CharField(max_length=32)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    session_key = models.CharField(max_length=40, blank=True)
+    client_ip = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size} bytes)'
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
@@ -0,0 +1,112 @@
+"""
+Per-user leadership role profile.
+
+Permission checks and templates across the apps all ask the same question:
+which iwi and hapu does this user lead? The profile answers it with a single
+query, is memoised on the user object for the rest of the request and is
+kept in the shared cache until one of the user's leaderships changes.
+"""
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import Namespace
+from .models import CustomUser, IwiLeader, HapuLeader
+
+_namespace = Namespace('roles', timeout=60 * 60)
+
+
+class RoleProfile:
+    """The iwi and hapu a user leads"""
+
+    def __init__(self, is_staff=False, iwi_ids=(), hapu_ids=()):
+        self.is_staff = is_staff
+        self.iwi_ids = frozenset(iwi_ids)
+        self.hapu_ids = frozenset(hapu_ids)
+
+    @property
+    def is_iwi_leader(self):
+        return bool(self.iwi_ids)
+
+    @property
+    def is_hapu_leader(self):
+        return bool(self.hapu_ids)
+
+    @property
+    def is_leader(self):
+        return bool(self.iwi_ids or self.hapu_ids)
+
+    @property
+    def is_leader_or_admin(self):
+        return self.is_staff or self.is_leader
+
+    def leads_iwi(self, iwi_id):
+        return _as_int(iwi_id) in self.iwi_ids
+
+    def leads_hapu(self, hapu_id):
+        return _as_int(hapu_id) in self.hapu_ids
+
+    def can_manage_hapu(self, hapu):
+        """Whether the user leads the hapu or the iwi it belongs to"""
+        return hapu.iwi_id in self.iwi_ids or hapu.id in self.hapu_ids
+
+
+ANONYMOUS_PROFILE = RoleProfile()
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _load(user_id):
+    iwi_rows = IwiLeader.objects.filter(user_id=user_id).annotate(kind=Value('iwi')).values_list('kind', 'iwi_id')
+    hapu_rows = HapuLeader.objects.filter(user_id=user_id).annotate(kind=Value('hapu')).values_list('kind', 'hapu_id')
+    leaderships = {'iwi': [], 'hapu': []}
+    for kind, object_id in iwi_rows.union(hapu_rows, all=True):
+        leaderships[kind].append(object_id)
+    return leaderships
+
+
+def get_role_profile(user):
+    """Return the user's role profile, loading it at most once per request"""
+    if not user.is_authenticated:
+        return ANONYMOUS_PROFILE
+    profile = getattr(user, '_role_profile', None)
+    if profile is None:
+        leaderships = _namespace.get_or_set(user.pk, lambda: _load(user.pk))
+        profile = RoleProfile(user.is_staff, leaderships['iwi'], leaderships['hapu'])
+        user._role_profile = profile
+    return profile
+
+
+def invalidate_users(user_ids):
+    """Drop the cached profiles of ``user_ids``; call after bulk leadership changes"""
+    user_ids = set(user_ids)
+
+    def delete():
+        for user_id in user_ids:
+            _namespace.delete(user_id)
+
+    delete()
+    # A profile rebuilt from uncommitted data before the commit must not outlive it
+    transaction.on_commit(delete)
+
+
+@receiver(post_save, sender=IwiLeader)
+@receiver(post_delete, sender=IwiLeader)
+@receiver(post_save, sender=HapuLeader)
+@receiver(post_delete, sender=HapuLeader)
+def _invalidate_leader(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def _invalidate_user(sender, instance, created=False, **kwargs):
+    # A new or deleted user must never inherit a profile cached under a reused id
+    if created or kwargs.get('signal') is post_delete:
+        invalidate_users([instance.pk])
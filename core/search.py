@@ -0,0 +1,146 @@
+"""
+Member search over names, emails and iwi/hapu names.
+
+On MySQL the full_name and email columns carry a FULLTEXT index (see
+migration 0010) and every search word is matched as a prefix in boolean
+mode, so a search touches only the index entries for those words however
+large the user table grows.
+
+Other databases, and words shorter than InnoDB's minimum token size, fall
+back to MemberSearchWord. It holds every word of each member's name and
+their whole email, lowercased, and each search word becomes a prefix match
+on its indexed word column (LIKE 'abc%' on MySQL, a range on SQLite). A
+match inside a name is therefore never a LIKE '%...' scan of the user
+table. Saving a user keeps
+the words up to date. Code that creates users with bulk_create must call
+index_members().
+
+Searching for an iwi or hapu name lists its members after any people whose
+own name or email matches.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_init, post_save
+
+from .models import CustomUser, Iwi, Hapu, MemberSearchWord
+
+# InnoDB ignores words shorter than innodb_ft_min_token_size (3 by default)
+MIN_FULLTEXT_WORD = 3
+MAX_WORDS = 8
+
+# Characters with a meaning in MySQL boolean-mode searches
+_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _words(query):
+    return _OPERATORS.sub(' ', query or '').split()[:MAX_WORDS]
+
+
+def _prefix(word):
+    word = word.lower()
+    if connection.vendor == 'mysql':
+        # The case-insensitive collation makes this a plain LIKE 'word%',
+        # which MySQL answers from the index (startswith would be LIKE BINARY)
+        words = MemberSearchWord.objects.filter(word__istartswith=word)
+    elif connection.vendor == 'sqlite':
+        # SQLite never uses an ordinary index for LIKE, but does for a range
+        words = MemberSearchWord.objects.filter(word__gte=word, word__lt=word[:-1] + chr(ord(word[-1]) + 1))
+    else:
+        words = MemberSearchWord.objects.filter(word__startswith=word)
+    return Q(pk__in=words.values('user_id'))
+
+
+def search_words(full_name, email):
+    """The MemberSearchWord rows a member with ``full_name`` and ``email`` is found by"""
+    return set((full_name or '').lower().split()) | ({email.lower()} if email else set())
+
+
+def index_members(user_ids, batch_size=1000):
+    """Rebuild the search words of ``user_ids``; call after creating or renaming users in bulk"""
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        rows = CustomUser.objects.filter(pk__in=batch).values_list('pk', 'full_name', 'email')
+        with transaction.atomic():
+            MemberSearchWord.objects.filter(user_id__in=batch).delete()
+            MemberSearchWord.objects.bulk_create([
+                MemberSearchWord(user_id=user_id, word=word)
+                for user_id, full_name, email in rows
+                for word in search_words(full_name, email)
+            ])
+
+
+def filter_members(users, query):
+    """``users`` narrowed to those whose name or email matches every word of ``query``"""
+    words = _words(query)
+    if not words:
+        return users.none()
+    if connection.vendor == 'mysql':
+        indexed = [word for word in words if len(word) >= MIN_FULLTEXT_WORD]
+        if indexed:
+            users = users.annotate(
+                relevance=RawSQL(
+                    'MATCH (core_customuser.full_name, core_customuser.email) AGAINST (%s IN BOOLEAN MODE)',
+                    (' '.join(f'+{word}*' for word in indexed),),
+                )
+            ).filter(relevance__gt=0)
+        for word in words:
+            if len(word) < MIN_FULLTEXT_WORD:
+                users = users.filter(_prefix(word))
+        return users
+    for word in words:
+        users = users.filter(_prefix(word))
+    return users
+
+
+def search_members(query, users=None, limit=20):
+    """Up to ``limit`` members of ``users`` matching ``query``.
+
+    People whose own name or email matches come first, best match first on
+    MySQL; members of iwi and hapu whose name contains the query follow.
+    """
+    if users is None:
+        users = CustomUser.objects.all()
+    users = users.select_related('iwi', 'hapu')
+    matches = filter_members(users, query)
+    ordering = ['-relevance', 'full_name'] if 'relevance' in matches.query.annotations else ['full_name']
+    results = list(matches.order_by(*ordering)[:limit])
+    query = ' '.join(_words(query))
+    if len(results) < limit and len(query) >= MIN_FULLTEXT_WORD:
+        # The iwi and hapu tables are small enough to scan in a subquery
+        members = users.filter(
+            Q(iwi_id__in=Iwi.objects.filter(name__icontains=query).order_by().values('pk'))
+            | Q(hapu_id__in=Hapu.objects.filter(name__icontains=query).order_by().values('pk'))
+        ).exclude(pk__in=[user.pk for user in results])
+        results += list(members.order_by('full_name')[:limit - len(results)])
+    return results
+
+
+# The name and email as loaded, so saves that leave them untouched (logins,
+# state changes) do not rewrite the words. Read through __dict__ so deferred
+# fields are not fetched.
+def _remember_words(sender, instance, **kwargs):
+    fields = instance.__dict__
+    instance._search_fields = (fields.get('full_name'), fields.get('email'))
+
+
+def _user_saved(sender, instance, created, **kwargs):
+    fields = instance.__dict__
+    current = (fields.get('full_name'), fields.get('email'))
+    if not created and getattr(instance, '_search_fields', None) == current:
+        return
+    instance._search_fields = current
+    if created:
+        MemberSearchWord.objects.bulk_create(
+            [MemberSearchWord(user_id=instance.pk, word=word) for word in search_words(*current)]
+        )
+    else:
+        index_members([instance.pk])
+
+
+def connect_signals():
+    post_init.connect(_remember_words, sender=CustomUser, dispatch_uid='search-user-init')
+    post_save.connect(_user_saved, sender=CustomUser, dispatch_uid='search-user-save')
@@ -0,0 +1,102 @@
+"""
+Counters shown on the admin dashboard.
+
+All counters are computed together with a handful of aggregate queries and
+cached as one dict. Creating or deleting one of the counted models, or
+changing a field a counter depends on (a user's state, an event's start,
+...), drops the cached copy and the next visit recounts. Other saves, such
+as logins and profile edits, keep it. The short TTL covers the counters that
+change with the clock alone (consultations opening or closing, events
+starting, notices expiring).
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from .cache import Namespace
+from .models import CustomUser, Iwi, Hapu
+
+_namespace = Namespace('dashboard', timeout=60)
+
+# The fields each counter depends on, by model; creating or deleting an instance always counts
+_COUNTED_FIELDS = {
+    'core.CustomUser': ('state',),
+    'core.Iwi': ('is_archived',),
+    'core.Hapu': ('is_archived',),
+    'consultation.Proposal': ('is_draft', 'start_date', 'end_date'),
+    'events.Event': ('start_datetime',),
+    'notice.Notice': ('expiry_date',),
+}
+
+
+def _load():
+    from consultation.models import Proposal
+    from events.models import Event
+    from notice.models import Notice
+
+    now = timezone.now()
+    users_by_state = dict.fromkeys((state for state, _ in CustomUser.STATE_CHOICES), 0)
+    users_by_state.update(CustomUser.objects.order_by().values_list('state').annotate(total=Count('id')))
+    hapus = Hapu.objects.aggregate(total=Count('id'), archived=Count('id', filter=Q(is_archived=True)))
+    return {
+        'total_iwis': Iwi.objects.filter(is_archived=False).count(),
+        'total_hapus': hapus['total'],
+        'archived_hapus': hapus['archived'],
+        'total_users': sum(users_by_state.values()),
+        'users_by_state': users_by_state,
+        'pending_verifications': users_by_state.get('PENDING_VERIFICATION', 0),
+        'active_consultations': Proposal.objects.filter(
+            is_draft=False, start_date__lte=now, end_date__gte=now
+        ).count(),
+        'upcoming_events': Event.objects.filter(start_datetime__gt=now).count(),
+        'active_notices': Notice.objects.filter(expiry_date__gt=now).count(),
+    }
+
+
+def get_dashboard_stats():
+    """Return the admin dashboard counters, computing them at most once per TTL"""
+    return _namespace.get_or_set('counters', _load)
+
+
+def invalidate():
+    """Discard the cached counters; call after changes that bypass model signals"""
+    _namespace.invalidate()
+
+
+def _counted_values(instance):
+    # Read __dict__ so deferred fields are not fetched
+    fields = instance.__dict__
+    return tuple(fields.get(name) for name in _COUNTED_FIELDS[instance._meta.label])
+
+
+def _remember(sender, instance, **kwargs):
+    instance._dashboard_counted = _counted_values(instance)
+
+
+def _changed():
+    invalidate()
+    # Counters recounted by another process before the commit would miss this change
+    transaction.on_commit(invalidate)
+
+
+def _saved(sender, instance, created=False, **kwargs):
+    current = _counted_values(instance)
+    if not created and getattr(instance, '_dashboard_counted', None) == current:
+        return
+    instance._dashboard_counted = current
+    _changed()
+
+
+def _deleted(sender, instance, **kwargs):
+    _changed()
+
+
+def connect_signals():
+    from django.apps import apps
+
+    for label in _COUNTED_FIELDS:
+        model = apps.get_model(label)
+        post_init.connect(_remember, sender=model, dispatch_uid=f'dashboard-stats-{label}-init')
+        post_save.connect(_saved, sender=model, dispatch_uid=f'dashboard-stats-{label}-save')
+        post_delete.connect(_deleted, sender=model, dispatch_uid=f'dashboard-stats-{label}-delete')
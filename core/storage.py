@@ -0,0 +1,209 @@
+"""
+Content-addressed, deduplicated storage for event and notice attachments.
+
+Uploads are hashed (SHA-256) while they are streamed to a temporary file and
+then moved to ``blobs/<aa>/<bb>/<digest><ext>``, so a flyer or logo attached
+to many events and notices is stored once. Each blob has a core.models.Blob
+row counting the rows that refer to it; the count is kept up to date by
+signals on every FileField using this storage, and cleanup_blobs deletes
+blobs nobody has referred to for a grace period.
+
+Like other signal-maintained data, bulk_create and queryset.update() bypass
+the counts: call adjust_references() after them (as archive_expired_notices
+does), or run ``cleanup_blobs --recount``.
+
+Citizenship documents keep their random names: two members uploading the
+same file must not be able to tell from its name.
+"""
+import hashlib
+import os
+import tempfile
+import uuid
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F, FileField
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+TEMP_DIR = f'{BLOB_DIR}/tmp'
+# Blobs being deleted by cleanup_blobs are moved here first, see purge()
+TOMBSTONE_DIR = f'{BLOB_DIR}/deleted'
+
+
+def blob_name(digest, extension):
+    """Storage name of the blob with SHA-256 ``digest`` and file ``extension``"""
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return (
+        bool(name) and name.startswith(f'{BLOB_DIR}/')
+        and not name.startswith((f'{TEMP_DIR}/', f'{TOMBSTONE_DIR}/'))
+    )
+
+
+def _extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return extension if len(extension) <= 10 and extension[1:].isalnum() else ''
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each distinct file content once; the upload_to path is ignored"""
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content, so there is nothing to make unique
+        return name
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        temp_dir = self.path(TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            name = blob_name(digest.hexdigest(), _extension(name))
+            # Touch the row before relying on an existing file: cleanup_blobs
+            # only deletes a blob whose row has not been used for the grace
+            # period, and moves the file aside before deleting the row, so
+            # either the blob survives or the file is missing here and this
+            # upload puts it back
+            if not Blob.objects.filter(name=name).update(last_used_at=timezone.now()):
+                Blob.objects.get_or_create(name=name, defaults={'size': size})
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                # The temporary file is on the same filesystem, so the blob appears atomically
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        # Blobs are shared between rows; only cleanup_blobs removes them
+        if not is_blob(name):
+            super().delete(name)
+
+    def purge(self, name, delete_row):
+        """Remove the blob ``name`` from disk if ``delete_row()`` still deletes its Blob row.
+
+        The file is moved to a tombstone before the row goes, so an upload of
+        the same content running meanwhile finds no file and writes its own
+        copy instead of keeping a reference to the one being removed. When
+        the row turns out to be in use again the file is put back. Returns
+        whether the blob was removed.
+        """
+        path = self.path(name)
+        tombstone = self.path(f'{TOMBSTONE_DIR}/{uuid.uuid4().hex}')
+        os.makedirs(os.path.dirname(tombstone), exist_ok=True)
+        try:
+            os.replace(path, tombstone)
+        except FileNotFoundError:
+            tombstone = None
+        if delete_row():
+            if tombstone:
+                os.remove(tombstone)
+            return True
+        if tombstone:
+            if os.path.exists(path):
+                # A concurrent upload has already written the same content again
+                os.remove(tombstone)
+            else:
+                os.replace(tombstone, path)
+        return False
+
+
+attachment_storage = ContentAddressedStorage()
+
+
+def tracked_fields():
+    """(model, field name) of every FileField stored in a ContentAddressedStorage"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def adjust_references(names, delta):
+    """Add ``delta`` references to each blob in ``names`` (repeated names count repeatedly)"""
+    from .models import Blob
+
+    counts = Counter(name for name in names if is_blob(name))
+    for name, count in counts.items():
+        Blob.objects.filter(name=name).update(ref_count=F('ref_count') + delta * count, last_used_at=timezone.now())
+
+
+def referenced_names():
+    """Counter of references to each blob, read from the tracked fields"""
+    references = Counter()
+    for model, field in tracked_fields():
+        names = model._default_manager.filter(**{f'{field}__startswith': f'{BLOB_DIR}/'}).values_list(field, flat=True)
+        references.update(names.iterator())
+    return references
+
+
+def _name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _remember_blobs(sender, instance, **kwargs):
+    # Read the raw values so deferred fields are not loaded; a deferred field is left out rather than taken as empty
+    fields = instance.__dict__
+    instance._blobs = {field: _name(fields[field]) for field in sender._blob_fields if field in fields}
+
+
+def _blobs_saving(sender, instance, **kwargs):
+    # A field that was deferred and has since been assigned replaces a stored name we have not seen yet
+    previous = getattr(instance, '_blobs', {})
+    fields = [field for field in sender._blob_fields if field not in previous and field in instance.__dict__]
+    if fields and instance.pk is not None and not instance._state.adding:
+        stored = sender._default_manager.filter(pk=instance.pk).values(*fields).first() or {}
+        previous.update((field, stored.get(field) or '') for field in fields)
+        instance._blobs = previous
+
+
+def _blobs_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_blobs', {})
+    # Deferred fields that were never assigned are not written by save(), so their reference is unchanged
+    loaded = [field for field in sender._blob_fields if field in instance.__dict__]
+    current = {field: _name(getattr(instance, field)) for field in loaded}
+    for field, name in current.items():
+        if name != previous.get(field, ''):
+            adjust_references([name], 1)
+            adjust_references([previous.get(field, '')], -1)
+    instance._blobs = current
+
+
+def _blobs_deleted(sender, instance, **kwargs):
+    adjust_references([_name(getattr(instance, field)) for field in sender._blob_fields], -1)
+
+
+def connect_signals():
+    models = {}
+    for model, field in tracked_fields():
+        models.setdefault(model, []).append(field)
+    for model, fields in models.items():
+        model._blob_fields = fields
+        label = model._meta.label_lower
+        post_init.connect(_remember_blobs, sender=model, dispatch_uid=f'storage-{label}-init')
+        pre_save.connect(_blobs_saving, sender=model, dispatch_uid=f'storage-{label}-pre-save')
+        post_save.connect(_blobs_saved, sender=model, dispatch_uid=f'storage-{label}-save')
+        post_delete.connect(_blobs_deleted, sender=model, dispatch_uid=f'storage-{label}-delete')
@@ -0,0 +1,28 @@
+"""
+Helpers shared by the test modules of the apps.
+"""
+import tempfile
+
+from django.test import override_settings
+
+
+class TemporaryFilesMixin:
+    """For TestCases that write files: temporary directories and settings overridden for one test"""
+
+    def temporary_directory(self):
+        """A new empty directory that is removed after the test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+    def use_settings(self, **overrides):
+        """Override settings until the end of the test"""
+        override = override_settings(**overrides)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def temporary_media(self, **overrides):
+        """Point MEDIA_ROOT at a new temporary directory (and apply ``overrides``) for the test; returns the directory"""
+        media = self.temporary_directory()
+        self.use_settings(MEDIA_ROOT=media, **overrides)
+        return media
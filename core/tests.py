@@ -1,10 +1,43 @@
-from django.test import TestCase, Client
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.messages import get_messages
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils import timezone
 from unittest.mock import patch
-from .models import Iwi, Hapu, PasswordResetToken
+import view_logs
+from consultation.models import Proposal, VotingOption, Vote
+from events.models import Event
+from notice.models import ArchivedNotice, Notice
+from . import metrics, thumbnails
+from .cache import Namespace, invalidate_on_change, stats as cache_stats
+from .hierarchy import get_hierarchy
+from .logs import QueueFileHandler
+from .models import Iwi, Hapu, PasswordResetToken, Blob, ChunkedUpload, HapuLeader, HapuStats, IwiLeader, IwiStats
+from .roles import _namespace, get_role_profile
+from .search import index_members, search_members
+from .stats import get_dashboard_stats
+from .storage import attachment_storage
+from .testing import TemporaryFilesMixin
+from .thumbnails import has_thumbnail, thumbnail_name
+from .views import send_email_with_logging
 
 User = get_user_model()
 
@@ -304,4 +337,1016 @@ class UserLoginTestCase(TestCase):
         response = self.client.post(self.login_url, data)
         
         self.assertRedirects(response, self.dashboard_url)
-        self.assertTrue(response.wsgi_request.user.is_authenticated) 
\ No newline at end of file
+        self.assertTrue(response.wsgi_request.user.is_authenticated) 
+
+class HierarchyCacheTestCase(TestCase):
+    """Test cases for the cached iwi/hapu hierarchy and the get_hapus APIs"""
+
+    def setUp(self):
+        self.client = Client()
+        self.iwi = Iwi.objects.create(name='Test Iwi', description='Test Iwi Description')
+        self.other_iwi = Iwi.objects.create(name='Other Iwi', description='Other Iwi Description')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi, description='')
+        self.archived_hapu = Hapu.objects.create(name='Old Hapu', iwi=self.iwi, description='', is_archived=True)
+        self.url = reverse('get_hapus') + f'?iwi_id={self.iwi.id}'
+
+    def test_get_hapus_returns_active_hapus(self):
+        """Test that only non-archived hapu of the iwi are returned"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), [{'id': self.hapu.id, 'name': 'Test Hapu'}])
+        self.assertIn('ETag', response)
+
+    def test_get_hapus_served_from_cache(self):
+        """Test that repeated calls do not query the database"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_hapus_not_modified(self):
+        """Test that a matching If-None-Match gets a 304"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_hapus_invalid_iwi_id(self):
+        """Test that a malformed iwi id returns an empty list"""
+        response = self.client.get(reverse('get_hapus') + '?iwi_id=abc')
+        self.assertEqual(response.json(), [])
+
+    def test_hapu_save_invalidates_cache(self):
+        """Test that creating, archiving and transferring hapu refreshes the API"""
+        etag = self.client.get(self.url)['ETag']
+        new_hapu = Hapu.objects.create(name='New Hapu', iwi=self.iwi, description='')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([h['name'] for h in response.json()], ['New Hapu', 'Test Hapu'])
+
+        new_hapu.archive()
+        self.assertEqual([h['name'] for h in self.client.get(self.url).json()], ['Test Hapu'])
+
+        self.hapu.iwi = self.other_iwi
+        self.hapu.save()
+        self.assertEqual(self.client.get(self.url).json(), [])
+
+    def test_iwi_archive_invalidates_cache(self):
+        """Test that archiving an iwi removes it from the cached dropdown rows"""
+        self.assertIn(self.other_iwi.id, [iwi['id'] for iwi in get_hierarchy().iwi_rows()])
+        self.other_iwi.archive()
+        self.assertNotIn(self.other_iwi.id, [iwi['id'] for iwi in get_hierarchy().iwi_rows()])
+        self.other_iwi.unarchive()
+        self.assertIn(self.other_iwi.id, [iwi['id'] for iwi in get_hierarchy().iwi_rows()])
+
+    def test_get_hapus_htmx(self):
+        """Test that the HTMX partial renders options from the cache"""
+        response = self.client.get(reverse('get_hapus_htmx') + f'?id_iwi={self.iwi.id}')
+        self.assertContains(response, f'<option value="{self.hapu.id}">Test Hapu</option>', html=True)
+        self.assertNotContains(response, 'Old Hapu')
+
+    def test_registration_form_iwi_choices(self):
+        """Test that the registration form lists active iwi from the cache"""
+        self.other_iwi.archive()
+        response = self.client.get(reverse('register'))
+        self.assertContains(response, 'Test Iwi')
+        self.assertNotContains(response, 'Other Iwi')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheNamespaceTestCase(TestCase):
+    """Test cases for the namespaced, versioned cache helpers"""
+
+    def setUp(self):
+        cache.clear()
+        self.namespace = Namespace('test')
+        self.other = Namespace('other')
+
+    def test_get_set(self):
+        """Test that values round-trip and None is distinguishable from a miss"""
+        self.assertIsNone(self.namespace.get('key'))
+        self.namespace.set('key', None)
+        self.assertEqual(self.namespace.get('key', 'missing'), None)
+        self.namespace.set(('user', 1), {'a': 1})
+        self.assertEqual(self.namespace.get(('user', 1)), {'a': 1})
+
+    def test_namespaces_are_isolated(self):
+        """Test that the same key in two namespaces holds separate values"""
+        self.namespace.set('key', 1)
+        self.other.set('key', 2)
+        self.assertEqual(self.namespace.get('key'), 1)
+        self.assertEqual(self.other.get('key'), 2)
+
+    def test_invalidate(self):
+        """Test that invalidating a namespace drops all its keys but no others"""
+        self.namespace.set('a', 1)
+        self.namespace.set('b', 2)
+        self.other.set('a', 3)
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get('a'))
+        self.assertIsNone(self.namespace.get('b'))
+        self.assertEqual(self.other.get('a'), 3)
+
+    def test_get_or_set(self):
+        """Test that the default is only computed on a miss"""
+        calls = []
+        def compute():
+            calls.append(1)
+            return 'value'
+        self.assertEqual(self.namespace.get_or_set('key', compute), 'value')
+        self.assertEqual(self.namespace.get_or_set('key', compute), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_hit_miss_counters(self):
+        """Test that lookups are counted per namespace"""
+        before = cache_stats().get('test', {'hits': 0, 'misses': 0})
+        self.namespace.get('key')
+        self.namespace.set('key', 1)
+        self.namespace.get('key')
+        after = cache_stats()['test']
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    def test_invalidate_on_change(self):
+        """Test that model signals invalidate a registered namespace"""
+        invalidate_on_change(self.namespace, Iwi)
+        self.namespace.set('key', 1)
+        Iwi.objects.create(name='Signal Iwi')
+        self.assertIsNone(self.namespace.get('key'))
+
+    def test_rebuild_before_commit_is_discarded(self):
+        """Test that a value cached between a save and its commit does not survive the commit"""
+        invalidate_on_change(self.namespace, Iwi)
+        with self.captureOnCommitCallbacks(execute=True):
+            Iwi.objects.create(name='Uncommitted Iwi')
+            # Another worker rebuilds from the data it can see before the commit
+            self.namespace.set('key', 'stale')
+        self.assertIsNone(self.namespace.get('key'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RoleProfileTestCase(TestCase):
+    """Test cases for the cached leadership role profile"""
+
+    def setUp(self):
+        cache.clear()
+        self.iwi = Iwi.objects.create(name='Role Iwi')
+        self.other_iwi = Iwi.objects.create(name='Other Iwi')
+        self.hapu = Hapu.objects.create(name='Role Hapu', iwi=self.iwi)
+        self.other_hapu = Hapu.objects.create(name='Other Hapu', iwi=self.other_iwi)
+        self.user = User.objects.create_user(
+            email='leader@example.com', password='testpass123', full_name='Leader', iwi=self.iwi, hapu=self.hapu
+        )
+        IwiLeader.objects.create(user=self.user, iwi=self.iwi)
+        HapuLeader.objects.create(user=self.user, hapu=self.other_hapu)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_profile_contents(self):
+        """Test that the profile lists the iwi and hapu the user leads"""
+        profile = get_role_profile(self.fresh_user())
+        self.assertEqual(profile.iwi_ids, {self.iwi.id})
+        self.assertEqual(profile.hapu_ids, {self.other_hapu.id})
+        self.assertTrue(profile.is_leader_or_admin)
+        self.assertTrue(profile.leads_iwi(str(self.iwi.id)))
+        self.assertFalse(profile.leads_hapu('not-an-id'))
+        self.assertTrue(profile.can_manage_hapu(self.hapu))
+        self.assertTrue(profile.can_manage_hapu(self.other_hapu))
+
+    def test_profile_loaded_once(self):
+        """Test that the profile costs one query, then none once cached"""
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            get_role_profile(user)
+            get_role_profile(user)
+        # A later request gets a new user object but the profile comes from the cache
+        with self.assertNumQueries(0):
+            get_role_profile(User(pk=self.user.pk, email=self.user.email))
+
+    def test_leadership_change_invalidates(self):
+        """Test that adding or removing a leadership refreshes the cached profile"""
+        get_role_profile(self.fresh_user())
+        HapuLeader.objects.create(user=self.user, hapu=self.hapu)
+        self.assertIn(self.hapu.id, get_role_profile(self.fresh_user()).hapu_ids)
+        HapuLeader.objects.filter(user=self.user).delete()
+        self.assertFalse(get_role_profile(self.fresh_user()).is_hapu_leader)
+
+    def test_profile_cached_before_commit_is_dropped(self):
+        """Test that a profile rebuilt before a leadership change commits is dropped by the commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            HapuLeader.objects.create(user=self.user, hapu=self.hapu)
+            _namespace.set(self.user.id, 'stale')
+        self.assertIsNone(_namespace.get(self.user.id))
+
+    def test_anonymous_and_member(self):
+        """Test that anonymous users and plain members have an empty profile"""
+        self.assertFalse(get_role_profile(AnonymousUser()).is_leader_or_admin)
+        member = User.objects.create_user(email='member@example.com', password='testpass123', full_name='Member')
+        self.assertFalse(get_role_profile(member).is_leader_or_admin)
+        admin = User.objects.create_user(email='admin@example.com', password='testpass123', full_name='Admin', is_staff=True)
+        self.assertTrue(get_role_profile(admin).is_leader_or_admin)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardStatsTestCase(TestCase):
+    """Test cases for the cached admin dashboard counters"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', full_name='Admin', is_staff=True, state='VERIFIED'
+        )
+        self.iwi = Iwi.objects.create(name='Stats Iwi')
+        Hapu.objects.create(name='Stats Hapu', iwi=self.iwi)
+        User.objects.create_user(email='pending@example.com', password='testpass123', full_name='Pending')
+
+    def test_counters(self):
+        """Test that the dashboard shows users by state and activity counts"""
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['total_users'], 2)
+        self.assertEqual(stats['pending_verifications'], 1)
+        self.assertEqual(stats['users_by_state']['VERIFIED'], 1)
+        self.assertEqual(stats['users_by_state']['REJECTED'], 0)
+        self.assertEqual(stats['total_iwis'], 1)
+        self.assertEqual(stats['total_hapus'], 1)
+        self.assertEqual(stats['active_consultations'], 0)
+
+    def test_dashboard_served_from_cache(self):
+        """Test that a repeat dashboard visit runs no counting queries"""
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):  # session and user lookups only
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Pending verification')
+
+    def test_changes_invalidate(self):
+        """Test that new users refresh the counters but logins do not"""
+        get_dashboard_stats()
+        User.objects.create_user(email='new@example.com', password='testpass123', full_name='New')
+        self.assertEqual(get_dashboard_stats()['pending_verifications'], 2)
+        self.admin.save(update_fields=['last_login'])  # as done on every login
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+
+    def test_only_counted_fields_invalidate(self):
+        """Test that profile edits keep the counters but a state change recounts them"""
+        member = User.objects.get(email='pending@example.com')
+        get_dashboard_stats()
+        member.full_name = 'Renamed'
+        member.save()
+        self.iwi.description = 'Edited'
+        self.iwi.save()
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+        member.state = 'VERIFIED'
+        member.save()
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['pending_verifications'], 0)
+        self.assertEqual(stats['users_by_state']['VERIFIED'], 2)
+        self.iwi.is_archived = True
+        self.iwi.save()
+        self.assertEqual(get_dashboard_stats()['total_iwis'], 0)
+
+
+class MembershipStatsTestCase(TestCase):
+    """Test cases for the materialised iwi and hapu membership statistics"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Stats Iwi')
+        self.hapu = Hapu.objects.create(name='Stats Hapu', iwi=self.iwi)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', full_name='Admin', is_staff=True, state='VERIFIED'
+        )
+
+    def stats(self):
+        return IwiStats.objects.get(iwi=self.iwi), HapuStats.objects.get(hapu=self.hapu)
+
+    def test_refreshed_on_membership_changes(self):
+        """Test that joining, verification and leadership changes update the rows"""
+        with self.captureOnCommitCallbacks(execute=True):
+            member = User.objects.create_user(
+                email='member@example.com', password='testpass123', full_name='Member', iwi=self.iwi, hapu=self.hapu
+            )
+        iwi_stats, hapu_stats = self.stats()
+        self.assertEqual((iwi_stats.pending_members, iwi_stats.verified_members), (1, 0))
+        self.assertEqual(hapu_stats.pending_members, 1)
+        self.assertEqual(iwi_stats.hapu_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            member.state = 'VERIFIED'
+            member.save()
+            IwiLeader.objects.create(iwi=self.iwi, user=member)
+        iwi_stats, hapu_stats = self.stats()
+        self.assertEqual((iwi_stats.pending_members, iwi_stats.verified_members), (0, 1))
+        self.assertEqual(iwi_stats.leader_count, 1)
+        self.assertEqual(hapu_stats.verified_members, 1)
+
+    def test_refresh_without_conflict_target(self):
+        """Test that the refresh also runs on databases like MySQL that take no upsert conflict target"""
+        bulk_create = QuerySet.bulk_create
+        calls = []
+
+        def spy(queryset, objs, **kwargs):
+            if queryset.model in (IwiStats, HapuStats):
+                calls.append(kwargs)
+            return bulk_create(queryset, objs, **kwargs)
+
+        with patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                patch.object(QuerySet, 'bulk_create', spy):
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.create_user(
+                    email='member@example.com', password='testpass123', full_name='Member', iwi=self.iwi, hapu=self.hapu
+                )
+        self.assertTrue(calls)
+        for kwargs in calls:
+            self.assertTrue(kwargs['update_conflicts'])
+            self.assertNotIn('unique_fields', kwargs)
+        iwi_stats, hapu_stats = self.stats()
+        self.assertEqual((iwi_stats.pending_members, hapu_stats.pending_members), (1, 1))
+
+    def test_login_does_not_refresh(self):
+        """Test that saves which leave membership untouched schedule nothing"""
+        member = User.objects.create_user(email='member@example.com', password='testpass123', full_name='Member')
+        member = User.objects.get(pk=member.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            member.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_detail_and_list_pages(self):
+        """Test that the pages show the statistics, computing missing rows on demand"""
+        IwiStats.objects.all().delete()
+        User.objects.create_user(
+            email='member@example.com', password='testpass123', full_name='Member', iwi=self.iwi, state='VERIFIED'
+        )
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('iwimgmt:iwi_detail', args=[self.iwi.id]))
+        self.assertContains(response, 'Pending Verification')
+        self.assertEqual(response.context['iwi'].stats.verified_members, 1)
+        self.client.get(reverse('iwimgmt:iwi_list'))
+        with self.assertNumQueries(4):  # session, user, count, page
+            self.client.get(reverse('iwimgmt:iwi_list'))
+
+    def test_refresh_command(self):
+        """Test that the management command rebuilds every row"""
+        IwiStats.objects.all().delete()
+        HapuStats.objects.all().delete()
+        out = StringIO()
+        call_command('refresh_membership_stats', stdout=out)
+        self.assertIn('1 iwis and 1 hapus', out.getvalue())
+        self.assertTrue(HapuStats.objects.filter(hapu=self.hapu).exists())
+
+
+class MemberSearchTestCase(TestCase):
+    """Test member search by name, email and iwi/hapu name"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Ngāti Whātua')
+        self.hapu = Hapu.objects.create(name='Te Taoū', iwi=self.iwi)
+        self.other_iwi = Iwi.objects.create(name='Tainui')
+        self.aroha = User.objects.create_user(
+            email='aroha.smith@example.com', password='pass', full_name='Aroha Smith', iwi=self.iwi, hapu=self.hapu
+        )
+        self.rangi = User.objects.create_user(
+            email='rangi@example.com', password='pass', full_name='Rangi Parata', iwi=self.iwi
+        )
+        self.mere = User.objects.create_user(
+            email='mere.k@example.org', password='pass', full_name='Mere Kingi', iwi=self.other_iwi
+        )
+
+    def search(self, query, users=None):
+        return search_members(query, users)
+
+    def test_matches_word_prefixes_of_name(self):
+        """Each word matches the start of a word in the full name"""
+        self.assertEqual(self.search('aro'), [self.aroha])
+        self.assertEqual(self.search('Parata'), [self.rangi])
+        self.assertEqual(self.search('rangi par'), [self.rangi])
+        self.assertEqual(self.search('rangi smith'), [])
+
+    def test_matches_email_prefix(self):
+        self.assertEqual(self.search('mere.k'), [self.mere])
+
+    def test_iwi_and_hapu_names_list_their_members(self):
+        """Searching an iwi or hapu name lists its members after direct matches"""
+        self.assertEqual(self.search('whātua'), [self.aroha, self.rangi])
+        self.assertEqual(self.search('taoū'), [self.aroha])
+
+    def test_scoped_to_given_users(self):
+        users = User.objects.filter(iwi=self.other_iwi)
+        self.assertEqual(self.search('whātua', users), [])
+        self.assertEqual(self.search('mere', users), [self.mere])
+
+    def test_boolean_operators_are_ignored(self):
+        """Characters with a meaning in MySQL boolean mode are stripped from the query"""
+        self.assertEqual(self.search('+aroha* -"'), [self.aroha])
+        self.assertEqual(self.search('()'), [])
+
+    def test_query_count_is_fixed(self):
+        with self.assertNumQueries(2):
+            self.search('tainui')
+
+    def test_fallback_matches_indexed_word_prefixes(self):
+        """Test that words inside a name are matched on the word table, never with a leading wildcard"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('par'), [self.rangi])
+        self.assertNotIn("'%", queries[0]['sql'])
+        self.assertIn('core_membersearchword', queries[0]['sql'])
+
+    def test_words_follow_renames_and_bulk_imports(self):
+        """Test that saves keep the search words current and index_members covers bulk_create"""
+        self.rangi.full_name = 'Rangi Walker'
+        self.rangi.save()
+        self.assertEqual(self.search('walker'), [self.rangi])
+        self.assertEqual(self.search('parata'), [])
+        with self.assertNumQueries(1):
+            self.rangi.save(update_fields=['last_login'])
+        User.objects.bulk_create([User(email='hone@example.com', full_name='Hone Heke')])
+        self.assertEqual(self.search('heke'), [])
+        index_members(User.objects.filter(email='hone@example.com').values_list('pk', flat=True))
+        self.assertEqual([user.email for user in self.search('heke')], ['hone@example.com'])
+
+
+class ImportMembersCommandTestCase(TemporaryFilesMixin, TestCase):
+    """Test the import_members management command"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Ngāti Import')
+        self.hapu = Hapu.objects.create(name='Te Hapu', iwi=self.iwi)
+        self.other_iwi = Iwi.objects.create(name='Other Iwi')
+        User.objects.create_user(email='taken@example.com', password='pass', full_name='Existing')
+        self.tmpdir = self.temporary_directory()
+
+    def write_csv(self, text):
+        path = os.path.join(self.tmpdir, 'members.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, text, *args):
+        out = StringIO()
+        call_command('import_members', self.write_csv(text), '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_valid_rows_and_reports_errors(self):
+        output = self.run_import(
+            'full_name,email,iwi,hapu,state,password\n'
+            'Aroha One,aroha@example.com,ngāti import,Te Hapu,,secret123\n'
+            'Rangi Two,rangi@example.com,Ngāti Import,,PENDING_VERIFICATION,\n'
+            'Bad Email,not-an-email,Ngāti Import,,,\n'
+            'Dup,aroha@example.com,Ngāti Import,,,\n'
+            'Taken,taken@example.com,Ngāti Import,,,\n'
+            'Wrong Hapu,wrong@example.com,Other Iwi,Te Hapu,,\n'
+            'No Iwi,noiwi@example.com,Missing Iwi,,,\n'
+        )
+        self.assertIn('Successfully imported 2 members, skipped 5 rows', output)
+        self.assertIn('rows/s', output)
+        self.assertIn('line 4: invalid email', output)
+        self.assertIn('line 5: aroha@example.com appears more than once', output)
+        self.assertIn('line 6: taken@example.com is already registered', output)
+        aroha = User.objects.get(email='aroha@example.com')
+        self.assertEqual((aroha.iwi, aroha.hapu, aroha.state), (self.iwi, self.hapu, 'VERIFIED'))
+        self.assertTrue(aroha.check_password('secret123'))
+        rangi = User.objects.get(email='rangi@example.com')
+        self.assertEqual(rangi.state, 'PENDING_VERIFICATION')
+        self.assertFalse(rangi.has_usable_password())
+        # Members without a password get a set-password token instead
+        self.assertEqual(list(PasswordResetToken.objects.values_list('user__email', flat=True)), ['rangi@example.com'])
+
+    def test_refreshes_membership_stats(self):
+        self.run_import('full_name,email,iwi\nA,a@example.com,Ngāti Import\nB,b@example.com,Ngāti Import\n')
+        self.assertEqual(IwiStats.objects.get(iwi=self.iwi).verified_members, 2)
+
+    def test_dry_run_imports_nothing(self):
+        output = self.run_import('full_name,email,iwi\nA,a@example.com,Ngāti Import\n', '--dry-run')
+        self.assertIn('Would import 1 members', output)
+        self.assertFalse(User.objects.filter(email='a@example.com').exists())
+
+    def test_batches_and_token_file(self):
+        token_file = os.path.join(self.tmpdir, 'tokens.csv')
+        rows = ''.join(f'Member {i},m{i}@example.com,{self.iwi.pk}\n' for i in range(25))
+        self.run_import('full_name,email,iwi\n' + rows, '--batch-size', '10', '--token-file', token_file)
+        self.assertEqual(User.objects.filter(iwi=self.iwi).count(), 25)
+        with open(token_file) as f:
+            tokens = list(csv.DictReader(f))
+        self.assertEqual(len(tokens), 25)
+        self.assertTrue(PasswordResetToken.objects.filter(token=tokens[0]['token'], user__email=tokens[0]['email']).exists())
+
+    def test_missing_columns(self):
+        with self.assertRaises(CommandError):
+            self.run_import('name,email\nA,a@example.com\n')
+
+    def test_hashes_passwords_in_worker_processes(self):
+        path = self.write_csv('full_name,email,iwi,password\nA,a@example.com,Ngāti Import,pw-one\nB,b@example.com,Ngāti Import,pw-two\n')
+        call_command('import_members', path, '--workers', '2', stdout=StringIO())
+        self.assertTrue(User.objects.get(email='b@example.com').check_password('pw-two'))
+
+
+class DocumentThumbnailGenerationTestCase(TemporaryFilesMixin, TestCase):
+    """Thumbnail generation for uploaded documents (needs Pillow)"""
+
+    def setUp(self):
+        if thumbnails.Image is None:
+            self.skipTest('Pillow is not installed')
+        self.temporary_media()
+
+    def image_upload(self):
+        buffer = BytesIO()
+        thumbnails.Image.new('RGB', (1200, 800), 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile('id.png', buffer.getvalue(), content_type='image/png')
+
+    def test_thumbnail_created_after_registration_commits(self):
+        iwi = Iwi.objects.create(name='Thumb Iwi')
+        class ImmediateThread:
+            def __init__(self, target, args, daemon):
+                self.run = lambda: target(*args)
+
+            def start(self):
+                self.run()
+
+        with patch('core.thumbnails.threading') as threading, self.captureOnCommitCallbacks(execute=True):
+            threading.Thread = ImmediateThread
+            self.client.post(reverse('register'), {
+                'full_name': 'Thumb User', 'email': 'thumb@example.com', 'password': 'StrongPass123!',
+                'confirm_password': 'StrongPass123!', 'iwi': iwi.id, 'citizenship_document': self.image_upload(),
+            })
+        user = User.objects.get(email='thumb@example.com')
+        with thumbnails.Image.open(os.path.join(settings.MEDIA_ROOT, thumbnail_name(user.citizenship_document.name))) as image:
+            self.assertLessEqual(max(image.size), 320)
+
+    def test_backfill_command(self):
+        user = User.objects.create_user(
+            email='old@example.com', password='pass', full_name='Old', citizenship_document=self.image_upload()
+        )
+        out = StringIO()
+        call_command('generate_document_thumbnails', stdout=out)
+        self.assertIn('Successfully created 1 thumbnails', out.getvalue())
+        self.assertTrue(has_thumbnail(user.citizenship_document.name))
+
+
+class AttachmentStorageTestCase(TemporaryFilesMixin, TestCase):
+    """Deduplicated, reference-counted storage of event and notice attachments"""
+
+    def setUp(self):
+        self.temporary_media()
+        self.user = User.objects.create_user(email='poster@example.com', password='pass', full_name='Poster')
+
+    def notice(self, content=b'flyer', name='flyer.png'):
+        return Notice.objects.create(
+            title='Hui', content='Come along', created_by=self.user, expiry_date=timezone.now() + timedelta(days=7),
+            attachment=SimpleUploadedFile(name, content, content_type='image/png'),
+        )
+
+    def blob(self, name):
+        return Blob.objects.get(name=name)
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.notice()
+        second = self.notice(name='copy-of-flyer.PNG')
+        event = Event.objects.create(
+            title='Hui', description='Hui', start_datetime=timezone.now(), end_datetime=timezone.now(),
+            created_by=self.user, attachment=SimpleUploadedFile('logo.png', b'flyer', content_type='image/png'),
+        )
+        digest = hashlib.sha256(b'flyer').hexdigest()
+        self.assertEqual(first.attachment.name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual({first.attachment.name, second.attachment.name, event.attachment.name}, {first.attachment.name})
+        self.assertEqual(self.blob(first.attachment.name).ref_count, 3)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'blobs/tmp'))), 0)
+        with first.attachment.open('rb') as file:
+            self.assertEqual(file.read(), b'flyer')
+
+    def test_references_follow_edits_and_deletes(self):
+        notice = self.notice()
+        other = self.notice()
+        old_name = notice.attachment.name
+        notice = Notice.objects.get(pk=notice.pk)
+        notice.attachment.save('new.png', ContentFile(b'new flyer'))
+        self.assertEqual(self.blob(old_name).ref_count, 1)
+        self.assertEqual(self.blob(notice.attachment.name).ref_count, 1)
+        other.delete()
+        self.assertEqual(self.blob(old_name).ref_count, 0)
+        # The file stays on disk until cleanup_blobs removes it
+        self.assertTrue(notice.attachment.storage.exists(old_name))
+
+    def test_deferred_attachment_keeps_its_references(self):
+        notice = self.notice()
+        name = notice.attachment.name
+        deferred = Notice.objects.defer('attachment').get(pk=notice.pk)
+        deferred.title = 'Renamed'
+        deferred.save()
+        Notice.objects.only('title').get(pk=notice.pk).save()
+        self.assertEqual(self.blob(name).ref_count, 1)
+        # Assigned after a deferred load, the old name is looked up so its reference is released
+        deferred = Notice.objects.defer('attachment').get(pk=notice.pk)
+        deferred.attachment = ContentFile(b'other flyer', name='other.png')
+        deferred.save()
+        self.assertEqual(self.blob(name).ref_count, 0)
+        self.assertEqual(self.blob(deferred.attachment.name).ref_count, 1)
+
+    def test_archived_notices_keep_their_attachment(self):
+        notice = self.notice()
+        name = notice.attachment.name
+        notice.expiry_date = timezone.now() - timedelta(days=400)
+        notice.save()
+        call_command('archive_expired_notices', '--retention-days', '90', stdout=StringIO())
+        self.assertEqual(self.blob(name).ref_count, 1)
+
+    def test_cleanup_deletes_unreferenced_blobs_after_grace_period(self):
+        kept = self.notice(b'kept')
+        dropped = self.notice(b'dropped')
+        name = dropped.attachment.name
+        dropped.delete()
+        out = StringIO()
+        call_command('cleanup_blobs', stdout=out)
+        self.assertIn('deleted 0 unreferenced blobs', out.getvalue())
+
+        out = StringIO()
+        call_command('cleanup_blobs', '--grace-hours', '-1', stdout=out)
+        self.assertIn('deleted 1 unreferenced blobs', out.getvalue())
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+        self.assertFalse(kept.attachment.storage.exists(name))
+        self.assertTrue(kept.attachment.storage.exists(kept.attachment.name))
+
+    def test_upload_during_cleanup_keeps_its_file(self):
+        """Test that an upload of a blob's content while cleanup deletes that blob leaves the new copy on disk"""
+        name = self.notice(b'reused').attachment.name
+        cutoff = timezone.now() - timedelta(hours=1)
+
+        def delete_row_then_upload():
+            # The row goes first, then the same content is uploaded before the file is removed
+            Blob.objects.filter(name=name).update(ref_count=0, last_used_at=cutoff - timedelta(hours=1))
+            deleted = Blob.objects.filter(name=name, ref_count__lte=0, last_used_at__lt=cutoff).delete()[0]
+            self.notice(b'reused')
+            return bool(deleted)
+
+        self.assertTrue(attachment_storage.purge(name, delete_row_then_upload))
+        self.assertTrue(attachment_storage.exists(name))
+        self.assertEqual(self.blob(name).ref_count, 1)
+
+        def upload_then_delete_row():
+            # The upload touches the row before the delete, which then finds it in use
+            Blob.objects.filter(name=name).update(ref_count=0, last_used_at=cutoff - timedelta(hours=1))
+            self.notice(b'reused')
+            return bool(Blob.objects.filter(name=name, ref_count__lte=0, last_used_at__lt=cutoff).delete()[0])
+
+        self.assertFalse(attachment_storage.purge(name, upload_then_delete_row))
+        self.assertTrue(attachment_storage.exists(name))
+        with attachment_storage.open(name) as file:
+            self.assertEqual(file.read(), b'reused')
+        self.assertEqual(os.listdir(attachment_storage.path('blobs/deleted')), [])
+
+    def test_cleanup_recount_repairs_drifted_counts(self):
+        notice = self.notice()
+        Blob.objects.update(ref_count=0)
+        out = StringIO()
+        call_command('cleanup_blobs', '--grace-hours', '-1', stdout=out)
+        # A zero count is checked against the columns before anything is deleted
+        self.assertIn('deleted 0 unreferenced blobs', out.getvalue())
+        call_command('cleanup_blobs', '--recount', stdout=StringIO())
+        self.assertEqual(self.blob(notice.attachment.name).ref_count, 1)
+
+
+class OrphanedMediaCommandTestCase(TemporaryFilesMixin, TestCase):
+    """Finding and deleting media files nothing refers to"""
+
+    def setUp(self):
+        self.media = self.temporary_media()
+
+    def write(self, name, age_hours=48):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'data')
+        modified = time.time() - age_hours * 3600
+        os.utime(path, (modified, modified))
+        return path
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('cleanup_orphaned_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_and_deletes_only_unreferenced_old_files(self):
+        User.objects.create_user(
+            email='doc@example.com', password='pass', full_name='Doc',
+            citizenship_document='protected_citizenship_docs/kept.pdf',
+        )
+        ArchivedNotice.objects.create(
+            original_id=1, title='Old', content='Old', attachment='notice_attachments/archived.png',
+            expiry_date=timezone.now(), created_at=timezone.now(),
+        )
+        kept = [
+            self.write('protected_citizenship_docs/kept.pdf'),
+            self.write('protected_citizenship_docs/kept.thumb.jpg'),
+            self.write('notice_attachments/archived.png'),
+            self.write('notice_attachments/recent.png', age_hours=1),
+            self.write('blobs/aa/bb/unreferenced.png'),
+        ]
+        orphan = self.write('protected_citizenship_docs/rejected.pdf')
+        old_attachment = self.write('event_attachments/replaced.png')
+
+        output = self.run_command()
+        self.assertIn('Found 2 orphaned files (8 bytes) of 6 scanned', output)
+        self.assertTrue(os.path.exists(orphan))
+
+        output = self.run_command('--delete')
+        self.assertIn('Successfully deleted 2 orphaned files', output)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(old_attachment))
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+
+
+class ChunkedUploadTestCase(TemporaryFilesMixin, TestCase):
+    """Chunked, resumable uploads handed to the registration and notice forms"""
+
+    PDF = b'%PDF-1.4 ' + b'x' * 40
+
+    def setUp(self):
+        media = self.temporary_media(MAX_UPLOAD_SIZE=1000)
+        self.use_settings(CHUNKED_UPLOAD_DIR=f'{media}/uploads')
+        chunk_size = patch('core.uploads.CHUNK_SIZE', 16)
+        chunk_size.start()
+        self.addCleanup(chunk_size.stop)
+        self.iwi = Iwi.objects.create(name='Upload Iwi')
+
+    def start(self, content=PDF, purpose='citizenship_document', filename='id.pdf'):
+        return self.client.post(reverse('upload_start'), {'purpose': purpose, 'filename': filename, 'size': len(content)})
+
+    def send(self, url, content, offset):
+        return self.client.generic(
+            'PATCH', url, content[offset:offset + 16], content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, content=PDF, **kwargs):
+        state = self.start(content, **kwargs).json()
+        while not state['complete']:
+            response = self.send(state['url'], content, state['offset'])
+            self.assertEqual(response.status_code, 200, response.content)
+            state = response.json()
+        return state
+
+    def test_resumes_from_received_offset(self):
+        state = self.start().json()
+        self.assertEqual(self.send(state['url'], self.PDF, 0).json()['offset'], 16)
+        # A retried chunk at a stale offset is refused with the offset to continue from
+        response = self.send(state['url'], self.PDF, 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 16)
+        self.assertEqual(self.client.get(state['url'])['Upload-Offset'], '16')
+        for offset in (16, 32, 48):
+            state = self.send(state['url'], self.PDF, offset).json()
+        self.assertTrue(state['complete'])
+
+    def test_registration_uses_finished_upload(self):
+        state = self.upload()
+        self.client.post(reverse('register'), {
+            'full_name': 'Chunk User', 'email': 'chunk@example.com', 'password': 'StrongPass123!',
+            'confirm_password': 'StrongPass123!', 'iwi': self.iwi.id, 'citizenship_document_upload': state['id'],
+        })
+        user = User.objects.get(email='chunk@example.com')
+        with user.citizenship_document.open('rb') as document:
+            self.assertEqual(document.read(), self.PDF)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+
+    def test_content_is_checked_on_completion(self):
+        state = self.start(b'<html>not a pdf</html>').json()
+        self.send(state['url'], b'<html>not a pdf</html>', 0)
+        response = self.send(state['url'], b'<html>not a pdf</html>', 16)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_limits_and_ownership(self):
+        self.assertEqual(self.start(b'%PDF' * 300).status_code, 400)
+        self.assertEqual(self.start(filename='id.exe').status_code, 400)
+        self.assertEqual(self.start(purpose='notice_attachment').status_code, 403)
+        url = self.start().json()['url']
+        self.client.logout()
+        other = Client()
+        self.assertEqual(other.get(url).status_code, 404)
+        self.assertEqual(other.generic('PATCH', url, b'x', HTTP_UPLOAD_OFFSET='0').status_code, 404)
+
+    def cookieless_upload(self, address, content=PDF, send=True):
+        """Start (and unless ``send`` is false, finish) an upload from a client that keeps no cookie afterwards"""
+        client = Client(REMOTE_ADDR=address)
+        response = client.post(
+            reverse('upload_start'), {'purpose': 'citizenship_document', 'filename': 'id.pdf', 'size': len(content)}
+        )
+        if response.status_code != 201 or not send:
+            return response
+        state = response.json()
+        while not state['complete']:
+            response = client.generic(
+                'PATCH', state['url'], content[state['offset']:state['offset'] + 16],
+                content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(state['offset']),
+            )
+            if response.status_code != 200:
+                return response
+            state = response.json()
+        return response
+
+    @override_settings(ANONYMOUS_UPLOADS_PER_IP=3)
+    def test_finished_uploads_count_against_the_address(self):
+        for _ in range(3):
+            self.assertTrue(self.cookieless_upload('203.0.113.5').json()['complete'])
+        self.assertEqual(self.cookieless_upload('203.0.113.5').status_code, 429)
+        self.assertEqual(self.cookieless_upload('203.0.113.6').status_code, 200)
+
+    @override_settings(ANONYMOUS_UPLOADS_PER_IP=3, ANONYMOUS_UPLOAD_LIMIT=100)
+    def test_reserved_uploads_do_not_use_up_the_total(self):
+        for number in range(10):
+            response = self.cookieless_upload(f'203.0.113.{number}', b'%PDF' * 250, send=False)
+            self.assertEqual(response.status_code, 201)
+        # Nothing was received, so a real registration can still upload its document
+        self.assertTrue(self.cookieless_upload('198.51.100.1').json()['complete'])
+        # Bytes that are received are charged until the total is reached
+        self.assertEqual(self.cookieless_upload('198.51.100.2').status_code, 200)
+        self.assertEqual(self.cookieless_upload('198.51.100.3').status_code, 429)
+
+    def test_notice_attachment_upload(self):
+        staff = User.objects.create_user(
+            email='staff@example.com', password='pass', full_name='Staff', is_staff=True, state='VERIFIED'
+        )
+        self.client.force_login(staff)
+        png = b'\x89PNG\r\n\x1a\n' + b'p' * 30
+        state = self.upload(png, purpose='notice_attachment', filename='flyer.png')
+        self.client.post(reverse('notice:create_notice'), {
+            'title': 'Big flyer', 'content': 'A flyer sent in chunks', 'audience': 'ALL', 'priority': 1,
+            'expiry_date': (timezone.localtime() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M'),
+            'attachment_upload': state['id'],
+        })
+        notice = Notice.objects.get(title='Big flyer')
+        with notice.attachment.open('rb') as attachment:
+            self.assertEqual(attachment.read(), png)
+
+    def test_cleanup_expired_uploads(self):
+        self.start()
+        ChunkedUpload.objects.update(created_at=timezone.now() - timedelta(hours=48))
+        out = StringIO()
+        call_command('cleanup_expired_uploads', stdout=out)
+        self.assertIn('Successfully deleted 1 expired uploads', out.getvalue())
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+
+class StructuredLoggingTestCase(TemporaryFilesMixin, TestCase):
+    """JSON-lines log files and the view_logs.py reader"""
+
+    def setUp(self):
+        self.path = f'{self.temporary_directory()}/test.log'
+
+    def handler(self, **kwargs):
+        handler = QueueFileHandler(self.path, **kwargs)
+        logger = logging.getLogger('core.tests.structured')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.addCleanup(handler.close)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger, handler
+
+    def test_records_are_written_as_json_lines(self):
+        logger, handler = self.handler()
+        logger.warning('Sent %s emails', 3, extra={'email_type': 'welcome'})
+        try:
+            raise ValueError('bad address')
+        except ValueError:
+            logger.exception('Send failed')
+        handler.flush()
+        with open(self.path) as file:
+            first, second = [json.loads(line) for line in file]
+        self.assertEqual(first['message'], 'Sent 3 emails')
+        self.assertEqual(first['level'], 'WARNING')
+        self.assertEqual(first['logger'], 'core.tests.structured')
+        self.assertEqual(first['email_type'], 'welcome')
+        self.assertIn('ValueError: bad address', second['exc'])
+
+    def test_rotates_by_size(self):
+        logger, handler = self.handler(max_bytes=500, backup_count=2, batch_size=1)
+        for number in range(30):
+            logger.warning('entry %s', number)
+        handler.flush()
+        self.assertTrue(os.path.exists(f'{self.path}.1'))
+        self.assertFalse(os.path.exists(f'{self.path}.3'))
+        self.assertLessEqual(os.path.getsize(self.path), 500)
+
+    def test_waiting_records_are_written_together(self):
+        logger, handler = self.handler()
+        handler.listener.stop()
+        for number in range(50):
+            logger.info('queued %s', number)
+        with patch.object(handler.target.stream, 'write', wraps=handler.target.stream.write) as write:
+            handler.listener.start()
+            handler.flush()
+        self.assertEqual(write.call_count, 1)
+        with open(self.path) as file:
+            self.assertEqual(len(file.readlines()), 50)
+
+    def test_view_logs_tail_and_time_range(self):
+        start = datetime(2025, 6, 1, tzinfo=dt_timezone.utc)
+        with open(self.path, 'w') as file:
+            file.write('INFO 2025-05-31 12:00:00,000 views 1 1 plain text entry\n')
+            for number in range(5000):
+                file.write(json.dumps({
+                    'ts': (start + timedelta(seconds=number)).isoformat(),
+                    'level': 'ERROR' if number % 10 == 0 else 'INFO',
+                    'logger': 'core.cache' if number % 2 else 'django.request',
+                    'message': f'entry {number}',
+                }) + '\n')
+        with open(self.path, 'rb') as file:
+            last = view_logs.tail(file, 2, view_logs.Filter(level='ERROR'))
+            self.assertEqual([entry['message'] for entry in last], ['entry 4980', 'entry 4990'])
+            range_filter = view_logs.Filter(
+                logger='django', since=start + timedelta(seconds=4000), until=start + timedelta(seconds=4004),
+            )
+            view_logs.seek_to_time(file, range_filter.since)
+            self.assertEqual(
+                [entry['message'] for entry in view_logs.forward(file, range_filter)],
+                ['entry 4000', 'entry 4002', 'entry 4004'],
+            )
+            file.seek(0)
+            self.assertEqual(next(view_logs.forward(file, view_logs.Filter()))['raw'][:4], 'INFO')
+
+
+class MetricsTestCase(TemporaryFilesMixin, TestCase):
+    """The /metrics endpoint and its aggregation across worker processes"""
+
+    def setUp(self):
+        self.directory = self.temporary_directory()
+        self.use_settings(METRICS_DIR=self.directory, METRICS_TOKEN='scrape-secret')
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.iwi = Iwi.objects.create(name='Metrics Iwi')
+        self.staff = User.objects.create_user(
+            email='staff@example.com', password='testpass123', full_name='Staff User', state='VERIFIED', is_staff=True,
+        )
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requires_staff_or_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_requests_are_timed_by_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('get_hapus'), {'iwi_id': self.iwi.pk})
+        self.client.get('/no-such-page/')
+        text = self.scrape()
+        self.assertIn('iwi_http_requests_total{method="GET",status="200",view="get_hapus"} 3', text)
+        self.assertIn('iwi_http_request_duration_seconds_bucket{method="GET",view="get_hapus",le="+Inf"} 3', text)
+        self.assertIn('iwi_http_request_duration_seconds_count{method="GET",view="get_hapus"} 3', text)
+        self.assertIn('view="<unmatched>"', text)
+        self.assertRegex(text, r'iwi_db_queries_total\{view="get_hapus"\} [1-9]')
+        self.assertIn('# TYPE iwi_http_request_duration_seconds histogram', text)
+
+    def test_emails_votes_and_sessions(self):
+        def failing(user):
+            raise OSError('SMTP unavailable')
+
+        send_email_with_logging(lambda user: None, self.staff, email_type='welcome')
+        send_email_with_logging(failing, self.staff, email_type='welcome')
+        proposal = Proposal.objects.create(
+            title='Metrics', description='Votes', consultation_type='PUBLIC', created_by=self.staff,
+            start_date=timezone.now(), end_date=timezone.now() + timedelta(days=1),
+        )
+        Vote.objects.create(proposal=proposal, user=self.staff, voting_option=VotingOption.objects.create(proposal=proposal, text='Yes'))
+        self.client.force_login(self.staff)
+        text = self.scrape()
+        self.assertIn('iwi_emails_total{result="sent",type="welcome"} 1', text)
+        self.assertIn('iwi_emails_total{result="failed",type="welcome"} 1', text)
+        self.assertIn('iwi_email_send_duration_seconds_count{type="welcome"} 2', text)
+        self.assertIn('iwi_email_queue_depth 0', text)
+        self.assertIn('iwi_votes_total 1', text)
+        self.assertIn('iwi_active_sessions 1', text)
+
+    def test_other_processes_are_added_up(self):
+        metrics.inc('iwi_votes_total', 2)
+        metrics.observe('iwi_email_send_duration_seconds', 0.2, type='welcome')
+        other = metrics.snapshot()
+        other['gauges'] = [['iwi_email_queue_depth', {}, 4]]
+        # A running process (this test's parent) and one that has exited
+        for pid in (os.getppid(), 2 ** 22 + 1):
+            with open(os.path.join(self.directory, f'{pid}.json'), 'w') as file:
+                json.dump({**other, 'pid': pid}, file)
+        text = self.scrape()
+        self.assertIn('iwi_votes_total 6', text)
+        self.assertIn('iwi_email_send_duration_seconds_count{type="welcome"} 3', text)
+        self.assertIn('iwi_email_send_duration_seconds_bucket{type="welcome",le="0.25"} 3', text)
+        # Gauges of the exited process are dropped
+        self.assertIn('iwi_email_queue_depth 4', text)
+
+    def test_flush_writes_this_process(self):
+        metrics.inc('iwi_votes_total')
+        metrics.flush()
+        with open(os.path.join(self.directory, f'{os.getpid()}.json')) as file:
+            self.assertIn(['iwi_votes_total', {}, 1], json.load(file)['counters'])
+        self.assertEqual([name for name in os.listdir(self.directory) if not name.endswith('.json')], [])
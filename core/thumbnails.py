@@ -0,0 +1,106 @@
+"""
+Preview thumbnails of uploaded citizenship documents.
+
+Reviewers clearing the verification queue see a small JPEG of each document
+instead of opening every file. The thumbnail is written next to the
+protected document (``<name>.thumb.jpg``) by a background thread once the
+upload is committed, and served through the same signed links as the
+document itself.
+
+Images are thumbnailed with Pillow and PDFs by rendering their first page
+with poppler's ``pdftoppm``. Both are optional: without them no thumbnail is
+produced and the queue falls back to the plain "View Document" link. The
+generate_document_thumbnails command creates thumbnails for existing
+uploads.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SIZE = (320, 320)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+def thumbnail_name(name):
+    """MEDIA_ROOT-relative name of the thumbnail of document ``name``"""
+    return f'{os.path.splitext(name)[0]}.thumb.jpg'
+
+
+def _path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def has_thumbnail(name):
+    return bool(name) and os.path.exists(_path(thumbnail_name(name)))
+
+
+def _save(image, target):
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(SIZE)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    # Write to a temporary name first so a half-written file is never served
+    partial = f'{target}.partial'
+    image.save(partial, 'JPEG', quality=80)
+    os.replace(partial, target)
+
+
+def _render_pdf(source, target):
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        return False
+    with tempfile.TemporaryDirectory() as workdir:
+        prefix = os.path.join(workdir, 'page')
+        subprocess.run(
+            [pdftoppm, '-jpeg', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(max(SIZE)), source, prefix],
+            check=True, capture_output=True, timeout=60,
+        )
+        with Image.open(f'{prefix}.jpg') as page:
+            _save(page, target)
+    return True
+
+
+def generate_thumbnail(name):
+    """Create the thumbnail of document ``name``; returns whether one was written"""
+    if Image is None or not name:
+        return False
+    source = _path(name)
+    target = _path(thumbnail_name(name))
+    extension = os.path.splitext(name)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        with Image.open(source) as image:
+            _save(image, target)
+        return True
+    if extension == '.pdf':
+        return _render_pdf(source, target)
+    return False
+
+
+def _generate_logged(name):
+    try:
+        generate_thumbnail(name)
+    except Exception:
+        logger.exception(f'Failed to create thumbnail for {name}')
+
+
+def schedule_thumbnail(user):
+    """Create the thumbnail of ``user``'s document in the background once the upload is committed"""
+    name = user.citizenship_document.name if user.citizenship_document else None
+    if Image is None or not name:
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_generate_logged, args=(name,), daemon=True).start()
+    )
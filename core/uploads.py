@@ -0,0 +1,233 @@
+"""
+Chunked, resumable uploads of citizenship documents and attachments.
+
+Instead of one multipart POST, the browser (static/js/chunked_upload.js)
+creates an upload, sends the file in chunks of at most CHUNK_SIZE bytes
+with an Upload-Offset header, and after a dropped connection asks for the
+current offset and continues from there. Each chunk is streamed from the
+request straight into a file in CHUNKED_UPLOAD_DIR, so no worker holds a
+whole file in memory.
+
+When the last chunk arrives the file type is checked from its first bytes.
+The form is then submitted with the upload's id in ``<field>_upload`` and
+form_files() hands the finished file to the form as an ordinary uploaded
+file, so the forms' own validation and saving are unchanged.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+CHUNK_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+# Uploads one user or session may hold at a time, finished or not, until a form uses them
+MAX_ACTIVE_UPLOADS = 5
+
+DOCUMENT_TYPES = {'application/pdf', 'image/jpeg', 'image/png'}
+PURPOSES = {
+    'citizenship_document': DOCUMENT_TYPES,
+    'notice_attachment': DOCUMENT_TYPES,
+    'event_attachment': {'image/jpeg', 'image/png'},
+}
+# Registration happens before login, so documents may be uploaded anonymously
+ANONYMOUS_PURPOSES = {'citizenship_document'}
+
+_SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+]
+
+
+class UploadError(Exception):
+    """An upload request that cannot be accepted; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUploadedFile(UploadedFile):
+    """A finished chunked upload, read from its file in CHUNKED_UPLOAD_DIR"""
+
+    def __init__(self, upload):
+        super().__init__(open(upload_path(upload), 'rb'), upload.filename, upload.content_type, upload.size, None)
+        self.upload = upload
+
+    def temporary_file_path(self):
+        # Lets FileSystemStorage move the file into place instead of copying it
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # The file was moved into storage
+            pass
+
+
+def max_size_label():
+    """MAX_UPLOAD_SIZE as shown in help texts and messages, e.g. 20MB"""
+    return f'{settings.MAX_UPLOAD_SIZE // (1024 * 1024)}MB'
+
+
+def upload_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{upload.pk.hex}.part')
+
+
+def sniff_content_type(path):
+    """Content type of the file at ``path`` judged from its first bytes, or None if it is not one we accept"""
+    with open(path, 'rb') as file:
+        head = file.read(16)
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def _owner(request):
+    if request.user.is_authenticated:
+        return {'user': request.user}
+    if not request.session.session_key:
+        request.session.save()
+    return {'user': None, 'session_key': request.session.session_key, 'client_ip': _client_ip(request)}
+
+
+def _client_ip(request):
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def _anonymous_received():
+    """Bytes received so far by all uploads made before login that no form has used yet"""
+    return ChunkedUpload.objects.filter(user=None).aggregate(total=Sum('offset'))['total'] or 0
+
+
+def _check_anonymous_limits(request):
+    """Refuse an upload before login once its address or all anonymous clients hold too much"""
+    # A client that sends no cookie gets a new session each time, so the per-session limit does not hold it back.
+    # Finished uploads count until a form uses them, since their files stay in CHUNKED_UPLOAD_DIR until then.
+    client_ip = _client_ip(request)
+    held = ChunkedUpload.objects.filter(user=None, client_ip=client_ip)
+    if client_ip and held.count() >= settings.ANONYMOUS_UPLOADS_PER_IP:
+        raise UploadError('Too many uploads waiting to be used; submit the form or cancel one first.', status=429)
+    # Only received bytes are charged, so uploads that are started and never sent cannot use up the limit
+    if _anonymous_received() >= settings.ANONYMOUS_UPLOAD_LIMIT:
+        raise UploadError('Too many uploads are in progress; please try again later.', status=429)
+
+
+def owned_uploads(request):
+    """The uploads ``request``'s user or anonymous session may use"""
+    if request.user.is_authenticated:
+        return ChunkedUpload.objects.filter(user=request.user)
+    if not request.session.session_key:
+        return ChunkedUpload.objects.none()
+    return ChunkedUpload.objects.filter(user=None, session_key=request.session.session_key)
+
+
+def start_upload(request, purpose, filename, size):
+    """Create an empty upload of ``size`` bytes for ``purpose``"""
+    if purpose not in PURPOSES:
+        raise UploadError('Unknown upload purpose.')
+    if purpose not in ANONYMOUS_PURPOSES and not request.user.is_authenticated:
+        raise UploadError('Please log in to upload files.', status=403)
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in {'.pdf', '.jpg', '.jpeg', '.png'} or (purpose == 'event_attachment' and extension == '.pdf'):
+        raise UploadError('This file type is not allowed.')
+    if not 0 < size <= settings.MAX_UPLOAD_SIZE:
+        raise UploadError(f'File size must be under {max_size_label()}.')
+    if owned_uploads(request).count() >= MAX_ACTIVE_UPLOADS:
+        raise UploadError('Too many uploads waiting to be used; submit the form or cancel one first.', status=429)
+    if not request.user.is_authenticated:
+        _check_anonymous_limits(request)
+    upload = ChunkedUpload.objects.create(
+        purpose=purpose, filename=os.path.basename(filename)[:255], size=size, **_owner(request)
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(upload_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """Append ``length`` bytes read from ``stream`` at ``offset``; returns the upload with its new offset"""
+    if upload.is_complete:
+        raise UploadError('This upload is already complete.', status=409)
+    if offset != upload.offset:
+        raise UploadError('The offset does not match the bytes received so far.', status=409)
+    if not 0 < length <= CHUNK_SIZE or offset + length > upload.size:
+        raise UploadError('The chunk is empty, too large, or runs past the end of the file.')
+    if upload.user_id is None and _anonymous_received() + length > settings.ANONYMOUS_UPLOAD_LIMIT:
+        raise UploadError('Too many uploads are in progress; please try again later.', status=429)
+
+    with open(upload_path(upload), 'r+b') as file:
+        file.seek(offset)
+        remaining = length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                raise UploadError('The chunk ended early; resume from the last offset.')
+            file.write(data)
+            remaining -= len(data)
+        file.truncate()
+
+    # Only the request that started at the stored offset may move it forward
+    if not ChunkedUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=offset + length):
+        raise UploadError('Another request wrote this chunk.', status=409)
+    upload.offset = offset + length
+    if upload.offset == upload.size:
+        _complete(upload)
+    return upload
+
+
+def _complete(upload):
+    content_type = sniff_content_type(upload_path(upload))
+    if content_type not in PURPOSES[upload.purpose]:
+        discard(upload)
+        raise UploadError('The file is not a valid PDF, JPG or PNG.' if upload.purpose != 'event_attachment'
+                          else 'The file is not a valid JPG or PNG image.')
+    upload.content_type = content_type
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['content_type', 'completed_at'])
+
+
+def discard(upload):
+    """Delete ``upload`` and its file"""
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def form_files(request, *fields):
+    """request.FILES plus, for each of ``fields``, the finished upload named by the ``<field>_upload`` POST value"""
+    files = request.FILES.copy()
+    for field in fields:
+        upload_id = request.POST.get(f'{field}_upload')
+        if field in files or not upload_id:
+            continue
+        try:
+            upload = owned_uploads(request).filter(completed_at__isnull=False).get(pk=upload_id)
+        except (ChunkedUpload.DoesNotExist, ValidationError):
+            continue
+        files[field] = ChunkedUploadedFile(upload)
+    return files
+
+
+def release(files):
+    """Discard the chunked uploads among ``files`` once the form using them has been saved"""
+    for file in files.values():
+        if isinstance(file, ChunkedUploadedFile):
+            file.close()
+            discard(file.upload)
+
+
+def expired_uploads(hours=None):
+    """Uploads started longer ago than ``hours`` (default CHUNKED_UPLOAD_EXPIRY_HOURS)"""
+    hours = settings.CHUNKED_UPLOAD_EXPIRY_HOURS if hours is None else hours
+    return ChunkedUpload.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours))
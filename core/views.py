@@ -1,12 +1,22 @@
 from django.shortcuts import render, redirect
 from .forms import RegistrationForm, LoginForm, PasswordResetRequestForm, SetPasswordForm
 from django.contrib import messages
-from django.http import JsonResponse
-from core.models import Hapu, Iwi, CustomUser, PasswordResetToken
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from core.models import Hapu, Iwi, CustomUser, PasswordResetToken, ChunkedUpload
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from core.helpers import get_app_name, get_logo_url, get_from_email
+from core.hierarchy import get_hierarchy
+from core.roles import get_role_profile
+from core.stats import get_dashboard_stats
+from core.thumbnails import schedule_thumbnail
+from core import metrics, uploads
+from core.uploads import form_files, release
 from django import forms
 from django.core.mail import send_mail
 from django.db import models
@@ -14,10 +24,12 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
 from django.conf import settings
 import threading
 import secrets
 import hashlib
+import hmac
 import logging
 from datetime import datetime, timedelta
 from django.utils import timezone
@@ -27,7 +39,8 @@ logger = logging.getLogger(__name__)
 def send_email_with_logging(email_function, *args, email_type):
     """Send email with error logging"""
     try:
-        email_function(*args)
+        with metrics.track_email(email_type):
+            email_function(*args)
         # Extract user from args for logging
         user = args[0] if args else None
         if user and hasattr(user, 'email') and hasattr(user, 'id'):
@@ -46,12 +59,15 @@ def register(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
     if request.method == 'POST':
-        form = RegistrationForm(request.POST, request.FILES)
+        files = form_files(request, 'citizenship_document')
+        form = RegistrationForm(request.POST, files)
         if form.is_valid():
             user = form.save(commit=False)
             user.state = 'PENDING_VERIFICATION'
             user.set_password(form.cleaned_data['password'])
             user.save()
+            release(files)
+            schedule_thumbnail(user)
             # Send welcome email in a background thread with error logging
             threading.Thread(
                 target=send_email_with_logging, 
@@ -69,15 +85,78 @@ def register(request):
         form = RegistrationForm()
     return render(request, 'register.html', {'form': form})
 
+def _get_hapus_etag(request):
+    return get_hierarchy().etag('hapus', request.GET.get('iwi_id'))
+
+def _get_hapus_htmx_etag(request):
+    return get_hierarchy().etag('hapus-htmx', request.GET.get('iwi_id') or request.GET.get('id_iwi'))
+
+# Both hapu APIs are served from the cached hierarchy. The ETag only changes
+# when an iwi or hapu changes, so clients revalidate with a cheap 304.
+@condition(etag_func=_get_hapus_etag)
 def get_hapus(request):
     iwi_id = request.GET.get('iwi_id')
-    hapus = Hapu.objects.filter(iwi_id=iwi_id, is_archived=False).values('id', 'name')
-    return JsonResponse(list(hapus), safe=False)
+    hapus = [{'id': hapu['id'], 'name': hapu['name']} for hapu in get_hierarchy().hapus_for_iwi(iwi_id)]
+    response = JsonResponse(hapus, safe=False)
+    patch_cache_control(response, no_cache=True)
+    return response
 
+@condition(etag_func=_get_hapus_htmx_etag)
 def get_hapus_htmx(request):
     iwi_id = request.GET.get('iwi_id') or request.GET.get('id_iwi')
-    hapus = Hapu.objects.filter(iwi_id=iwi_id, is_archived=False)
-    return render(request, 'partials/hapu_options.html', {'hapus': hapus})
+    hapus = get_hierarchy().hapus_for_iwi(iwi_id)
+    response = render(request, 'partials/hapu_options.html', {'hapus': hapus})
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def _upload_response(upload, status=200):
+    response = JsonResponse({
+        'id': str(upload.pk),
+        'url': reverse('upload_detail', args=[upload.pk]),
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': uploads.CHUNK_SIZE,
+        'complete': upload.is_complete,
+    }, status=status)
+    response['Upload-Offset'] = str(upload.offset)
+    patch_cache_control(response, no_store=True)
+    return response
+
+@require_POST
+def upload_start(request):
+    """Start a chunked upload of a document or attachment, see core.uploads"""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        size = 0
+    try:
+        upload = uploads.start_upload(
+            request, request.POST.get('purpose', ''), request.POST.get('filename', ''), size
+        )
+    except uploads.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return _upload_response(upload, status=201)
+
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_detail(request, upload_id):
+    """The received offset of an upload (GET/HEAD), append a chunk (PATCH) or abandon it (DELETE)"""
+    upload = get_object_or_404(uploads.owned_uploads(request), pk=upload_id)
+    if request.method == 'DELETE':
+        uploads.discard(upload)
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset and Content-Length headers are required.'}, status=400)
+        try:
+            # The request body is read in small pieces straight into the upload's file
+            upload = uploads.write_chunk(upload, offset, request, length)
+        except uploads.UploadError as exc:
+            current = ChunkedUpload.objects.filter(pk=upload.pk).values_list('offset', flat=True).first()
+            return JsonResponse({'error': str(exc), 'offset': current}, status=exc.status)
+    return _upload_response(upload)
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -117,18 +196,14 @@ def dashboard(request):
     user = request.user
     # Admin
     if user.is_staff:
-        total_iwis = Iwi.objects.filter(is_archived=False).count()
-        total_hapus = Hapu.objects.count()
-        total_users = CustomUser.objects.count()
         return render(request, 'core/admin_dashboard.html', {
-            'total_iwis': total_iwis,
-            'total_hapus': total_hapus,
-            'total_users': total_users,
+            **get_dashboard_stats(),
             'user': user,
         })
     # Iwi or Hapu Leader
-    iwi_leaderships = user.iwi_leaderships.all()
-    hapu_leaderships = user.hapu_leaderships.all()
+    profile = get_role_profile(user)
+    iwi_leaderships = user.iwi_leaderships.select_related('iwi') if profile.is_iwi_leader else []
+    hapu_leaderships = user.hapu_leaderships.select_related('hapu__iwi') if profile.is_hapu_leader else []
     return render(request, 'core/user_dashboard.html', {
         'user': user,
         'iwi_leaderships': iwi_leaderships,
@@ -138,9 +213,25 @@ def dashboard(request):
 def home(request):
     return render(request, 'core/landing.html', {'user': request.user})
 
+@require_http_methods(['GET', 'HEAD'])
+def metrics_view(request):
+    """Prometheus metrics, for staff or a scraper sending the METRICS_TOKEN bearer token"""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not has_token and not is_admin(request.user):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def app_name_context_processor(request):
     return {'app_name': get_app_name()}
 
+def upload_limits_context_processor(request):
+    return {'max_upload_size': settings.MAX_UPLOAD_SIZE, 'max_upload_label': uploads.max_size_label()}
+
+def role_profile_context_processor(request):
+    return {'role_profile': SimpleLazyObject(lambda: get_role_profile(request.user))}
+
 class EmailChangeForm(forms.Form):
     new_email = forms.EmailField(label='New Email', max_length=254, widget=forms.EmailInput(attrs={'class': 'form-control', 'required': True}))
     password = forms.CharField(label='Current Password', widget=forms.PasswordInput(attrs={'class': 'form-control', 'required': True}))
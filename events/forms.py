@@ -2,6 +2,10 @@ from django import forms
 from .models import Event
 from django.utils import timezone
 from core.models import Iwi, Hapu
+from core.hierarchy import get_hierarchy, set_cached_choices
+from core.roles import get_role_profile
+from core.uploads import max_size_label
+from django.conf import settings
 from django.db import models
 
 class EventForm(forms.ModelForm):
@@ -35,6 +39,10 @@ class EventForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        hierarchy = get_hierarchy()
+        # Rows used to render the iwi/hapu dropdowns; the querysets below only validate submissions
+        iwi_rows = hierarchy.iwi_rows()
+        self.hapu_rows = hierarchy.hapu_rows()
         
         if user:
             # Set up iwi and hapu querysets based on user permissions
@@ -44,8 +52,9 @@ class EventForm(forms.ModelForm):
                 self.fields['hapu'].queryset = Hapu.objects.filter(is_archived=False)
             else:
                 # Regular users can only select iwis/hapus they lead
-                iwi_ids = list(user.iwi_leaderships.values_list('iwi_id', flat=True))
-                hapu_ids = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+                profile = get_role_profile(user)
+                iwi_ids = sorted(profile.iwi_ids)
+                hapu_ids = sorted(profile.hapu_ids)
                 
                 if iwi_ids:
                     self.fields['iwi'].queryset = Iwi.objects.filter(id__in=iwi_ids, is_archived=False)
@@ -54,14 +63,22 @@ class EventForm(forms.ModelForm):
                         models.Q(id__in=hapu_ids) | models.Q(iwi_id__in=iwi_ids),
                         is_archived=False
                     )
+                    iwi_rows = hierarchy.iwi_rows(iwi_ids)
+                    self.hapu_rows = hierarchy.hapu_rows(ids=hapu_ids, iwi_ids=iwi_ids)
                 elif hapu_ids:
                     # Only hapu leader
                     self.fields['iwi'].queryset = Iwi.objects.none()
                     self.fields['hapu'].queryset = Hapu.objects.filter(id__in=hapu_ids, is_archived=False)
+                    iwi_rows = []
+                    self.hapu_rows = hierarchy.hapu_rows(ids=hapu_ids)
                 else:
                     # No leadership permissions
                     self.fields['iwi'].queryset = Iwi.objects.none()
                     self.fields['hapu'].queryset = Hapu.objects.none()
+                    iwi_rows = []
+                    self.hapu_rows = []
+        set_cached_choices(self.fields['iwi'], iwi_rows)
+        set_cached_choices(self.fields['hapu'], self.hapu_rows, label_key='label')
 
     def clean_title(self):
         title = self.cleaned_data.get('title')
@@ -139,6 +156,6 @@ class EventForm(forms.ModelForm):
         if attachment:
             if not attachment.content_type.startswith('image/'):
                 raise forms.ValidationError('Only image files are allowed.')
-            if attachment.size > 2 * 1024 * 1024:
-                raise forms.ValidationError('Image file size must be under 2MB.')
+            if attachment.size > settings.MAX_UPLOAD_SIZE:
+                raise forms.ValidationError(f'Image file size must be under {max_size_label()}.')
         return attachment 
\ No newline at end of file
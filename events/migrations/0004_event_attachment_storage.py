@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_hapu_event_iwi'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='event_attachments/'),
+        ),
+    ]
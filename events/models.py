@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from core.storage import attachment_storage
+
 # Create your models here.
 
 class Event(models.Model):
@@ -23,7 +25,7 @@ class Event(models.Model):
     visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='PUBLIC')
     iwi = models.ForeignKey('core.Iwi', null=True, blank=True, on_delete=models.SET_NULL, help_text='Specific iwi for iwi-specific events')
     hapu = models.ForeignKey('core.Hapu', null=True, blank=True, on_delete=models.SET_NULL, help_text='Specific hapu for hapu-specific events')
-    attachment = models.FileField(upload_to='event_attachments/', blank=True, null=True)
+    attachment = models.FileField(upload_to='event_attachments/', storage=attachment_storage, blank=True, null=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -7,10 +7,11 @@ from .forms import EventForm
 from django.utils import timezone
 
 # Helper to check if user is admin or leader
-from core.models import IwiLeader, HapuLeader
+from core.roles import get_role_profile
+from core.uploads import form_files, release
 
 def is_leader_or_admin(user):
-    return user.is_authenticated and (user.is_staff or IwiLeader.objects.filter(user=user).exists() or HapuLeader.objects.filter(user=user).exists())
+    return get_role_profile(user).is_leader_or_admin
 
 @login_required
 def event_calendar(request):
@@ -23,11 +24,13 @@ def create_event(request):
     current_datetime = timezone.now().strftime('%Y-%m-%dT%H:%M')
     
     if request.method == 'POST':
-        form = EventForm(request.POST, request.FILES, user=request.user)
+        files = form_files(request, 'attachment')
+        form = EventForm(request.POST, files, user=request.user)
         if form.is_valid():
             event = form.save(commit=False)
             event.created_by = request.user
             event.save()
+            release(files)
             messages.success(request, 'Event created successfully!')
             return redirect('events:event_calendar')
         else:
@@ -54,4 +54,28 @@ class HapuTransferForm(forms.Form):
         super().__init__(*args, **kwargs)
         if current_iwi:
             # Exclude the current iwi from the choices
-            self.fields['new_iwi'].queryset = Iwi.objects.filter(is_archived=False).exclude(pk=current_iwi.pk) 
\ No newline at end of file
+            self.fields['new_iwi'].queryset = Iwi.objects.filter(is_archived=False).exclude(pk=current_iwi.pk) 
+
+class HapuBulkTransferForm(forms.Form):
+    hapus = forms.ModelMultipleChoiceField(
+        queryset=Hapu.objects.none(),
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+        label="Hapus to transfer"
+    )
+    new_iwi = forms.ModelChoiceField(
+        queryset=Iwi.objects.filter(is_archived=False),
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        empty_label="Select a new Iwi",
+        label="Transfer to Iwi"
+    )
+    confirm_transfer = forms.BooleanField(
+        required=True,
+        label="I confirm that I want to transfer the selected hapus to the selected iwi",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        hapus = kwargs.pop('hapus')
+        super().__init__(*args, **kwargs)
+        self.fields['hapus'].queryset = hapus
+        self.fields['hapus'].label_from_instance = lambda hapu: f"{hapu.name} ({hapu.iwi.name})"
@@ -3,7 +3,7 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.messages import get_messages
 from django.utils import timezone
-from core.models import Iwi, Hapu, IwiLeader, HapuLeader
+from core.models import Iwi, Hapu, IwiLeader, HapuLeader, IwiStats
 
 User = get_user_model()
 
@@ -418,6 +418,24 @@ class HapuListViewTestCase(TestCase):
         # The user should still see Hapus from their archived Iwi
         self.assertEqual(response.context['hapus_with_archived_iwis'].count(), 2)  # Both Hapus from archived Iwi
 
+    def test_hapu_list_view_query_count_constant(self):
+        """Test that the query count per page does not grow with the number of hapus"""
+        Hapu.objects.bulk_create([
+            Hapu(name=f'Bulk Hapu {i:05d}', iwi=self.iwi1) for i in range(10000)
+        ])
+        self.client.login(email='iwi_leader@example.com', password='leaderpass123')
+        url = reverse('hapumgmt:hapu_list')
+        # Warm the statistics rows of the pages under test
+        self.client.get(url)
+        self.client.get(url + '?active_page=250')
+        # Session, user, counts, active page, archived count (no archived page);
+        # the role profile comes from the cache
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.context['active_page_obj'].paginator.num_pages, 501)
+        with self.assertNumQueries(5):
+            self.client.get(url + '?active_page=250')
+
 
 class HapuDetailViewTestCase(TestCase):
     """Test cases for Hapu detail view"""
@@ -1281,3 +1299,90 @@ class HapuManagementIntegrationTestCase(TestCase):
         
         hapu.refresh_from_db()
         self.assertEqual(hapu.iwi, self.iwi2)
+
+
+class HapuBulkTransferViewTestCase(TestCase):
+    """Test cases for the Hapu bulk transfer view"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.iwi_leader = User.objects.create_user(
+            email='iwi_leader@example.com',
+            password='leaderpass123',
+            full_name='Iwi Leader',
+            state='VERIFIED'
+        )
+        self.old_iwi = Iwi.objects.create(name='Old Iwi')
+        self.other_iwi = Iwi.objects.create(name='Other Iwi')
+        self.new_iwi = Iwi.objects.create(name='New Iwi')
+        self.hapus = [Hapu.objects.create(name=f'Hapu {i}', iwi=self.old_iwi) for i in range(3)]
+        self.unmanaged = Hapu.objects.create(name='Unmanaged Hapu', iwi=self.other_iwi)
+        IwiLeader.objects.create(user=self.iwi_leader, iwi=self.old_iwi)
+        self.old_iwi.archive()
+        self.other_iwi.archive()
+        self.client.login(email='iwi_leader@example.com', password='leaderpass123')
+        self.url = reverse('hapumgmt:hapu_bulk_transfer')
+
+    def test_bulk_transfer_lists_only_manageable_hapus(self):
+        """Test that only hapus the user manages under archived iwis are offered"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['form'].fields['hapus'].queryset), set(self.hapus))
+
+    def test_bulk_transfer_moves_selected_hapus(self):
+        """Test that the selected hapus are moved to the new iwi"""
+        data = {
+            'hapus': [self.hapus[0].pk, self.hapus[1].pk],
+            'new_iwi': self.new_iwi.pk,
+            'confirm_transfer': True,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, data, follow=True)
+        
+        self.assertRedirects(response, reverse('hapumgmt:hapu_list'))
+        self.assertIn('2 hapu(s) have been transferred', str(list(get_messages(response.wsgi_request))[0]))
+        self.assertEqual(set(Hapu.objects.filter(iwi=self.new_iwi)), set(self.hapus[:2]))
+        # Iwi statistics are refreshed although the update bypasses model signals
+        self.assertEqual(IwiStats.objects.get(iwi=self.old_iwi).hapu_count, 1)
+        self.assertEqual(IwiStats.objects.get(iwi=self.new_iwi).hapu_count, 2)
+
+    def test_bulk_transfer_rejects_unmanaged_hapus(self):
+        """Test that hapus the user does not manage cannot be submitted"""
+        data = {
+            'hapus': [self.unmanaged.pk],
+            'new_iwi': self.new_iwi.pk,
+            'confirm_transfer': True,
+        }
+        response = self.client.post(self.url, data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['hapus'])
+        self.unmanaged.refresh_from_db()
+        self.assertEqual(self.unmanaged.iwi, self.other_iwi)
+
+    def test_bulk_transfer_single_update(self):
+        """Test that the hapus are moved with a single UPDATE statement"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        data = {
+            'hapus': [hapu.pk for hapu in self.hapus],
+            'new_iwi': self.new_iwi.pk,
+            'confirm_transfer': True,
+        }
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, data)
+        
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_hapu"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Hapu.objects.filter(iwi=self.new_iwi).count(), 3)
+
+    def test_bulk_transfer_without_archived_iwi_hapus(self):
+        """Test that users without hapus under archived iwis are redirected"""
+        self.old_iwi.unarchive()
+        
+        response = self.client.get(self.url)
+        
+        self.assertRedirects(response, reverse('hapumgmt:hapu_list'))
+
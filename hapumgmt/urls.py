@@ -6,6 +6,7 @@ app_name = 'hapumgmt'
 urlpatterns = [
     path('', views.hapu_list, name='hapu_list'),
     path('create/', views.hapu_create, name='hapu_create'),
+    path('transfer/', views.hapu_bulk_transfer, name='hapu_bulk_transfer'),
     path('<int:pk>/', views.hapu_detail, name='hapu_detail'),
     path('<int:pk>/edit/', views.hapu_edit, name='hapu_edit'),
     path('<int:pk>/archive/', views.hapu_archive, name='hapu_archive'),
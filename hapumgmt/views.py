@@ -5,16 +5,18 @@ from django.http import Http404
 from django.core.paginator import Paginator
 from django.db import models
 from core.models import Hapu, Iwi
-from .forms import HapuForm, HapuArchiveForm, HapuTransferForm
+from core.roles import get_role_profile
+from core.membership import attach_hapu_stats
+from core.archiving import transfer_hapus
+from .forms import HapuForm, HapuArchiveForm, HapuTransferForm, HapuBulkTransferForm
 
 @login_required
 def hapu_list(request):
     """List all hapus that the user can manage (iwi leader or hapu leader)"""
-    # Get hapus from iwis where user is a leader OR hapus where user is a leader
-    user_iwis = Iwi.objects.filter(leaders__user=request.user, is_archived=False)
-    user_hapus = Hapu.objects.filter(leaders__user=request.user)
+    # Get hapus from active iwis where user is a leader OR hapus where user is a leader
+    profile = get_role_profile(request.user)
     hapus = Hapu.objects.filter(
-        models.Q(iwi__in=user_iwis) | models.Q(pk__in=user_hapus.values_list('pk', flat=True))
+        models.Q(iwi_id__in=profile.iwi_ids, iwi__is_archived=False) | models.Q(pk__in=profile.hapu_ids)
     ).order_by('iwi__name', 'name')
     
     # Separate active and archived hapus
@@ -24,13 +26,21 @@ def hapu_list(request):
     # Check for hapus with archived iwis
     hapus_with_archived_iwis = active_hapus.filter(iwi__is_archived=True)
     
+    # One query counts both the active hapus and those whose iwi is archived
+    counts = active_hapus.aggregate(
+        total=models.Count('pk'),
+        with_archived_iwi=models.Count('pk', filter=models.Q(iwi__is_archived=True)),
+    )
+    
     # Pagination for active hapus
-    active_paginator = Paginator(active_hapus, 20)
+    active_paginator = Paginator(active_hapus.select_related('iwi', 'stats'), 20)
+    active_paginator.count = counts['total']
     active_page_number = request.GET.get('active_page')
     active_page_obj = active_paginator.get_page(active_page_number)
+    attach_hapu_stats(active_page_obj.object_list)
     
     # Pagination for archived hapus
-    archived_paginator = Paginator(archived_hapus, 20)
+    archived_paginator = Paginator(archived_hapus.select_related('iwi'), 20)
     archived_page_number = request.GET.get('archived_page')
     archived_page_obj = archived_paginator.get_page(archived_page_number)
     
@@ -38,6 +48,7 @@ def hapu_list(request):
         'active_page_obj': active_page_obj,
         'archived_page_obj': archived_page_obj,
         'hapus_with_archived_iwis': hapus_with_archived_iwis,
+        'archived_iwi_hapu_count': counts['with_archived_iwi'],
     }
     return render(request, 'hapumgmt/hapu_list.html', context)
 
@@ -77,7 +88,7 @@ def hapu_edit(request, pk):
     hapu = get_object_or_404(Hapu, pk=pk)
     
     # Check if user is a leader of the hapu's iwi OR a leader of this specific hapu
-    if not (hapu.iwi.leaders.filter(user=request.user).exists() or hapu.leaders.filter(user=request.user).exists()):
+    if not get_role_profile(request.user).can_manage_hapu(hapu):
         messages.error(request, 'You do not have permission to edit this hapu.')
         return redirect('hapumgmt:hapu_list')
     
@@ -106,12 +117,13 @@ def hapu_edit(request, pk):
 @login_required
 def hapu_detail(request, pk):
     """View hapu details"""
-    hapu = get_object_or_404(Hapu, pk=pk)
+    hapu = get_object_or_404(Hapu.objects.select_related('iwi', 'stats', 'archived_by'), pk=pk)
     
     # Check if user is a leader of the hapu's iwi OR a leader of this specific hapu
-    if not (hapu.iwi.leaders.filter(user=request.user).exists() or hapu.leaders.filter(user=request.user).exists()):
+    if not get_role_profile(request.user).can_manage_hapu(hapu):
         messages.error(request, 'You do not have permission to view this hapu.')
         return redirect('hapumgmt:hapu_list')
+    attach_hapu_stats([hapu])
     
     context = {
         'hapu': hapu,
@@ -124,7 +136,7 @@ def hapu_archive(request, pk):
     hapu = get_object_or_404(Hapu, pk=pk)
     
     # Check if user is a leader of the hapu's iwi OR a leader of this specific hapu
-    if not (hapu.iwi.leaders.filter(user=request.user).exists() or hapu.leaders.filter(user=request.user).exists()):
+    if not get_role_profile(request.user).can_manage_hapu(hapu):
         messages.error(request, 'You do not have permission to archive this hapu.')
         return redirect('hapumgmt:hapu_list')
     
@@ -153,7 +165,7 @@ def hapu_unarchive(request, pk):
     hapu = get_object_or_404(Hapu, pk=pk)
     
     # Check if user is a leader of the hapu's iwi OR a leader of this specific hapu
-    if not (hapu.iwi.leaders.filter(user=request.user).exists() or hapu.leaders.filter(user=request.user).exists()):
+    if not get_role_profile(request.user).can_manage_hapu(hapu):
         messages.error(request, 'You do not have permission to unarchive this hapu.')
         return redirect('hapumgmt:hapu_list')
     
@@ -177,7 +189,7 @@ def hapu_transfer(request, pk):
     hapu = get_object_or_404(Hapu, pk=pk)
     
     # Check if user is a leader of the hapu's iwi OR a leader of this specific hapu
-    if not (hapu.iwi.leaders.filter(user=request.user).exists() or hapu.leaders.filter(user=request.user).exists()):
+    if not get_role_profile(request.user).can_manage_hapu(hapu):
         messages.error(request, 'You do not have permission to transfer this hapu.')
         return redirect('hapumgmt:hapu_list')
     
@@ -209,3 +221,29 @@ def hapu_transfer(request, pk):
         'form': form,
     }
     return render(request, 'hapumgmt/hapu_transfer.html', context)
+
+
+@login_required
+def hapu_bulk_transfer(request):
+    """Transfer several hapus of archived iwis to another iwi at once"""
+    profile = get_role_profile(request.user)
+    hapus = Hapu.objects.filter(
+        models.Q(iwi_id__in=profile.iwi_ids) | models.Q(pk__in=profile.hapu_ids),
+        iwi__is_archived=True,
+    ).select_related('iwi').order_by('iwi__name', 'name')
+    
+    if not hapus.exists():
+        messages.info(request, 'None of your hapus belong to an archived iwi.')
+        return redirect('hapumgmt:hapu_list')
+    
+    if request.method == 'POST':
+        form = HapuBulkTransferForm(request.POST, hapus=hapus)
+        if form.is_valid():
+            new_iwi = form.cleaned_data['new_iwi']
+            moved = transfer_hapus([hapu.pk for hapu in form.cleaned_data['hapus']], new_iwi)
+            messages.success(request, f'{moved} hapu(s) have been transferred to "{new_iwi.name}".')
+            return redirect('hapumgmt:hapu_list')
+    else:
+        form = HapuBulkTransferForm(hapus=hapus)
+    
+    return render(request, 'hapumgmt/hapu_bulk_transfer.html', {'form': form})
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +74,9 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.views.app_name_context_processor',
+                'core.views.upload_limits_context_processor',
+                'core.views.role_profile_context_processor',
+                'notice.views.unread_notices_context_processor',
             ],
         },
     },
@@ -147,6 +151,74 @@ LOGIN_URL = '/login'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache Configuration
+# The cache is shared by all worker processes: file-based by default (no extra
+# services needed), Redis when CACHE_BACKEND=redis (requires the redis package).
+CACHE_BACKEND = Config.get_cache_backend()
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': Config.get_cache_location() or 'redis://127.0.0.1:6379/1',
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    # Per-process only; suitable for a single development server
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': Config.get_cache_location() or os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000,
+            },
+        }
+    }
+CACHES['default']['KEY_PREFIX'] = 'iwi'
+
+# Notice acknowledgments are written immediately unless a buffer size is set,
+# in which case each process batches them and flushes when the buffer fills or
+# the flush interval (seconds) has passed.
+NOTICE_ACK_BUFFER_SIZE = Config.get_notice_ack_buffer_size()
+NOTICE_ACK_FLUSH_INTERVAL = Config.get_notice_ack_flush_interval()
+
+# Days after expiry before archive_expired_notices moves a notice to the archive table
+NOTICE_ARCHIVE_RETENTION_DAYS = Config.get_notice_archive_retention_days()
+
+# Protected files (citizenship documents) are handed to the web server when it
+# is set to 'x-accel-redirect' (nginx, which must map the prefix to MEDIA_ROOT
+# as an internal location) or 'x-sendfile' (Apache/lighttpd); otherwise Django
+# serves them itself. Document links are signed and expire after the max age
+# (seconds).
+PROTECTED_FILE_SERVER = Config.get_protected_file_server()
+PROTECTED_FILE_ACCEL_PREFIX = Config.get_protected_file_accel_prefix()
+DOCUMENT_URL_MAX_AGE = Config.get_document_url_max_age()
+
+# Largest document or attachment accepted (bytes). Large files are sent in
+# chunks through core.uploads into CHUNKED_UPLOAD_DIR (outside MEDIA_ROOT) and
+# unfinished uploads are discarded after the expiry (hours). Uploads made
+# before login are limited per client IP (REMOTE_ADDR, so a proxy in front
+# must pass on the client's address) and in total bytes received, since a
+# client can get a new session for every upload.
+MAX_UPLOAD_SIZE = Config.get_max_upload_size_mb() * 1024 * 1024
+CHUNKED_UPLOAD_DIR = Config.get_chunked_upload_dir() or os.path.join(BASE_DIR, 'uploads')
+CHUNKED_UPLOAD_EXPIRY_HOURS = Config.get_chunked_upload_expiry_hours()
+ANONYMOUS_UPLOADS_PER_IP = Config.get_anonymous_uploads_per_ip()
+ANONYMOUS_UPLOAD_LIMIT = Config.get_anonymous_upload_limit_mb() * 1024 * 1024
+
+# /metrics (core.metrics) is open to staff and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>". With METRICS_DIR set, every worker
+# process writes its counters there each flush interval (seconds) and a scrape
+# adds them up; empty the directory when the service restarts.
+METRICS_DIR = Config.get_metrics_dir() or None
+METRICS_FLUSH_INTERVAL = Config.get_metrics_flush_interval()
+METRICS_TOKEN = Config.get_metrics_token()
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = Config.get_email_host()
@@ -166,46 +238,39 @@ logs_dir = os.path.join(BASE_DIR, 'logs')
 if not os.path.exists(logs_dir):
     os.makedirs(logs_dir)
 
-# Ensure log files exist
 django_log_file = os.path.join(logs_dir, 'django.log')
 email_log_file = os.path.join(logs_dir, 'email.log')
 
-for log_file in [django_log_file, email_log_file]:
-    if not os.path.exists(log_file):
-        with open(log_file, 'w') as f:
-            pass  # Create empty file
+# Log records are only queued on the calling thread; a background thread per
+# handler writes them in batches (core.logs). Log files are JSON lines, rotated
+# by size (LOG_MAX_MB), by time when LOG_ROTATION is an interval such as
+# 'midnight', or by logrotate when it is 'external'.
+LOG_FILE_OPTIONS = {
+    'rotation': Config.get_log_rotation(),
+    'max_bytes': Config.get_log_max_mb() * 1024 * 1024,
+    'backup_count': Config.get_log_backup_count(),
+}
 
 # Logging Configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
-        },
-    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            '()': 'core.logs.QueueFileHandler',
             'filename': django_log_file,
-            'formatter': 'verbose',
+            **LOG_FILE_OPTIONS,
         },
         'email_file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            '()': 'core.logs.QueueFileHandler',
             'filename': email_log_file,
-            'formatter': 'verbose',
+            **LOG_FILE_OPTIONS,
         },
         'console': {
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            '()': 'core.logs.QueueConsoleHandler',
         },
     },
     'loggers': {
@@ -224,5 +289,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'core.cache': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
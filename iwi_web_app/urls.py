@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from core.views import register, get_hapus, get_hapus_htmx, login_view, dashboard, logout_view, home, profile, password_reset_request, password_reset_confirm
+from core.views import register, get_hapus, get_hapus_htmx, login_view, dashboard, logout_view, home, profile, password_reset_request, password_reset_confirm, upload_start, upload_detail, metrics_view
 from django.conf import settings
 from django.conf.urls.static import static
 import os
@@ -32,6 +32,8 @@ urlpatterns = [
     path('consultations/', include('consultation.urls')),
     path('api/get_hapus/', get_hapus, name='get_hapus'),
     path('api/get_hapus_htmx/', get_hapus_htmx, name='get_hapus_htmx'),
+    path('api/uploads/', upload_start, name='upload_start'),
+    path('api/uploads/<uuid:upload_id>/', upload_detail, name='upload_detail'),
     path('usermgmt/', include('usermgmt.urls')),
     path('iwimgmt/', include('iwimgmt.urls')),
     path('dashboard/', dashboard, name='dashboard'),
@@ -39,6 +41,7 @@ urlpatterns = [
     path('events/', include('events.urls')),
     path('profile/', profile, name='profile'),
     path('hapumgmt/', include('hapumgmt.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
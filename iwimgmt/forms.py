@@ -41,4 +41,19 @@ class IwiArchiveForm(forms.Form):
         }),
         required=False,
         max_length=500
-    ) 
\ No newline at end of file
+    )
+    archive_hapus = forms.BooleanField(
+        required=False,
+        label="Also archive all hapus of this iwi",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+class IwiUnarchiveForm(forms.Form):
+    """Form for unarchiving iwis"""
+
+    restore_hapus = forms.BooleanField(
+        required=False,
+        label="Also unarchive the hapus that were archived with this iwi",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
@@ -278,6 +278,23 @@ class IwiListViewTestCase(TestCase):
         self.assertEqual(iwis[0].name, 'A Iwi')
         self.assertEqual(iwis[1].name, 'B Iwi')
 
+    def test_iwi_list_view_query_count_constant(self):
+        """Test that hapu counts come with the page rather than one query per row"""
+        from core.models import Hapu
+        from core.membership import refresh_all
+        Iwi.objects.bulk_create([Iwi(name=f'Bulk Iwi {i:02d}') for i in range(30)])
+        iwis = list(Iwi.objects.filter(name__startswith='Bulk Iwi'))
+        Hapu.objects.bulk_create([
+            Hapu(name=f'Bulk Hapu {i:05d}', iwi=iwis[i % len(iwis)]) for i in range(10000)
+        ])
+        refresh_all()
+        self.client.login(email='admin@example.com', password='adminpass123')
+        for page in (1, 2):
+            with self.assertNumQueries(4):  # session, user, count, page
+                response = self.client.get(reverse('iwimgmt:iwi_list'), {'page': page})
+        last = response.context['page_obj'][-1]
+        self.assertEqual(last.stats.hapu_count, Hapu.objects.filter(iwi=last).count())
+
 
 class IwiDetailViewTestCase(TestCase):
     """Test cases for Iwi detail view"""
@@ -735,6 +752,64 @@ class IwiArchiveViewTestCase(TestCase):
         self.assertEqual(len(messages), 1)
         self.assertIn('has been archived', str(messages[0]))
 
+    def test_iwi_archive_cascades_to_hapus(self):
+        """Test that archiving with archive_hapus archives the iwi's active hapus in one go"""
+        hapus = [Hapu.objects.create(name=f'Hapu {i}', iwi=self.iwi) for i in range(3)]
+        earlier = Hapu.objects.create(name='Earlier Hapu', iwi=self.iwi)
+        earlier.archive(archived_by=self.regular_user)
+        self.client.login(email='admin@example.com', password='adminpass123')
+        
+        response = self.client.post(
+            reverse('iwimgmt:iwi_archive', args=[self.iwi.id]), {'archive_hapus': 'on'}, follow=True
+        )
+        
+        self.assertIn('3 hapu(s) have been archived', str(list(get_messages(response.wsgi_request))[0]))
+        self.iwi.refresh_from_db()
+        for hapu in hapus:
+            hapu.refresh_from_db()
+            self.assertTrue(hapu.is_archived)
+            self.assertEqual(hapu.archived_at, self.iwi.archived_at)
+            self.assertEqual(hapu.archived_by, self.admin_user)
+        # Hapus archived earlier keep their own archive details
+        earlier_archived_at = earlier.archived_at
+        earlier.refresh_from_db()
+        self.assertEqual(earlier.archived_at, earlier_archived_at)
+        self.assertEqual(earlier.archived_by, self.regular_user)
+
+    def test_iwi_archive_leaves_hapus_by_default(self):
+        """Test that hapus stay active unless archive_hapus is ticked"""
+        hapu = Hapu.objects.create(name='Hapu', iwi=self.iwi)
+        self.client.login(email='admin@example.com', password='adminpass123')
+        
+        self.client.post(reverse('iwimgmt:iwi_archive', args=[self.iwi.id]), {})
+        
+        hapu.refresh_from_db()
+        self.assertFalse(hapu.is_archived)
+
+    def test_iwi_archive_cascade_uses_set_based_updates(self):
+        """Test that the number of queries does not grow with the number of hapus"""
+        Hapu.objects.bulk_create([Hapu(name=f'Hapu {i}', iwi=self.iwi) for i in range(50)])
+        self.client.login(email='admin@example.com', password='adminpass123')
+        url = reverse('iwimgmt:iwi_archive', args=[self.iwi.id])
+        
+        with self.assertNumQueries(7):
+            self.client.post(url, {'archive_hapus': 'on'})
+        
+        self.assertFalse(Hapu.objects.filter(iwi=self.iwi, is_archived=False).exists())
+
+    def test_iwi_archive_refreshes_hierarchy(self):
+        """Test that the cached hierarchy drops the iwi and its cascaded hapus"""
+        from core.hierarchy import get_hierarchy
+        Hapu.objects.create(name='Hapu', iwi=self.iwi)
+        self.assertEqual(len(get_hierarchy().hapus_for_iwi(self.iwi.id)), 1)
+        self.client.login(email='admin@example.com', password='adminpass123')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('iwimgmt:iwi_archive', args=[self.iwi.id]), {'archive_hapus': 'on'})
+        
+        self.assertEqual(get_hierarchy().hapus_for_iwi(self.iwi.id), [])
+        self.assertEqual(get_hierarchy().iwi_rows([self.iwi.id]), [])
+
 
 class IwiUnarchiveViewTestCase(TestCase):
     """Test cases for Iwi unarchive view"""
@@ -828,6 +903,29 @@ class IwiUnarchiveViewTestCase(TestCase):
         self.assertEqual(len(messages), 1)
         self.assertIn('has been unarchived', str(messages[0]))
 
+    def test_iwi_unarchive_restores_cascaded_hapus_only(self):
+        """Test that restore_hapus unarchives only the hapus archived with the iwi"""
+        from core.archiving import archive_iwi
+        iwi = Iwi.objects.create(name='Cascade Iwi')
+        earlier = Hapu.objects.create(name='Earlier Hapu', iwi=iwi)
+        earlier.archive(archived_by=self.admin_user)
+        cascaded = Hapu.objects.create(name='Cascaded Hapu', iwi=iwi)
+        archive_iwi(iwi, archived_by=self.admin_user, include_hapus=True)
+        self.client.login(email='admin@example.com', password='adminpass123')
+        
+        response = self.client.get(reverse('iwimgmt:iwi_unarchive', args=[iwi.id]))
+        self.assertEqual(response.context['cascaded_hapu_count'], 1)
+        response = self.client.post(
+            reverse('iwimgmt:iwi_unarchive', args=[iwi.id]), {'restore_hapus': 'on'}, follow=True
+        )
+        
+        self.assertIn('1 hapu(s) have been unarchived', str(list(get_messages(response.wsgi_request))[0]))
+        cascaded.refresh_from_db()
+        earlier.refresh_from_db()
+        self.assertFalse(cascaded.is_archived)
+        self.assertIsNone(cascaded.archived_by)
+        self.assertTrue(earlier.is_archived)
+
 
 class IwiManagementIntegrationTestCase(TestCase):
     """Integration test cases for Iwi management workflow"""
@@ -5,7 +5,9 @@ from django.urls import reverse
 from django.utils import timezone
 from django.core.paginator import Paginator
 from core.models import Iwi
-from .forms import IwiForm, IwiArchiveForm
+from core.archiving import archive_iwi, unarchive_iwi, cascaded_hapus
+from core.membership import attach_iwi_stats
+from .forms import IwiForm, IwiArchiveForm, IwiUnarchiveForm
 
 def is_admin(user):
     return user.is_authenticated and user.is_staff
@@ -21,9 +23,10 @@ def iwi_list(request):
         iwis = Iwi.objects.filter(is_archived=False).order_by('name')
     
     # Pagination
-    paginator = Paginator(iwis, 15)
+    paginator = Paginator(iwis.select_related('stats'), 15)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    attach_iwi_stats(page_obj.object_list)
     
     return render(request, 'iwimgmt/iwi_list.html', {
         'page_obj': page_obj,
@@ -81,8 +84,13 @@ def iwi_archive(request, iwi_id):
     if request.method == 'POST':
         form = IwiArchiveForm(request.POST)
         if form.is_valid():
-            iwi.archive(archived_by=request.user)
-            messages.success(request, f'Iwi "{iwi.name}" has been archived.')
+            archived = archive_iwi(
+                iwi, archived_by=request.user, include_hapus=form.cleaned_data['archive_hapus']
+            )
+            if archived:
+                messages.success(request, f'Iwi "{iwi.name}" and {archived} hapu(s) have been archived.')
+            else:
+                messages.success(request, f'Iwi "{iwi.name}" has been archived.')
             return redirect('iwimgmt:iwi_list')
     else:
         form = IwiArchiveForm()
@@ -90,6 +98,7 @@ def iwi_archive(request, iwi_id):
     return render(request, 'iwimgmt/iwi_archive.html', {
         'iwi': iwi,
         'form': form,
+        'active_hapu_count': iwi.hapu.filter(is_archived=False).count(),
     })
 
 @user_passes_test(is_admin)
@@ -98,18 +107,28 @@ def iwi_unarchive(request, iwi_id):
     iwi = get_object_or_404(Iwi, id=iwi_id, is_archived=True)
     
     if request.method == 'POST':
-        iwi.unarchive()
-        messages.success(request, f'Iwi "{iwi.name}" has been unarchived.')
-        return redirect('iwimgmt:iwi_list')
+        form = IwiUnarchiveForm(request.POST)
+        if form.is_valid():
+            restored = unarchive_iwi(iwi, include_hapus=form.cleaned_data['restore_hapus'])
+            if restored:
+                messages.success(request, f'Iwi "{iwi.name}" and {restored} hapu(s) have been unarchived.')
+            else:
+                messages.success(request, f'Iwi "{iwi.name}" has been unarchived.')
+            return redirect('iwimgmt:iwi_list')
+    else:
+        form = IwiUnarchiveForm()
     
     return render(request, 'iwimgmt/iwi_unarchive.html', {
         'iwi': iwi,
+        'form': form,
+        'cascaded_hapu_count': cascaded_hapus(iwi).count(),
     })
 
 @user_passes_test(is_admin)
 def iwi_detail(request, iwi_id):
     """View iwi details"""
-    iwi = get_object_or_404(Iwi, id=iwi_id)
+    iwi = get_object_or_404(Iwi.objects.select_related('stats', 'archived_by'), id=iwi_id)
+    attach_iwi_stats([iwi])
     
     return render(request, 'iwimgmt/iwi_detail.html', {
         'iwi': iwi,
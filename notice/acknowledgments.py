@@ -0,0 +1,89 @@
+"""
+Recording that a user has read a notice.
+
+Every notice view records an acknowledgment, so the write must be cheap: it
+is a single INSERT that relies on the (notice, user) unique constraint to
+ignore repeat views, with no read beforehand.
+
+With NOTICE_ACK_BUFFER_SIZE set, acknowledgments are instead collected in
+memory and written in batches, trading a short delay (at most
+NOTICE_ACK_FLUSH_INTERVAL seconds of traffic, lost if the process dies) for
+far fewer writes under a burst of reads. Buffered acknowledgments keep the
+time they were recorded, not the time they were flushed, so the engagement
+report's hourly buckets are unaffected.
+
+Each user's acknowledged notice ids are cached for the unread counter and
+updated in place as acknowledgments are recorded, buffered or not.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.cache import Namespace
+from .models import NoticeAcknowledgment
+
+_namespace = Namespace('notice_acks', timeout=60 * 60)
+
+_buffer = {}  # (notice_id, user_id) -> time of the first acknowledgment
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record_acknowledgment(notice_id, user_id):
+    """Record that ``user_id`` has read ``notice_id``; repeat calls are harmless"""
+    acknowledged = _namespace.get(user_id)
+    if acknowledged is not None and notice_id not in acknowledged:
+        _namespace.set(user_id, acknowledged | {notice_id})
+    if settings.NOTICE_ACK_BUFFER_SIZE <= 0:
+        NoticeAcknowledgment.objects.bulk_create(
+            [NoticeAcknowledgment(notice_id=notice_id, user_id=user_id)], ignore_conflicts=True
+        )
+        return
+    acknowledged_at = timezone.now()
+    with _buffer_lock:
+        _buffer.setdefault((notice_id, user_id), acknowledged_at)
+        due = (
+            len(_buffer) >= settings.NOTICE_ACK_BUFFER_SIZE
+            or time.monotonic() - _last_flush >= settings.NOTICE_ACK_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def flush():
+    """Write any buffered acknowledgments in a single batch"""
+    global _last_flush
+    with _buffer_lock:
+        pending = list(_buffer.items())
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    NoticeAcknowledgment.objects.bulk_create(
+        [
+            NoticeAcknowledgment(notice_id=notice_id, user_id=user_id, acknowledged_at=acknowledged_at)
+            for (notice_id, user_id), acknowledged_at in pending
+        ],
+        ignore_conflicts=True,
+    )
+    return len(pending)
+
+
+def acknowledged_notice_ids(user_id):
+    """Ids of the unexpired notices ``user_id`` has acknowledged"""
+    def load():
+        return frozenset(NoticeAcknowledgment.objects.filter(
+            user_id=user_id, notice__expiry_date__gt=timezone.now()
+        ).values_list('notice_id', flat=True))
+    return _namespace.get_or_set(user_id, load)
+
+
+def pending_count():
+    with _buffer_lock:
+        return len(_buffer)
+
+
+atexit.register(flush)
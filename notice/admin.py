@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notice, NoticeAcknowledgment
+from .models import Notice, NoticeAcknowledgment, ArchivedNotice
 
 @admin.register(Notice)
 class NoticeAdmin(admin.ModelAdmin):
@@ -11,3 +11,9 @@ class NoticeAdmin(admin.ModelAdmin):
 class NoticeAcknowledgmentAdmin(admin.ModelAdmin):
     list_display = ('notice', 'user', 'acknowledged_at')
     list_filter = ('notice', 'user')
+
+@admin.register(ArchivedNotice)
+class ArchivedNoticeAdmin(admin.ModelAdmin):
+    list_display = ('title', 'audience', 'expiry_date', 'acknowledgment_count', 'archived_at')
+    list_filter = ('audience',)
+    search_fields = ('title', 'content')
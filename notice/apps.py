@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NoticeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notice'
+
+    def ready(self):
+        # Connect the cache invalidation signal handlers
+        from . import board, engagement  # noqa: F401
@@ -0,0 +1,125 @@
+"""
+Audience-scoped notice retrieval for the notice board.
+
+Members only see notices addressed to everyone, to their iwi or to their
+hapu; leaders also see notices for the iwi and hapu they lead, and admins
+see everything. Users with the same iwi/hapu memberships form an audience
+bucket and share one cached copy of the unfiltered first page, which is the
+page nearly every visit lands on.
+"""
+from datetime import timedelta
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from core.cache import Namespace, invalidate_on_change
+from core.roles import get_role_profile
+from .acknowledgments import acknowledged_notice_ids
+from .models import Notice
+
+PAGE_SIZE = 6
+FIRST_PAGE_TIMEOUT = 10 * 60
+
+_namespace = Namespace('notice_board', timeout=FIRST_PAGE_TIMEOUT)
+
+
+def audience_ids(user):
+    """The iwi and hapu ids whose notices ``user`` receives, or None for admins"""
+    if user.is_staff:
+        return None
+    profile = get_role_profile(user)
+    iwi_ids = set(profile.iwi_ids)
+    hapu_ids = set(profile.hapu_ids)
+    if user.iwi_id:
+        iwi_ids.add(user.iwi_id)
+    if user.hapu_id:
+        hapu_ids.add(user.hapu_id)
+    return sorted(iwi_ids), sorted(hapu_ids)
+
+
+def audience_filter(user):
+    """Q object limiting notices to those addressed to ``user``"""
+    ids = audience_ids(user)
+    if ids is None:
+        return Q()
+    iwi_ids, hapu_ids = ids
+    audience = Q(audience='ALL')
+    if iwi_ids:
+        audience |= Q(audience='IWI', iwi_id__in=iwi_ids)
+    if hapu_ids:
+        audience |= Q(audience='HAPU', hapu_id__in=hapu_ids)
+    return audience
+
+
+def visible_notices(user):
+    """Unexpired notices addressed to ``user``, in board order"""
+    return Notice.objects.filter(
+        audience_filter(user), expiry_date__gt=timezone.now()
+    ).order_by('-priority', '-created_at')
+
+
+def _bucket(user):
+    ids = audience_ids(user)
+    if ids is None:
+        return ('staff',)
+    iwi_ids, hapu_ids = ids
+    return ('iwi', *iwi_ids, 'hapu', *hapu_ids)
+
+
+def _load_first_page(notices):
+    now = timezone.now()
+    summary = notices.aggregate(total=Count('id'), next_expiry=Min('expiry_date'))
+    rows = list(notices[:PAGE_SIZE])
+    # The page must not outlive its first notice to expire
+    timeout = _seconds_until(summary['next_expiry'], now, FIRST_PAGE_TIMEOUT)
+    return {'count': summary['total'], 'notices': rows}, timeout
+
+
+def first_page(user):
+    """The cached first board page for ``user``'s audience bucket"""
+    notices = visible_notices(user)
+    bucket = _bucket(user)
+    cached = _namespace.get(bucket)
+    if cached is None:
+        cached, timeout = _load_first_page(notices)
+        _namespace.set(bucket, cached, timeout)
+    paginator = Paginator(notices, PAGE_SIZE)
+    # Seed the paginator's count so num_pages does not query again
+    paginator.count = cached['count']
+    return Page(cached['notices'], 1, paginator)
+
+
+def _seconds_until(moment, now, ceiling):
+    if moment is None:
+        return ceiling
+    return max(1, min(ceiling, int((moment - now) / timedelta(seconds=1))))
+
+
+def visible_notice_ids(user):
+    """Ids of the unexpired notices addressed to ``user``, cached per audience bucket"""
+    bucket = ('ids', *_bucket(user))
+    ids = _namespace.get(bucket)
+    if ids is None:
+        now = timezone.now()
+        rows = list(visible_notices(user).values_list('id', 'expiry_date'))
+        ids = frozenset(notice_id for notice_id, _ in rows)
+        next_expiry = min((expiry for _, expiry in rows), default=None)
+        _namespace.set(bucket, ids, _seconds_until(next_expiry, now, FIRST_PAGE_TIMEOUT))
+    return ids
+
+
+def unread_count(user):
+    """Number of unexpired notices addressed to ``user`` that they have not opened"""
+    visible = visible_notice_ids(user)
+    if not visible:
+        return 0
+    return len(visible - acknowledged_notice_ids(user.pk))
+
+
+def invalidate():
+    """Discard every cached board page; call after changes that bypass model signals"""
+    _namespace.invalidate()
+
+
+invalidate_on_change(_namespace, Notice)
@@ -0,0 +1,103 @@
+"""
+Engagement report for a single notice.
+
+All figures are aggregated in the database: the size of the notice's target
+audience, how many of them have acknowledged it, acknowledgments over time
+and a breakdown by iwi and hapu. Once a notice has expired no further
+acknowledgments are recorded, so its report is cached until the notice
+itself changes.
+
+The timeline is counted per UTC hour in the database and folded into local
+hours or days here. Truncating in the local time zone in SQL needs the MySQL
+time zone tables, and without them every bucket silently comes back NULL.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core.cache import Namespace, invalidate_on_change
+from core.models import CustomUser
+from .models import Notice
+
+# Notices shorter-lived than this are charted by hour, longer ones by day
+HOURLY_SPAN = timedelta(days=2)
+
+_namespace = Namespace('notice_engagement', timeout=7 * 24 * 60 * 60)
+
+
+def audience_users(notice):
+    """Verified users the notice is addressed to, including the relevant leaders"""
+    users = CustomUser.objects.filter(state='VERIFIED', is_active=True, is_staff=False)
+    if notice.audience == 'IWI':
+        users = users.filter(Q(iwi_id=notice.iwi_id) | Q(iwi_leaderships__iwi_id=notice.iwi_id))
+    elif notice.audience == 'HAPU':
+        users = users.filter(Q(hapu_id=notice.hapu_id) | Q(hapu_leaderships__hapu_id=notice.hapu_id))
+    return users
+
+
+def default_bucket(notice):
+    end = min(notice.expiry_date, timezone.now())
+    return 'hour' if end - notice.created_at <= HOURLY_SPAN else 'day'
+
+
+def _timeline(acknowledgments, bucket):
+    """Acknowledgments per local hour or day, oldest first"""
+    hours = (
+        acknowledgments.annotate(hour=TruncHour('acknowledged_at', tzinfo=dt_timezone.utc))
+        .values('hour').annotate(count=Count('id')).order_by('hour')
+    )
+    counts = {}
+    for row in hours:
+        period = timezone.localtime(row['hour'])
+        if bucket == 'hour':
+            period = period.replace(minute=0)
+        else:
+            period = period.replace(hour=0, minute=0)
+        counts[period] = counts.get(period, 0) + row['count']
+    return [{'period': period, 'count': count} for period, count in sorted(counts.items())]
+
+
+def _build(notice, bucket):
+    acknowledgments = notice.acknowledgments.order_by()
+    audience = audience_users(notice)
+    audience_size = audience.values('pk').distinct().count()
+    counts = acknowledgments.aggregate(
+        total=Count('id'),
+        from_audience=Count('id', filter=Q(user__in=audience.values('pk'))),
+    )
+    timeline = _timeline(acknowledgments, bucket)
+    by_iwi = list(
+        acknowledgments.values('user__iwi_id', 'user__iwi__name')
+        .annotate(count=Count('id')).order_by('-count', 'user__iwi__name')
+    )
+    by_hapu = list(
+        acknowledgments.values('user__hapu_id', 'user__hapu__name', 'user__hapu__iwi__name')
+        .annotate(count=Count('id')).order_by('-count', 'user__hapu__name')
+    )
+    read_rate = None
+    if audience_size:
+        read_rate = round(counts['from_audience'] * 100 / audience_size, 1)
+    return {
+        'audience_size': audience_size,
+        'total_acknowledgments': counts['total'],
+        'audience_acknowledgments': counts['from_audience'],
+        'read_rate': read_rate,
+        'bucket': bucket,
+        'timeline': timeline,
+        'by_iwi': by_iwi,
+        'by_hapu': by_hapu,
+    }
+
+
+def engagement_report(notice, bucket=None):
+    """Aggregated engagement figures for ``notice``, cached once it has expired"""
+    if bucket not in ('hour', 'day'):
+        bucket = default_bucket(notice)
+    if notice.is_active():
+        return _build(notice, bucket)
+    return _namespace.get_or_set((notice.pk, bucket), lambda: _build(notice, bucket))
+
+
+invalidate_on_change(_namespace, Notice)
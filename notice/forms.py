@@ -2,6 +2,9 @@ from django import forms
 from .models import Notice
 from core.models import Iwi, Hapu
 from django.utils import timezone
+from django.conf import settings
+from django.urls import reverse_lazy
+from core.uploads import max_size_label
 
 class NoticeForm(forms.ModelForm):
     content = forms.CharField(
@@ -16,8 +19,14 @@ class NoticeForm(forms.ModelForm):
     )
     attachment = forms.FileField(
         required=False,
-        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.pdf,.jpg,.jpeg,.png'}),
-        help_text='Upload a PDF, JPG, or PNG (max 2MB).'
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.pdf,.jpg,.jpeg,.png',
+            # Sent in chunks by static/js/chunked_upload.js
+            'data-chunked-upload': 'notice_attachment',
+            'data-upload-url': reverse_lazy('upload_start'),
+        }),
+        help_text=f'Upload a PDF, JPG, or PNG (max {max_size_label()}).'
     )
 
     def clean(self):
@@ -62,8 +71,8 @@ class NoticeForm(forms.ModelForm):
     def clean_attachment(self):
         attachment = self.cleaned_data.get('attachment')
         if attachment:
-            if attachment.size > 2 * 1024 * 1024:
-                raise forms.ValidationError('File size must be under 2MB.')
+            if attachment.size > settings.MAX_UPLOAD_SIZE:
+                raise forms.ValidationError(f'File size must be under {max_size_label()}.')
             valid_types = ['application/pdf', 'image/jpeg', 'image/png']
             if hasattr(attachment, 'content_type') and attachment.content_type not in valid_types:
                 raise forms.ValidationError('Only PDF, JPG, or PNG files are allowed.')
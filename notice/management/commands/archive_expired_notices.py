@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from core.storage import adjust_references
+from notice.models import Notice, NoticeAcknowledgment, ArchivedNotice
+
+
+class Command(BaseCommand):
+    help = 'Move notices expired longer than the retention window into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.NOTICE_ARCHIVE_RETENTION_DAYS,
+            help='Archive notices expired more than this many days ago (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Notices archived per transaction (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be archived without archiving',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['retention_days'])
+        candidates = Notice.objects.filter(expiry_date__lt=cutoff).order_by('id')
+
+        if options['dry_run']:
+            count = candidates.count()
+            self.stdout.write(
+                self.style.WARNING(f'Would archive {count} notices expired before {cutoff:%Y-%m-%d %H:%M}')
+            )
+            for notice in candidates[:10]:  # Show first 10 as examples
+                self.stdout.write(f'  - {notice.title} (expired: {notice.expiry_date})')
+            if count > 10:
+                self.stdout.write(f'  ... and {count - 10} more')
+            return
+
+        archived = 0
+        while True:
+            batch = list(candidates[:options['batch_size']])
+            if not batch:
+                break
+            archived += self.archive_batch(batch)
+            self.stdout.write(f'  archived {archived} notices')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully archived {archived} expired notices'))
+
+    def archive_batch(self, notices):
+        ids = [notice.id for notice in notices]
+        with transaction.atomic():
+            rollups = {
+                row['notice_id']: row
+                for row in NoticeAcknowledgment.objects.filter(notice_id__in=ids)
+                .values('notice_id')
+                .annotate(total=Count('id'), first=Min('acknowledged_at'), last=Max('acknowledged_at'))
+                .order_by()
+            }
+            ArchivedNotice.objects.bulk_create([
+                ArchivedNotice(
+                    original_id=notice.id,
+                    title=notice.title,
+                    content=notice.content,
+                    attachment=notice.attachment.name or None,
+                    expiry_date=notice.expiry_date,
+                    audience=notice.audience,
+                    iwi_id=notice.iwi_id,
+                    hapu_id=notice.hapu_id,
+                    created_by_id=notice.created_by_id,
+                    created_at=notice.created_at,
+                    priority=notice.priority,
+                    acknowledgment_count=rollups.get(notice.id, {}).get('total', 0),
+                    first_acknowledged_at=rollups.get(notice.id, {}).get('first'),
+                    last_acknowledged_at=rollups.get(notice.id, {}).get('last'),
+                )
+                for notice in notices
+            ])
+            # bulk_create skips the reference counting signals; the notice deletes below release theirs
+            adjust_references([notice.attachment.name for notice in notices], 1)
+            # Acknowledgments go first in one statement so the notice delete has nothing to cascade
+            NoticeAcknowledgment.objects.filter(notice_id__in=ids).delete()
+            Notice.objects.filter(id__in=ids).delete()
+        return len(ids)
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_passwordresettoken'),
+        ('notice', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notice',
+            index=models.Index(fields=['expiry_date', 'priority', 'created_at'], name='notice_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notice',
+            index=models.Index(fields=['audience', 'expiry_date'], name='notice_audience_expiry_idx'),
+        ),
+    ]
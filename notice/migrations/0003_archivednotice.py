@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_passwordresettoken'),
+        ('notice', '0002_notice_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('content', models.TextField()),
+                ('attachment', models.FileField(blank=True, null=True, upload_to='notice_attachments/')),
+                ('expiry_date', models.DateTimeField()),
+                ('audience', models.CharField(choices=[('ALL', 'All Users'), ('IWI', 'Specific Iwi'), ('HAPU', 'Specific Hapu')], default='ALL', max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('priority', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('acknowledgment_count', models.PositiveIntegerField(default=0)),
+                ('first_acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('last_acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('hapu', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.hapu')),
+                ('iwi', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.iwi')),
+            ],
+            options={
+                'ordering': ['-expiry_date'],
+            },
+        ),
+    ]
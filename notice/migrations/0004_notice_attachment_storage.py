@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notice', '0003_archivednotice'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivednotice',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='notice_attachments/'),
+        ),
+        migrations.AlterField(
+            model_name='notice',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='notice_attachments/'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notice', '0004_notice_attachment_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='noticeacknowledgment',
+            name='acknowledged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from core.storage import attachment_storage
 
 # Create your models here.
 
@@ -12,7 +15,7 @@ class Notice(models.Model):
     ]
     title = models.CharField(max_length=255)
     content = models.TextField()  # Use a rich text widget in forms
-    attachment = models.FileField(upload_to='notice_attachments/', blank=True, null=True)
+    attachment = models.FileField(upload_to='notice_attachments/', storage=attachment_storage, blank=True, null=True)
     expiry_date = models.DateTimeField()
     audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='ALL')
     iwi = models.ForeignKey('core.Iwi', null=True, blank=True, on_delete=models.SET_NULL)
@@ -21,6 +24,13 @@ class Notice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     priority = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Active notices in board order
+            models.Index(fields=['expiry_date', 'priority', 'created_at'], name='notice_active_order_idx'),
+            models.Index(fields=['audience', 'expiry_date'], name='notice_audience_expiry_idx'),
+        ]
+
     def is_active(self):
         from django.utils import timezone
         return self.expiry_date > timezone.now()
@@ -31,7 +41,32 @@ class Notice(models.Model):
 class NoticeAcknowledgment(models.Model):
     notice = models.ForeignKey(Notice, related_name='acknowledgments', on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    acknowledged_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, so that buffered acknowledgments keep the time they were made
+    acknowledged_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('notice', 'user')
+
+class ArchivedNotice(models.Model):
+    """A notice moved out of the hot table after its retention window, with its acknowledgments rolled up"""
+    original_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=255)
+    content = models.TextField()
+    attachment = models.FileField(upload_to='notice_attachments/', storage=attachment_storage, blank=True, null=True)
+    expiry_date = models.DateTimeField()
+    audience = models.CharField(max_length=10, choices=Notice.AUDIENCE_CHOICES, default='ALL')
+    iwi = models.ForeignKey('core.Iwi', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    hapu = models.ForeignKey('core.Hapu', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField()
+    priority = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    acknowledgment_count = models.PositiveIntegerField(default=0)
+    first_acknowledged_at = models.DateTimeField(null=True, blank=True)
+    last_acknowledged_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-expiry_date']
+
+    def __str__(self):
+        return self.title
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -437,6 +437,7 @@ class NoticeListViewTestCase(TestCase):
             email='user@example.com',
             password='userpass123',
             full_name='Regular User',
+            iwi=self.iwi,
             state='VERIFIED'
         )
         
@@ -525,6 +526,52 @@ class NoticeListViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.context['page_obj'].has_other_pages())
 
+    def test_notice_list_audience_scoping(self):
+        """Test that members only see notices addressed to them"""
+        other_iwi = Iwi.objects.create(name='Other Iwi')
+        Notice.objects.create(
+            title='Other Iwi Notice',
+            content='This notice is for another Iwi.',
+            expiry_date=self.future_date,
+            audience='IWI',
+            iwi=other_iwi,
+            created_by=self.admin_user
+        )
+        Notice.objects.create(
+            title='Hapu Notice',
+            content='This notice is for a specific Hapu.',
+            expiry_date=self.future_date,
+            audience='HAPU',
+            hapu=self.hapu,
+            created_by=self.admin_user
+        )
+        self.client.force_login(self.regular_user)
+        response = self.client.get(self.list_url)
+        self.assertContains(response, 'Iwi Notice')
+        self.assertNotContains(response, 'Other Iwi Notice')
+        self.assertNotContains(response, 'Hapu Notice')
+        
+        self.client.force_login(self.admin_user)
+        response = self.client.get(self.list_url)
+        self.assertContains(response, 'Other Iwi Notice')
+        self.assertContains(response, 'Hapu Notice')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_notice_list_first_page_cached(self):
+        """Test that the first page is cached per audience and refreshed on changes"""
+        from django.core.cache import cache
+        from .board import first_page
+        cache.clear()
+        self.assertEqual(len(first_page(self.regular_user)), 2)
+        with self.assertNumQueries(0):
+            page = first_page(self.regular_user)
+        self.assertEqual(page.paginator.num_pages, 1)
+        
+        self.active_notice.expiry_date = timezone.now()
+        self.active_notice.save()
+        titles = [notice.title for notice in first_page(self.regular_user)]
+        self.assertEqual(titles, ['Iwi Notice'])
+
 
 class NoticeDetailViewTestCase(TestCase):
     """Test cases for notice detail view"""
@@ -605,6 +652,48 @@ class NoticeDetailViewTestCase(TestCase):
         final_count = NoticeAcknowledgment.objects.filter(notice=self.notice, user=self.regular_user).count()
         self.assertEqual(initial_count, final_count)
 
+    def test_notice_detail_acknowledgment_single_query(self):
+        """Test that recording an acknowledgment is one insert, repeated or not"""
+        from .acknowledgments import record_acknowledgment
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                record_acknowledgment(self.notice.pk, self.regular_user.pk)
+        self.assertEqual(NoticeAcknowledgment.objects.filter(notice=self.notice).count(), 1)
+
+    @override_settings(NOTICE_ACK_BUFFER_SIZE=3, NOTICE_ACK_FLUSH_INTERVAL=3600)
+    def test_buffered_acknowledgments(self):
+        """Test that buffered acknowledgments are written in one batch when the buffer fills"""
+        from . import acknowledgments
+        acknowledgments.flush()
+        with self.assertNumQueries(0):
+            acknowledgments.record_acknowledgment(self.notice.pk, self.regular_user.pk)
+            acknowledgments.record_acknowledgment(self.notice.pk, self.regular_user.pk)
+            acknowledgments.record_acknowledgment(self.notice.pk, self.admin_user.pk)
+        self.assertEqual(acknowledgments.pending_count(), 2)
+        other = Notice.objects.create(
+            title='Other Notice', content='Another notice.', expiry_date=self.notice.expiry_date,
+            created_by=self.admin_user
+        )
+        with self.assertNumQueries(1):
+            acknowledgments.record_acknowledgment(other.pk, self.regular_user.pk)
+        self.assertEqual(acknowledgments.pending_count(), 0)
+        self.assertEqual(NoticeAcknowledgment.objects.count(), 3)
+
+    @override_settings(NOTICE_ACK_BUFFER_SIZE=10, NOTICE_ACK_FLUSH_INTERVAL=3600)
+    def test_buffered_acknowledgment_keeps_its_time(self):
+        """Test that a buffered acknowledgment is stamped when it was made, not when it is flushed"""
+        from datetime import timedelta
+        from unittest.mock import patch
+        from django.utils import timezone
+        from . import acknowledgments
+        acknowledgments.flush()
+        made = timezone.now() - timedelta(hours=2)
+        with patch('notice.acknowledgments.timezone.now', return_value=made):
+            acknowledgments.record_acknowledgment(self.notice.pk, self.regular_user.pk)
+        acknowledgments.record_acknowledgment(self.notice.pk, self.regular_user.pk)
+        acknowledgments.flush()
+        self.assertEqual(NoticeAcknowledgment.objects.get(notice=self.notice).acknowledged_at, made)
+
     def test_notice_detail_not_found(self):
         """Test notice detail with non-existent notice"""
         self.client.force_login(self.regular_user)
@@ -845,3 +934,185 @@ class NoticeManageViewTestCase(TestCase):
         self.assertTemplateUsed(response, 'notice/notice_engagement.html')
         self.assertContains(response, 'User 1')
         self.assertContains(response, 'User 2')
+
+
+class NoticeEngagementReportTestCase(TestCase):
+    """Test cases for the aggregated notice engagement report"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Report Iwi')
+        self.hapu = Hapu.objects.create(name='Report Hapu', iwi=self.iwi)
+        self.admin_user = User.objects.create_user(
+            email='admin@example.com', password='adminpass123', full_name='Admin User', is_staff=True, state='VERIFIED'
+        )
+        self.members = [
+            User.objects.create_user(
+                email=f'member{i}@example.com', password='pass', full_name=f'Member {i}',
+                iwi=self.iwi, hapu=self.hapu if i < 2 else None, state='VERIFIED'
+            )
+            for i in range(4)
+        ]
+        User.objects.create_user(email='outsider@example.com', password='pass', full_name='Outsider', state='VERIFIED')
+        self.notice = Notice.objects.create(
+            title='Iwi Notice', content='For the iwi.', expiry_date=timezone.now() + timedelta(days=1),
+            audience='IWI', iwi=self.iwi, created_by=self.admin_user
+        )
+        for member in self.members[:3]:
+            NoticeAcknowledgment.objects.create(notice=self.notice, user=member)
+        NoticeAcknowledgment.objects.create(notice=self.notice, user=self.admin_user)
+
+    def test_report_figures(self):
+        """Test read rate against the audience and the iwi/hapu breakdown"""
+        from .engagement import engagement_report
+        report = engagement_report(self.notice)
+        self.assertEqual(report['audience_size'], 4)
+        self.assertEqual(report['total_acknowledgments'], 4)
+        self.assertEqual(report['audience_acknowledgments'], 3)
+        self.assertEqual(report['read_rate'], 75.0)
+        self.assertEqual(report['bucket'], 'hour')
+        self.assertEqual(sum(row['count'] for row in report['timeline']), 4)
+        self.assertEqual(report['by_iwi'][0], {'user__iwi_id': self.iwi.id, 'user__iwi__name': 'Report Iwi', 'count': 3})
+        hapu_counts = {row['user__hapu_id']: row['count'] for row in report['by_hapu']}
+        self.assertEqual(hapu_counts, {self.hapu.id: 2, None: 2})
+
+    @override_settings(TIME_ZONE='Pacific/Auckland')
+    def test_timeline_buckets_in_local_time(self):
+        """Test that acknowledgments are bucketed by local hour and day, not by UTC day"""
+        from datetime import datetime, timezone as dt_timezone
+        from zoneinfo import ZoneInfo
+        from .engagement import engagement_report
+        auckland = ZoneInfo('Pacific/Auckland')
+        NoticeAcknowledgment.objects.filter(notice=self.notice).delete()
+        # 23:30 on 1 June and 00:30 on 2 June UTC fall on different UTC days but the same Auckland day
+        for member, moment in zip(self.members, (
+            datetime(2025, 6, 1, 23, 30, tzinfo=dt_timezone.utc),
+            datetime(2025, 6, 2, 0, 30, tzinfo=dt_timezone.utc),
+            datetime(2025, 6, 2, 0, 45, tzinfo=dt_timezone.utc),
+        )):
+            NoticeAcknowledgment.objects.create(notice=self.notice, user=member, acknowledged_at=moment)
+        hourly = engagement_report(self.notice, 'hour')['timeline']
+        self.assertEqual(
+            [(row['period'], row['count']) for row in hourly],
+            [(datetime(2025, 6, 2, 11, tzinfo=auckland), 1), (datetime(2025, 6, 2, 12, tzinfo=auckland), 2)],
+        )
+        daily = engagement_report(self.notice, 'day')['timeline']
+        self.assertEqual([(row['period'], row['count']) for row in daily], [(datetime(2025, 6, 2, tzinfo=auckland), 3)])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_expired_report_cached(self):
+        """Test that an expired notice's report is cached and no longer collects acknowledgments"""
+        from django.core.cache import cache
+        from .engagement import engagement_report
+        cache.clear()
+        self.notice.expiry_date = timezone.now() - timedelta(minutes=1)
+        self.notice.save()
+        engagement_report(self.notice, 'day')
+        with self.assertNumQueries(0):
+            report = engagement_report(self.notice, 'day')
+        self.assertEqual(report['total_acknowledgments'], 4)
+
+        self.client.force_login(self.members[3])
+        self.client.get(reverse('notice:notice_detail', kwargs={'pk': self.notice.pk}))
+        self.assertFalse(NoticeAcknowledgment.objects.filter(notice=self.notice, user=self.members[3]).exists())
+
+
+class ArchiveExpiredNoticesCommandTestCase(TestCase):
+    """Test cases for the archive_expired_notices management command"""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin@example.com', password='adminpass123', full_name='Admin User', is_staff=True, state='VERIFIED'
+        )
+        self.user = User.objects.create_user(email='user@example.com', password='pass', full_name='User', state='VERIFIED')
+        self.old_notices = [
+            Notice.objects.create(
+                title=f'Old Notice {i}', content='Long expired.', expiry_date=timezone.now() - timedelta(days=120),
+                created_by=self.admin_user, priority=i
+            )
+            for i in range(3)
+        ]
+        self.recent_notice = Notice.objects.create(
+            title='Recent Notice', content='Recently expired.', expiry_date=timezone.now() - timedelta(days=1),
+            created_by=self.admin_user
+        )
+        NoticeAcknowledgment.objects.create(notice=self.old_notices[0], user=self.user)
+        NoticeAcknowledgment.objects.create(notice=self.old_notices[0], user=self.admin_user)
+
+    def run_command(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('archive_expired_notices', *args, stdout=out)
+        return out.getvalue()
+
+    def test_archives_in_batches(self):
+        """Test that notices past the retention window are archived with acknowledgment rollups"""
+        from .models import ArchivedNotice
+        output = self.run_command('--retention-days', '90', '--batch-size', '2')
+        self.assertIn('Successfully archived 3 expired notices', output)
+        self.assertEqual(list(Notice.objects.values_list('title', flat=True)), ['Recent Notice'])
+        self.assertEqual(NoticeAcknowledgment.objects.count(), 0)
+        archived = ArchivedNotice.objects.get(original_id=self.old_notices[0].id)
+        self.assertEqual(archived.title, 'Old Notice 0')
+        self.assertEqual(archived.acknowledgment_count, 2)
+        self.assertIsNotNone(archived.last_acknowledged_at)
+        self.assertEqual(ArchivedNotice.objects.get(original_id=self.old_notices[2].id).acknowledgment_count, 0)
+
+    def test_dry_run(self):
+        """Test that a dry run archives nothing"""
+        from .models import ArchivedNotice
+        output = self.run_command('--dry-run')
+        self.assertIn('Would archive 3 notices', output)
+        self.assertEqual(Notice.objects.count(), 4)
+        self.assertFalse(ArchivedNotice.objects.exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UnreadNoticeCountTestCase(TestCase):
+    """Test cases for the unread notice counter in the navigation bar"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.iwi = Iwi.objects.create(name='Unread Iwi')
+        self.admin_user = User.objects.create_user(
+            email='admin@example.com', password='adminpass123', full_name='Admin User', is_staff=True, state='VERIFIED'
+        )
+        self.user = User.objects.create_user(
+            email='user@example.com', password='pass', full_name='User', iwi=self.iwi, state='VERIFIED'
+        )
+        future = timezone.now() + timedelta(days=3)
+        self.notices = [
+            Notice.objects.create(title='For All', content='Everyone.', expiry_date=future, created_by=self.admin_user),
+            Notice.objects.create(
+                title='For Iwi', content='The iwi.', expiry_date=future, audience='IWI', iwi=self.iwi,
+                created_by=self.admin_user
+            ),
+        ]
+        Notice.objects.create(
+            title='Expired', content='Old.', expiry_date=timezone.now() - timedelta(days=1), created_by=self.admin_user
+        )
+
+    def test_unread_count(self):
+        """Test that reading a notice lowers the count without recomputing the audience"""
+        from .board import unread_count
+        self.assertEqual(unread_count(self.user), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 2)
+        self.client.force_login(self.user)
+        self.client.get(reverse('notice:notice_detail', kwargs={'pk': self.notices[0].pk}))
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 1)
+
+    def test_new_notice_counted(self):
+        """Test that a new notice shows up in the count and the navigation badge"""
+        from .board import unread_count
+        unread_count(self.user)
+        Notice.objects.create(
+            title='Another', content='New.', expiry_date=timezone.now() + timedelta(days=1), created_by=self.admin_user
+        )
+        self.assertEqual(unread_count(self.user), 3)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'title="Unread notices">3</span>')
+
@@ -2,41 +2,60 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
 from django.contrib import messages
-from .models import Notice, NoticeAcknowledgment
+from .models import Notice
 from .forms import NoticeForm
+from .acknowledgments import record_acknowledgment
+from .engagement import engagement_report
+from .board import PAGE_SIZE, audience_filter, first_page, unread_count, visible_notices
 from core.models import Iwi, Hapu
+from core.hierarchy import get_hierarchy, set_cached_choices
+from core.roles import get_role_profile
+from core.uploads import form_files, release
 from django.utils import timezone
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 
 def is_leader_or_admin(user):
-    return user.is_authenticated and (user.is_staff or user.iwi_leaderships.exists() or user.hapu_leaderships.exists())
+    return get_role_profile(user).is_leader_or_admin
+
+def unread_notices_context_processor(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notice_count': SimpleLazyObject(lambda: unread_count(user))}
 
 @login_required
 def notice_list(request):
-    notices = Notice.objects.filter(expiry_date__gt=timezone.now()).order_by('-priority', '-created_at')
     # Filtering
     audience = request.GET.get('audience')
     iwi = request.GET.get('iwi')
     hapu = request.GET.get('hapu')
-    
-    # Apply audience filter only if a specific audience is selected (not "All")
-    if audience and audience != '':
-        notices = notices.filter(audience=audience)
-    
-    # Apply iwi filter if selected
-    if iwi:
-        notices = notices.filter(iwi_id=iwi)
-    
-    # Apply hapu filter if selected
-    if hapu:
-        notices = notices.filter(hapu_id=hapu)
-    
-    # Pagination
-    paginator = Paginator(notices, 6)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    iwis = Iwi.objects.filter(is_archived=False)
-    hapus = Hapu.objects.filter(is_archived=False)
+    
+    if not (audience or iwi or hapu) and page_number in (None, '', '1'):
+        # Unfiltered first page, shared by everyone in the user's audience
+        page_obj = first_page(request.user)
+    else:
+        notices = visible_notices(request.user)
+        
+        # Apply audience filter only if a specific audience is selected (not "All")
+        if audience and audience != '':
+            notices = notices.filter(audience=audience)
+        
+        # Apply iwi filter if selected
+        if iwi:
+            notices = notices.filter(iwi_id=iwi)
+        
+        # Apply hapu filter if selected
+        if hapu:
+            notices = notices.filter(hapu_id=hapu)
+        
+        # Pagination
+        paginator = Paginator(notices, PAGE_SIZE)
+        page_obj = paginator.get_page(page_number)
+    hierarchy = get_hierarchy()
+    iwis = hierarchy.iwi_rows()
+    hapus = hierarchy.hapu_rows()
     return render(request, 'notice/notice_list.html', {
         'page_obj': page_obj,
         'audience': audience,
@@ -48,10 +67,10 @@ def notice_list(request):
 
 @login_required
 def notice_detail(request, pk):
-    notice = get_object_or_404(Notice, pk=pk)
-    # Track acknowledgment
-    if not NoticeAcknowledgment.objects.filter(notice=notice, user=request.user).exists():
-        NoticeAcknowledgment.objects.create(notice=notice, user=request.user)
+    notice = get_object_or_404(Notice.objects.filter(audience_filter(request.user)), pk=pk)
+    # Track acknowledgment; expired notices keep their final engagement figures
+    if notice.is_active():
+        record_acknowledgment(notice.pk, request.user.pk)
     return render(request, 'notice/notice_detail.html', {'notice': notice})
 
 @user_passes_test(is_leader_or_admin)
@@ -59,32 +78,36 @@ def create_notice(request):
     user = request.user
     is_admin = user.is_staff
     allowed_audience = [('ALL', 'All Users'), ('IWI', 'Specific Iwi'), ('HAPU', 'Specific Hapu')]
+    hierarchy = get_hierarchy()
     iwi_qs = Iwi.objects.filter(is_archived=False)
     hapu_qs = Hapu.objects.filter(is_archived=False)
+    iwi_rows = hierarchy.iwi_rows()
+    hapu_data = hierarchy.hapu_rows()
     if not is_admin:
-        iwi_ids = list(user.iwi_leaderships.values_list('iwi_id', flat=True))
-        hapu_ids = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+        profile = get_role_profile(user)
+        iwi_ids = sorted(profile.iwi_ids)
+        hapu_ids = sorted(profile.hapu_ids)
         if iwi_ids:
             # Iwi leader (may also be hapu leader): can select from their iwi and its hapus
             iwi_qs = Iwi.objects.filter(id__in=iwi_ids, is_archived=False)
             hapu_qs = Hapu.objects.filter(iwi_id__in=iwi_ids, is_archived=False)
+            iwi_rows = hierarchy.iwi_rows(iwi_ids)
+            hapu_data = hierarchy.hapu_rows(iwi_ids=iwi_ids)
             allowed_audience = [('IWI', 'Specific Iwi'), ('HAPU', 'Specific Hapu')]
         elif hapu_ids:
             # Only hapu leader
             hapu_qs = Hapu.objects.filter(id__in=hapu_ids, is_archived=False)
             iwi_qs = Iwi.objects.filter(id__in=hapu_qs.values_list('iwi_id', flat=True), is_archived=False)
+            hapu_data = hierarchy.hapu_rows(ids=hapu_ids)
+            iwi_rows = hierarchy.iwi_rows({hapu['iwi_id'] for hapu in hapu_data})
             allowed_audience = [('HAPU', 'Specific Hapu')]
     
-    # Get hapu data with iwi information for JavaScript filtering
-    hapu_data = []
-    if hapu_qs.exists():
-        hapu_data = list(hapu_qs.values('id', 'name', 'iwi_id').order_by('name'))
-    
     # Get current datetime for minimum expiry date
     current_datetime = timezone.now().strftime('%Y-%m-%dT%H:%M')
     
     if request.method == 'POST':
-        form = NoticeForm(request.POST, request.FILES)
+        files = form_files(request, 'attachment')
+        form = NoticeForm(request.POST, files)
         form.fields['iwi'].queryset = iwi_qs
         form.fields['hapu'].queryset = hapu_qs
         form.fields['audience'].choices = allowed_audience
@@ -92,6 +115,7 @@ def create_notice(request):
             notice = form.save(commit=False)
             notice.created_by = user
             notice.save()
+            release(files)
             messages.success(request, 'Notice created successfully!')
             return redirect('notice:notice_list')
         else:
@@ -102,6 +126,7 @@ def create_notice(request):
         form.fields['iwi'].queryset = iwi_qs
         form.fields['hapu'].queryset = hapu_qs
         form.fields['audience'].choices = allowed_audience
+        set_cached_choices(form.fields['iwi'], iwi_rows)
     return render(request, 'notice/create_notice.html', {
         'form': form,
         'hapu_data': hapu_data,
@@ -119,35 +144,40 @@ def edit_notice(request, pk):
     user = request.user
     is_admin = user.is_staff
     allowed_audience = [('ALL', 'All Users'), ('IWI', 'Specific Iwi'), ('HAPU', 'Specific Hapu')]
+    hierarchy = get_hierarchy()
     iwi_qs = Iwi.objects.filter(is_archived=False)
     hapu_qs = Hapu.objects.filter(is_archived=False)
+    iwi_rows = hierarchy.iwi_rows()
+    hapu_data = hierarchy.hapu_rows()
     if not is_admin:
-        iwi_ids = list(user.iwi_leaderships.values_list('iwi_id', flat=True))
-        hapu_ids = list(user.hapu_leaderships.values_list('hapu_id', flat=True))
+        profile = get_role_profile(user)
+        iwi_ids = sorted(profile.iwi_ids)
+        hapu_ids = sorted(profile.hapu_ids)
         if iwi_ids:
             iwi_qs = Iwi.objects.filter(id__in=iwi_ids, is_archived=False)
             hapu_qs = Hapu.objects.filter(iwi_id__in=iwi_ids, is_archived=False)
+            iwi_rows = hierarchy.iwi_rows(iwi_ids)
+            hapu_data = hierarchy.hapu_rows(iwi_ids=iwi_ids)
             allowed_audience = [('IWI', 'Specific Iwi'), ('HAPU', 'Specific Hapu')]
         elif hapu_ids:
             hapu_qs = Hapu.objects.filter(id__in=hapu_ids, is_archived=False)
             iwi_qs = Iwi.objects.filter(id__in=hapu_qs.values_list('iwi_id', flat=True), is_archived=False)
+            hapu_data = hierarchy.hapu_rows(ids=hapu_ids)
+            iwi_rows = hierarchy.iwi_rows({hapu['iwi_id'] for hapu in hapu_data})
             allowed_audience = [('HAPU', 'Specific Hapu')]
     
-    # Get hapu data with iwi information for JavaScript filtering
-    hapu_data = []
-    if hapu_qs.exists():
-        hapu_data = list(hapu_qs.values('id', 'name', 'iwi_id').order_by('name'))
-    
     # Get current datetime for minimum expiry date
     current_datetime = timezone.now().strftime('%Y-%m-%dT%H:%M')
     
     if request.method == 'POST':
-        form = NoticeForm(request.POST, request.FILES, instance=notice)
+        files = form_files(request, 'attachment')
+        form = NoticeForm(request.POST, files, instance=notice)
         form.fields['iwi'].queryset = iwi_qs
         form.fields['hapu'].queryset = hapu_qs
         form.fields['audience'].choices = allowed_audience
         if form.is_valid():
             form.save()
+            release(files)
             messages.success(request, 'Notice updated successfully!')
             return redirect('notice:manage_notices')
         else:
@@ -158,6 +188,7 @@ def edit_notice(request, pk):
         form.fields['iwi'].queryset = iwi_qs
         form.fields['hapu'].queryset = hapu_qs
         form.fields['audience'].choices = allowed_audience
+        set_cached_choices(form.fields['iwi'], iwi_rows)
     return render(request, 'notice/edit_notice.html', {
         'form': form, 
         'notice': notice,
@@ -187,5 +218,11 @@ def expire_notice(request, pk):
 @user_passes_test(is_leader_or_admin)
 def notice_engagement(request, pk):
     notice = get_object_or_404(Notice, pk=pk)
-    acknowledgments = notice.acknowledgments.select_related('user').all()
-    return render(request, 'notice/notice_engagement.html', {'notice': notice, 'acknowledgments': acknowledgments})
+    report = engagement_report(notice, request.GET.get('bucket'))
+    acknowledgments = notice.acknowledgments.select_related('user').order_by('-acknowledged_at')
+    page_obj = Paginator(acknowledgments, 50).get_page(request.GET.get('page'))
+    return render(request, 'notice/notice_engagement.html', {
+        'notice': notice,
+        'report': report,
+        'page_obj': page_obj,
+    })
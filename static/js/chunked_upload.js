@@ -0,0 +1,147 @@
+/*
+ * Chunked, resumable uploads for file inputs marked with data-chunked-upload="<purpose>".
+ *
+ * When the form is submitted the chosen file is sent to /api/uploads/ in chunks
+ * (see core/uploads.py). A dropped connection is retried from the offset the
+ * server has received, also after a page reload, and the form is then
+ * submitted with the upload id in the hidden "<name>_upload" input instead of
+ * the file itself.
+ */
+(function () {
+  'use strict';
+
+  const MAX_ATTEMPTS = 8;
+
+  function csrfToken(form) {
+    const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+  }
+
+  function storageKey(input, file) {
+    return ['chunked-upload', input.dataset.chunkedUpload, file.name, file.size, file.lastModified].join(':');
+  }
+
+  function sleep(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function request(url, options) {
+    const response = await fetch(url, Object.assign({ credentials: 'same-origin' }, options));
+    const body = response.status === 204 ? {} : await response.json().catch(function () { return {}; });
+    return { status: response.status, ok: response.ok, body: body };
+  }
+
+  async function resumeOrStart(input, file, token) {
+    const key = storageKey(input, file);
+    const saved = localStorage.getItem(key);
+    if (saved) {
+      const state = await request(saved, { method: 'GET' });
+      if (state.ok) {
+        return state.body;
+      }
+      localStorage.removeItem(key);
+    }
+    const data = new FormData();
+    data.append('purpose', input.dataset.chunkedUpload);
+    data.append('filename', file.name);
+    data.append('size', file.size);
+    const started = await request(input.dataset.uploadUrl, {
+      method: 'POST', body: data, headers: { 'X-CSRFToken': token },
+    });
+    if (!started.ok) {
+      throw new Error(started.body.error || 'The upload could not be started.');
+    }
+    localStorage.setItem(key, started.body.url);
+    return started.body;
+  }
+
+  async function upload(input, file, token, progress) {
+    let state = await resumeOrStart(input, file, token);
+    let attempts = 0;
+    while (!state.complete) {
+      progress(state.offset / file.size);
+      const end = Math.min(state.offset + state.chunk_size, file.size);
+      let result;
+      try {
+        result = await request(state.url, {
+          method: 'PATCH',
+          body: file.slice(state.offset, end),
+          headers: {
+            'X-CSRFToken': token,
+            'Upload-Offset': String(state.offset),
+            'Content-Type': 'application/octet-stream',
+          },
+        });
+      } catch (networkError) {
+        result = null;
+      }
+      if (result && result.ok) {
+        state = result.body;
+        attempts = 0;
+        continue;
+      }
+      if (result && result.status !== 409 && result.status < 500) {
+        localStorage.removeItem(storageKey(input, file));
+        throw new Error(result.body.error || 'The upload was rejected.');
+      }
+      attempts += 1;
+      if (attempts >= MAX_ATTEMPTS) {
+        throw new Error('The connection keeps dropping. Submit again to continue the upload where it stopped.');
+      }
+      await sleep(Math.min(1000 * Math.pow(2, attempts), 30000));
+      // Ask the server how much arrived before retrying
+      const current = await request(state.url, { method: 'GET' }).catch(function () { return null; });
+      if (current && current.ok) {
+        state = current.body;
+      }
+    }
+    localStorage.removeItem(storageKey(input, file));
+    progress(1);
+    return state.id;
+  }
+
+  function progressBar(input) {
+    let bar = input.parentNode.querySelector('.chunked-upload-progress');
+    if (!bar) {
+      bar = document.createElement('div');
+      bar.className = 'progress mt-2 chunked-upload-progress';
+      bar.innerHTML = '<div class="progress-bar" role="progressbar" style="width: 0%"></div>';
+      input.parentNode.appendChild(bar);
+    }
+    const inner = bar.firstChild;
+    return function (fraction) {
+      inner.style.width = Math.round(fraction * 100) + '%';
+      inner.textContent = Math.round(fraction * 100) + '%';
+    };
+  }
+
+  document.addEventListener('submit', async function (event) {
+    const form = event.target;
+    if (event.defaultPrevented) {
+      return;
+    }
+    const inputs = Array.from(form.querySelectorAll('input[type="file"][data-chunked-upload]')).filter(function (input) {
+      const hidden = form.querySelector('input[name="' + input.name + '_upload"]');
+      return input.files.length && hidden && !hidden.value;
+    });
+    if (!inputs.length || !window.fetch) {
+      return;
+    }
+    event.preventDefault();
+    const buttons = form.querySelectorAll('button[type="submit"], input[type="submit"]');
+    buttons.forEach(function (button) { button.disabled = true; });
+    try {
+      for (const input of inputs) {
+        const id = await upload(input, input.files[0], csrfToken(form), progressBar(input));
+        form.querySelector('input[name="' + input.name + '_upload"]').value = id;
+        // Disabled inputs are not submitted, so the file is not sent a second time
+        input.required = false;
+        input.disabled = true;
+      }
+      form.submit();
+    } catch (error) {
+      alert(error.message);
+      buttons.forEach(function (button) { button.disabled = false; });
+    }
+  });
+})();
@@ -0,0 +1,68 @@
+"""
+Streamed CSV member rolls.
+
+Rows are read with values_list(...).iterator() and written one at a time
+into the response, so an export never holds model instances or the whole
+file in memory, and the first bytes reach the client straight away instead
+of after the complete roll has been built.
+"""
+import csv
+
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core.models import IwiLeader, HapuLeader
+
+HEADER = ['Full name', 'Email', 'Iwi', 'Hapu', 'State', 'Registered at', 'Iwi leader', 'Hapu leader']
+CHUNK_SIZE = 2000
+
+# Spreadsheet applications evaluate cells starting with these characters
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if hasattr(value, 'isoformat'):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    value = str(value)
+    if value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def member_rows(members):
+    """Header and one list of cells per member of ``members``"""
+    members = members.annotate(
+        leads_iwi=Exists(IwiLeader.objects.filter(user_id=OuterRef('pk'), iwi_id=OuterRef('iwi_id'))),
+        leads_hapu=Exists(HapuLeader.objects.filter(user_id=OuterRef('pk'), hapu_id=OuterRef('hapu_id'))),
+    ).order_by('full_name', 'pk').values_list(
+        'full_name', 'email', 'iwi__name', 'hapu__name', 'state', 'registered_at', 'leads_iwi', 'leads_hapu'
+    )
+    yield HEADER
+    for row in members.iterator(chunk_size=CHUNK_SIZE):
+        yield [_cell(value) for value in row]
+
+
+def members_csv_response(members, name):
+    """StreamingHttpResponse with the CSV roll of ``members``, downloaded as ``name``"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in member_rows(members)),
+        content_type='text/csv; charset=utf-8',
+    )
+    filename = f'{slugify(name) or "members"}-members-{timezone.localdate():%Y-%m-%d}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
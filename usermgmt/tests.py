@@ -1,8 +1,16 @@
-from django.test import TestCase, Client
+import os
+import time
+from unittest.mock import patch
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from core.models import Iwi, Hapu
+from core.models import Iwi, Hapu, IwiLeader, HapuLeader, IwiStats
 from core.models import CustomUser
+from core.roles import RoleProfile, get_role_profile
+from core.testing import TemporaryFilesMixin
+from core.thumbnails import thumbnail_name
 
 User = get_user_model()
 
@@ -74,3 +82,371 @@ class UserListViewTestCase(TestCase):
         self.user1.refresh_from_db()
         self.assertEqual(self.user1.state, 'REJECTED')
         self.assertContains(response, 'has been rejected successfully')
+
+
+class ManageLeadersViewTestCase(TestCase):
+    """Batched leadership changes in manage_iwi_leaders and manage_hapu_leaders"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Test Iwi')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='adminpass', full_name='Admin User', is_staff=True, state='VERIFIED'
+        )
+        self.members = [
+            User.objects.create_user(
+                email=f'member{i}@example.com', password='pass', full_name=f'Member {i:02d}',
+                iwi=self.iwi, hapu=self.hapu, state='VERIFIED'
+            )
+            for i in range(30)
+        ]
+        self.iwi_url = reverse('usermgmt:manage_iwi_leaders') + f'?iwi={self.iwi.id}'
+        self.hapu_url = reverse('usermgmt:manage_hapu_leaders') + f'?hapu={self.hapu.id}'
+
+    def test_add_several_iwi_leaders(self):
+        """Several candidates are added in one POST and their cached profiles are dropped"""
+        chosen = self.members[:3]
+        for member in chosen:
+            self.assertFalse(get_role_profile(User.objects.get(pk=member.pk)).is_iwi_leader)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.iwi_url, {'add_leader': [m.id for m in chosen]})
+        self.assertRedirects(response, self.iwi_url)
+        self.assertEqual(set(IwiLeader.objects.values_list('user_id', flat=True)), {m.id for m in chosen})
+        for member in chosen:
+            self.assertTrue(get_role_profile(User.objects.get(pk=member.pk)).leads_iwi(self.iwi.id))
+        self.assertEqual(IwiStats.objects.get(iwi=self.iwi).leader_count, 3)
+
+    def test_add_ignores_non_candidates(self):
+        """Users outside the iwi, staff and existing leaders are not added twice or at all"""
+        outsider = User.objects.create_user(
+            email='outsider@example.com', password='pass', full_name='Outsider', state='VERIFIED'
+        )
+        IwiLeader.objects.create(iwi=self.iwi, user=self.members[0])
+        self.client.force_login(self.admin)
+        self.client.post(self.iwi_url, {'add_leader': [outsider.id, self.admin.id, self.members[0].id, 'x']})
+        self.assertEqual(list(IwiLeader.objects.values_list('user_id', flat=True)), [self.members[0].id])
+
+    def test_remove_several_iwi_leaders(self):
+        """Selected leaders are removed together and lose their leadership"""
+        for member in self.members[:4]:
+            IwiLeader.objects.create(iwi=self.iwi, user=member)
+        self.assertTrue(get_role_profile(User.objects.get(pk=self.members[0].pk)).is_iwi_leader)
+        self.client.force_login(self.admin)
+        self.client.post(self.iwi_url, {'remove_leader': [m.id for m in self.members[:3]]})
+        self.assertEqual(list(IwiLeader.objects.values_list('user_id', flat=True)), [self.members[3].id])
+        self.assertFalse(get_role_profile(User.objects.get(pk=self.members[0].pk)).is_iwi_leader)
+
+    def test_candidates_paginated_and_searchable(self):
+        """The candidate list is paginated and filtered by name or email"""
+        self.client.force_login(self.admin)
+        response = self.client.get(self.iwi_url)
+        self.assertEqual(len(response.context['page_obj']), 25)
+        self.assertEqual(response.context['page_obj'].paginator.count, 30)
+        response = self.client.get(self.iwi_url + '&q=member1')
+        self.assertEqual(
+            [u.full_name for u in response.context['page_obj']],
+            ['Member 01', 'Member 10', 'Member 11', 'Member 12', 'Member 13',
+             'Member 14', 'Member 15', 'Member 16', 'Member 17', 'Member 18', 'Member 19'],
+        )
+
+    def test_hapu_leaders_batch_add_and_remove(self):
+        """Iwi leaders add and remove several hapu leaders at once"""
+        leader = self.members[0]
+        IwiLeader.objects.create(iwi=self.iwi, user=leader)
+        HapuLeader.objects.create(hapu=self.hapu, user=self.members[1])
+        self.client.force_login(leader)
+        response = self.client.post(self.hapu_url, {
+            'add_leader': [self.members[2].id, self.members[3].id],
+            'remove_leader': [self.members[1].id],
+        })
+        self.assertRedirects(response, self.hapu_url)
+        self.assertEqual(
+            set(HapuLeader.objects.values_list('user_id', flat=True)), {self.members[2].id, self.members[3].id}
+        )
+        self.assertTrue(get_role_profile(User.objects.get(pk=self.members[2].pk)).leads_hapu(self.hapu.id))
+
+    def test_hapu_leaders_page_requires_iwi_leadership(self):
+        """Users who do not lead the hapu's iwi cannot change its leaders"""
+        self.client.force_login(self.members[5])
+        self.client.post(self.hapu_url, {'add_leader': [self.members[5].id]})
+        self.assertFalse(HapuLeader.objects.exists())
+
+
+
+class MemberSearchViewTestCase(TestCase):
+    """The JSON member search endpoint"""
+
+    def setUp(self):
+        self.url = reverse('usermgmt:member_search')
+        self.iwi = Iwi.objects.create(name='Test Iwi')
+        self.other_iwi = Iwi.objects.create(name='Other Iwi')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='adminpass', full_name='Admin User', is_staff=True, state='VERIFIED'
+        )
+        self.leader = User.objects.create_user(
+            email='leader@example.com', password='pass', full_name='Leader', iwi=self.iwi, state='VERIFIED'
+        )
+        IwiLeader.objects.create(iwi=self.iwi, user=self.leader)
+        self.member = User.objects.create_user(
+            email='tane@example.com', password='pass', full_name='Tane Member', iwi=self.iwi, state='VERIFIED'
+        )
+        self.outsider = User.objects.create_user(
+            email='tane.other@example.com', password='pass', full_name='Tane Outsider', iwi=self.other_iwi,
+            state='VERIFIED'
+        )
+
+    def test_admin_searches_everyone(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url, {'q': 'tane'})
+        self.assertEqual(
+            [row['email'] for row in response.json()['results']], ['tane@example.com', 'tane.other@example.com']
+        )
+        self.assertEqual(response.json()['results'][0]['iwi'], 'Test Iwi')
+
+    def test_iwi_leader_searches_own_iwi_only(self):
+        self.client.force_login(self.leader)
+        response = self.client.get(self.url, {'q': 'tane'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.member.id])
+
+    def test_members_cannot_search(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(self.url, {'q': 'tane'}).status_code, 403)
+
+    def test_user_list_search(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('usermgmt:user_list'), {'q': 'outsider'})
+        self.assertEqual(list(response.context['page_obj']), [self.outsider])
+
+
+class ExportMembersViewTestCase(TestCase):
+    """Streamed CSV export of iwi and hapu member rolls"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Ngāti Test')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi)
+        self.other_hapu = Hapu.objects.create(name='Other Hapu', iwi=self.iwi)
+        self.iwi_leader = User.objects.create_user(
+            email='iwi.leader@example.com', password='pass', full_name='Iwi Leader', iwi=self.iwi, state='VERIFIED'
+        )
+        IwiLeader.objects.create(iwi=self.iwi, user=self.iwi_leader)
+        self.hapu_leader = User.objects.create_user(
+            email='hapu.leader@example.com', password='pass', full_name='Hapu Leader',
+            iwi=self.iwi, hapu=self.hapu, state='VERIFIED'
+        )
+        HapuLeader.objects.create(hapu=self.hapu, user=self.hapu_leader)
+        self.member = User.objects.create_user(
+            email='member@example.com', password='pass', full_name='=Member', iwi=self.iwi, hapu=self.other_hapu
+        )
+
+    def export(self, **params):
+        response = self.client.get(reverse('usermgmt:export_members'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return [line.split(',') for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_iwi_leader_exports_iwi_roll(self):
+        self.client.force_login(self.iwi_leader)
+        rows = self.export(iwi=self.iwi.pk)
+        self.assertEqual(rows[0][0], 'Full name')
+        self.assertEqual([row[1] for row in rows[1:]], [
+            'member@example.com', 'hapu.leader@example.com', 'iwi.leader@example.com',
+        ])
+        by_email = {row[1]: row for row in rows[1:]}
+        self.assertEqual(by_email['iwi.leader@example.com'][6:], ['yes', 'no'])
+        self.assertEqual(by_email['hapu.leader@example.com'][6:], ['no', 'yes'])
+        self.assertEqual(by_email['member@example.com'][4], 'PENDING_VERIFICATION')
+
+    def test_formula_cells_are_escaped(self):
+        self.client.force_login(self.iwi_leader)
+        rows = self.export(iwi=self.iwi.pk)
+        self.assertEqual(rows[1][0], "'=Member")
+
+    def test_hapu_leader_exports_own_hapu_only(self):
+        self.client.force_login(self.hapu_leader)
+        rows = self.export(hapu=self.hapu.pk)
+        self.assertEqual([row[1] for row in rows[1:]], ['hapu.leader@example.com'])
+        response = self.client.get(reverse('usermgmt:export_members'), {'hapu': self.other_hapu.pk})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('usermgmt:export_members'), {'iwi': self.iwi.pk})
+        self.assertEqual(response.status_code, 403)
+
+    def test_filename_and_missing_group(self):
+        self.client.force_login(self.iwi_leader)
+        response = self.client.get(reverse('usermgmt:export_members'), {'iwi': self.iwi.pk})
+        self.assertIn('ngati-test-members-', response['Content-Disposition'])
+        self.assertEqual(self.client.get(reverse('usermgmt:export_members')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('usermgmt:export_members'), {'iwi': 99999}).status_code, 404)
+
+
+class CitizenshipDocumentViewTestCase(TemporaryFilesMixin, TestCase):
+    """Signed citizenship document links and their delivery"""
+
+    def setUp(self):
+        self.temporary_media(PROTECTED_FILE_SERVER='', DOCUMENT_URL_MAX_AGE=300)
+        self.iwi = Iwi.objects.create(name='Test Iwi')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi)
+        self.content = bytes(range(256)) * 40
+        self.owner = User.objects.create_user(
+            email='owner@example.com', password='pass', full_name='Owner', iwi=self.iwi, hapu=self.hapu,
+            citizenship_document=SimpleUploadedFile('passport.pdf', self.content, content_type='application/pdf'),
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='pass', full_name='Admin', is_staff=True, state='VERIFIED'
+        )
+        self.hapu_leader = User.objects.create_user(
+            email='leader@example.com', password='pass', full_name='Leader', state='VERIFIED'
+        )
+        HapuLeader.objects.create(hapu=self.hapu, user=self.hapu_leader)
+        self.stranger = User.objects.create_user(
+            email='stranger@example.com', password='pass', full_name='Stranger', state='VERIFIED'
+        )
+
+    def signed_url(self, viewer):
+        self.client.force_login(viewer)
+        response = self.client.get(reverse('usermgmt:view_citizenship_document', args=[self.owner.id]))
+        self.assertEqual(response.status_code, 302)
+        return response['Location']
+
+    def test_admin_gets_signed_link_and_document(self):
+        url = self.signed_url(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_owner_and_hapu_leader_can_view(self):
+        self.assertEqual(self.client.get(self.signed_url(self.owner)).status_code, 200)
+        self.assertEqual(self.client.get(self.signed_url(self.hapu_leader)).status_code, 200)
+
+    def test_others_are_refused(self):
+        self.client.force_login(self.stranger)
+        response = self.client.get(reverse('usermgmt:view_citizenship_document', args=[self.owner.id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_link_is_bound_to_viewer(self):
+        url = self.signed_url(self.admin)
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url[:-3] + 'xx/').status_code, 404)
+
+    def test_link_expires(self):
+        url = self.signed_url(self.admin)
+        with patch('django.core.signing.time.time', return_value=time.time() + 301):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(DOCUMENT_URL_MAX_AGE=600):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_range_requests(self):
+        url = self.signed_url(self.admin)
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        # A stale If-Range validator gets the whole file
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_requests(self):
+        url = self.signed_url(self.admin)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_web_server_handoff(self):
+        url = self.signed_url(self.admin)
+        with override_settings(PROTECTED_FILE_SERVER='x-accel-redirect', PROTECTED_FILE_ACCEL_PREFIX='/protected/'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.owner.citizenship_document.name)
+        self.assertEqual(response.content, b'')
+        with override_settings(PROTECTED_FILE_SERVER='x-sendfile'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Sendfile'], self.owner.citizenship_document.path)
+
+
+class DocumentThumbnailTestCase(TemporaryFilesMixin, TestCase):
+    """Preview thumbnails in the verification queues"""
+
+    def setUp(self):
+        self.temporary_media(PROTECTED_FILE_SERVER='')
+        self.iwi = Iwi.objects.create(name='Test Iwi')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi)
+        self.applicant = User.objects.create_user(
+            email='applicant@example.com', password='pass', full_name='Applicant', iwi=self.iwi, hapu=self.hapu,
+            citizenship_document=SimpleUploadedFile('id.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='pass', full_name='Admin', is_staff=True, state='VERIFIED'
+        )
+        self.hapu_leader = User.objects.create_user(
+            email='leader@example.com', password='pass', full_name='Leader', state='VERIFIED'
+        )
+        HapuLeader.objects.create(hapu=self.hapu, user=self.hapu_leader)
+
+    def write_thumbnail(self):
+        name = thumbnail_name(self.applicant.citizenship_document.name)
+        self.assertTrue(name.startswith('protected_citizenship_docs/'))
+        with open(os.path.join(settings.MEDIA_ROOT, name), 'wb') as f:
+            f.write(b'thumbnail-bytes')
+
+    def test_queue_without_thumbnail_shows_link_only(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('usermgmt:user_list'))
+        self.assertContains(response, 'View Document')
+        self.assertNotContains(response, 'Document preview')
+
+    def test_user_list_shows_signed_thumbnail(self):
+        self.write_thumbnail()
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('usermgmt:user_list'))
+        applicant = next(user for user in response.context['page_obj'] if user.pk == self.applicant.pk)
+        self.assertContains(response, applicant.thumbnail_url)
+        thumbnail = self.client.get(applicant.thumbnail_url)
+        self.assertEqual(thumbnail.status_code, 200)
+        self.assertEqual(thumbnail['Content-Type'], 'image/jpeg')
+        self.assertEqual(b''.join(thumbnail.streaming_content), b'thumbnail-bytes')
+
+    def test_hapu_approval_queue_shows_thumbnail(self):
+        self.write_thumbnail()
+        self.client.force_login(self.hapu_leader)
+        response = self.client.get(reverse('usermgmt:hapu_user_approval'))
+        self.assertContains(response, 'Document preview')
+        applicant = response.context['page_obj'][0]
+        self.assertEqual(self.client.get(applicant.thumbnail_url).status_code, 200)
+
+
+class HapuUserApprovalViewTestCase(TestCase):
+    """Choosing the hapu in the hapu leader approval queue"""
+
+    def setUp(self):
+        self.iwi = Iwi.objects.create(name='Test Iwi')
+        self.hapu = Hapu.objects.create(name='Test Hapu', iwi=self.iwi)
+        self.other_hapu = Hapu.objects.create(name='Other Hapu', iwi=self.iwi)
+        self.leader = User.objects.create_user(
+            email='leader@example.com', password='pass', full_name='Leader', state='VERIFIED'
+        )
+        HapuLeader.objects.create(hapu=self.hapu, user=self.leader)
+        self.client.force_login(self.leader)
+        self.url = reverse('usermgmt:hapu_user_approval')
+
+    def test_selected_hapu(self):
+        response = self.client.get(self.url, {'hapu': self.hapu.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['selected_hapu'], self.hapu)
+
+    def test_invalid_or_unled_hapu_is_not_found(self):
+        for value in ('abc', '1.5', str(self.other_hapu.pk)):
+            self.assertEqual(self.client.get(self.url, {'hapu': value}).status_code, 404, value)
+
+    def test_stale_profile_hapu_is_not_found(self):
+        stale = RoleProfile(hapu_ids=[self.hapu.pk, 999999])
+        with patch('usermgmt.views.get_role_profile', return_value=stale):
+            response = self.client.get(self.url, {'hapu': 999999})
+            self.assertEqual(response.status_code, 404)
+            response = self.client.post(f'{self.url}?hapu=999999', {'verify_user_id': self.leader.pk})
+            self.assertEqual(response.status_code, 404)
@@ -1,11 +1,15 @@
 from django.urls import path
-from .views import user_list, view_citizenship_document, manage_iwi_leaders, manage_hapu_leaders, hapu_user_approval
+from .views import user_list, view_citizenship_document, citizenship_document, citizenship_document_thumbnail, manage_iwi_leaders, manage_hapu_leaders, hapu_user_approval, member_search, export_members
 
 app_name = 'usermgmt'
 
 urlpatterns = [
     path('users/', user_list, name='user_list'),
+    path('users/search/', member_search, name='member_search'),
+    path('members/export/', export_members, name='export_members'),
     path('view_document/<int:user_id>/', view_citizenship_document, name='view_citizenship_document'),
+    path('document/<str:token>/', citizenship_document, name='citizenship_document'),
+    path('document/<str:token>/thumbnail/', citizenship_document_thumbnail, name='citizenship_document_thumbnail'),
     path('manage-iwi-leaders/', manage_iwi_leaders, name='manage_iwi_leaders'),
     path('manage-hapu-leaders/', manage_hapu_leaders, name='manage_hapu_leaders'),
     path('hapu-user-approval/', hapu_user_approval, name='hapu_user_approval'),
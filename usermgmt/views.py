@@ -3,11 +3,19 @@ from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib import messages
 from core.models import CustomUser, Iwi, IwiLeader, Hapu, HapuLeader
 from django.urls import reverse
-from django.http import HttpResponseForbidden, FileResponse, Http404
+from django.http import HttpResponseForbidden, Http404, JsonResponse
 from django.conf import settings
 from core.views import send_account_approved_email, send_account_rejected_email
+from core.roles import get_role_profile, invalidate_users
+from core.documents import can_view_document, signed_document_url, document_owner_id, serve_protected_file
+from core.thumbnails import has_thumbnail, thumbnail_name
+from django.core.signing import BadSignature
+from core.membership import schedule_refresh
+from core.metrics import track_email
+from core.search import filter_members, search_members
+from .exports import members_csv_response
 from django.core.paginator import Paginator
-import os
+from django.db import transaction
 import threading
 import logging
 
@@ -16,7 +24,8 @@ logger = logging.getLogger(__name__)
 def send_email_with_logging(email_function, user, email_type):
     """Send email with error logging"""
     try:
-        email_function(user)
+        with track_email(email_type):
+            email_function(user)
         logger.info(f"Successfully sent {email_type} email to user {user.email} (ID: {user.id})")
     except Exception as e:
         logger.error(f"Failed to send {email_type} email to user {user.email} (ID: {user.id}): {str(e)}")
@@ -27,14 +36,18 @@ def is_admin(user):
 @user_passes_test(is_admin)
 def user_list(request):
     state = request.GET.get('state', '')
+    query = request.GET.get('q', '').strip()
     users = CustomUser.objects.all().order_by('-registered_at')
     if state:
         users = users.filter(state=state)
+    if query:
+        users = filter_members(users, query)
     
     # Pagination
     paginator = Paginator(users, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    _attach_thumbnails(page_obj.object_list, request.user)
     
     if request.method == 'POST':
         user_id = request.POST.get('verify_user_id')
@@ -65,42 +78,113 @@ def user_list(request):
     return render(request, 'usermgmt/user_list.html', {
         'page_obj': page_obj,
         'state': state,
+        'query': query,
         'states': CustomUser.STATE_CHOICES,
     })
 
-@user_passes_test(is_admin)
+@login_required
 def view_citizenship_document(request, user_id):
-    user = CustomUser.objects.filter(id=user_id).first()
-    if not user or not user.citizenship_document:
+    """Redirect to a short-lived signed link to a user's citizenship document"""
+    owner = CustomUser.objects.filter(id=user_id).only('id', 'hapu_id', 'citizenship_document').first()
+    if not owner or not owner.citizenship_document:
         raise Http404()
-    file_path = user.citizenship_document.path
-    if not os.path.exists(file_path):
+    if not can_view_document(request.user, owner):
+        return HttpResponseForbidden()
+    return redirect(signed_document_url(owner, request.user))
+
+def _signed_document_owner(request, token):
+    try:
+        owner_id = document_owner_id(token, request.user)
+    except (BadSignature, ValueError):
         raise Http404()
-    return FileResponse(open(file_path, 'rb'), as_attachment=False)
+    owner = CustomUser.objects.filter(id=owner_id).only('id', 'citizenship_document').first()
+    if not owner or not owner.citizenship_document:
+        raise Http404()
+    return owner
+
+@login_required
+def citizenship_document(request, token):
+    """Serve a citizenship document through a signed link"""
+    owner = _signed_document_owner(request, token)
+    return serve_protected_file(request, owner.citizenship_document.name)
+
+@login_required
+def citizenship_document_thumbnail(request, token):
+    """Serve the preview thumbnail of a citizenship document through a signed link"""
+    owner = _signed_document_owner(request, token)
+    return serve_protected_file(request, thumbnail_name(owner.citizenship_document.name))
+
+def _attach_thumbnails(users, viewer):
+    """Set ``thumbnail_url`` on the users whose document has a preview thumbnail"""
+    for user in users:
+        user.thumbnail_url = None
+        if user.citizenship_document and has_thumbnail(user.citizenship_document.name):
+            user.thumbnail_url = signed_document_url(user, viewer, thumbnail=True)
+    return users
+
+def _id_list(values):
+    """Integer ids from submitted values, skipping anything that is not a valid id"""
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+def _candidate_page(request, candidates):
+    """Page of leader candidates matching the ``q`` search term"""
+    query = request.GET.get('q', '').strip()
+    if query:
+        candidates = filter_members(candidates, query)
+    paginator = Paginator(candidates.only('id', 'full_name', 'email'), 25)
+    return query, paginator.get_page(request.GET.get('page'))
+
+def _update_leaders(request, leaders, candidates, make_leader):
+    """Add and remove the leaders selected in a POST with one INSERT and one DELETE.
+
+    Only users in ``candidates`` can be added. Returns the (added, removed)
+    counts.
+    """
+    add_ids = list(candidates.filter(pk__in=_id_list(request.POST.getlist('add_leader'))).values_list('pk', flat=True))
+    remove_ids = _id_list(request.POST.getlist('remove_leader'))
+    with transaction.atomic():
+        if add_ids:
+            # bulk_create sends no signals, so cached roles are dropped below
+            leaders.model.objects.bulk_create([make_leader(user_id) for user_id in add_ids], ignore_conflicts=True)
+        removed = leaders.filter(user_id__in=remove_ids).delete()[0] if remove_ids else 0
+    invalidate_users([*add_ids, *remove_ids])
+    return len(add_ids), removed
+
+def _leader_message(request, added, removed):
+    if added or removed:
+        messages.success(request, f'Added {added} and removed {removed} leader(s).')
 
 @user_passes_test(lambda u: u.is_authenticated and u.is_staff)
 def manage_iwi_leaders(request):
     iwis = Iwi.objects.filter(is_archived=False)
     selected_iwi_id = request.GET.get('iwi')
     selected_iwi = Iwi.objects.filter(id=selected_iwi_id, is_archived=False).first() if selected_iwi_id else None
-    users = CustomUser.objects.filter(is_staff=False)
+    query, page_obj, leaders = '', None, []
     if selected_iwi:
-        users = users.filter(iwi=selected_iwi).exclude(
+        candidates = CustomUser.objects.filter(iwi=selected_iwi, is_staff=False).exclude(
             iwi_leaderships__iwi=selected_iwi  # Exclude users who are already leaders
         ).order_by('full_name')
-    leaders = IwiLeader.objects.filter(iwi=selected_iwi) if selected_iwi else []
-    if request.method == 'POST' and selected_iwi:
-        add_user_id = request.POST.get('add_leader')
-        remove_user_id = request.POST.get('remove_leader')
-        if add_user_id:
-            user = CustomUser.objects.get(id=add_user_id)
-            IwiLeader.objects.get_or_create(iwi=selected_iwi, user=user)
-        if remove_user_id:
-            IwiLeader.objects.filter(iwi=selected_iwi, user_id=remove_user_id).delete()
-        return redirect(f'{request.path}?iwi={selected_iwi.id}')
+        leaders = IwiLeader.objects.filter(iwi=selected_iwi)
+        if request.method == 'POST':
+            added, removed = _update_leaders(
+                request, leaders, candidates, lambda user_id: IwiLeader(iwi=selected_iwi, user_id=user_id)
+            )
+            if added:
+                schedule_refresh(iwi_ids=[selected_iwi.id])
+            _leader_message(request, added, removed)
+            return redirect(f'{request.path}?{request.GET.urlencode()}')
+        query, page_obj = _candidate_page(request, candidates)
+        leaders = leaders.select_related('user').order_by('user__full_name')
     return render(request, 'usermgmt/manage_iwi_leaders.html', {
         'iwis': iwis,
-        'users': users,
+        'page_obj': page_obj,
+        'query': query,
         'selected_iwi': selected_iwi,
         'leaders': leaders,
     })
@@ -108,42 +192,37 @@ def manage_iwi_leaders(request):
 @login_required
 def manage_hapu_leaders(request):
     # Only Iwi leaders can access
-    iwi_leaderships = IwiLeader.objects.filter(user=request.user)
-    iwis = [il.iwi for il in iwi_leaderships]
-    hapus = Hapu.objects.filter(iwi__in=iwis, is_archived=False)
+    iwi_ids = get_role_profile(request.user).iwi_ids
+    hapus = Hapu.objects.filter(iwi_id__in=iwi_ids, is_archived=False).select_related('iwi')
     selected_hapu_id = request.GET.get('hapu')
-    selected_hapu = Hapu.objects.filter(id=selected_hapu_id, iwi__in=iwis, is_archived=False).first() if selected_hapu_id else None
-    
-    # Initialize empty querysets
-    users = CustomUser.objects.none()
-    leaders = []
+    selected_hapu = Hapu.objects.filter(id=selected_hapu_id, iwi_id__in=iwi_ids, is_archived=False).first() if selected_hapu_id else None
+    query, page_obj, leaders = '', None, []
     
     if selected_hapu:
-        # Get users who belong to the selected hapu and are not staff
-        users = CustomUser.objects.filter(
+        # Verified, non-staff users of the selected hapu who are not already leaders
+        candidates = CustomUser.objects.filter(
             hapu=selected_hapu,
             is_staff=False,
-            state='VERIFIED'  # Only show verified users
+            state='VERIFIED'
         ).exclude(
-            hapu_leaderships__hapu=selected_hapu  # Exclude users who are already leaders
+            hapu_leaderships__hapu=selected_hapu
         ).order_by('full_name')
-        
-        # Get current leaders for this hapu
-        leaders = HapuLeader.objects.filter(hapu=selected_hapu).select_related('user')
-    
-    if request.method == 'POST' and selected_hapu:
-        add_user_id = request.POST.get('add_leader')
-        remove_user_id = request.POST.get('remove_leader')
-        if add_user_id:
-            user = CustomUser.objects.get(id=add_user_id)
-            HapuLeader.objects.get_or_create(hapu=selected_hapu, user=user)
-        if remove_user_id:
-            HapuLeader.objects.filter(hapu=selected_hapu, user_id=remove_user_id).delete()
-        return redirect(f'{request.path}?hapu={selected_hapu.id}')
+        leaders = HapuLeader.objects.filter(hapu=selected_hapu)
+        if request.method == 'POST':
+            added, removed = _update_leaders(
+                request, leaders, candidates, lambda user_id: HapuLeader(hapu=selected_hapu, user_id=user_id)
+            )
+            if added:
+                schedule_refresh(hapu_ids=[selected_hapu.id])
+            _leader_message(request, added, removed)
+            return redirect(f'{request.path}?{request.GET.urlencode()}')
+        query, page_obj = _candidate_page(request, candidates)
+        leaders = leaders.select_related('user').order_by('user__full_name')
     
     return render(request, 'usermgmt/manage_hapu_leaders.html', {
         'hapus': hapus,
-        'users': users,
+        'page_obj': page_obj,
+        'query': query,
         'selected_hapu': selected_hapu,
         'leaders': leaders,
     })
@@ -152,18 +231,25 @@ def manage_hapu_leaders(request):
 def hapu_user_approval(request):
     """Allow hapu leaders to approve/reject users of their hapu"""
     # Check if user is a hapu leader
-    hapu_leaderships = HapuLeader.objects.filter(user=request.user)
-    if not hapu_leaderships.exists():
+    profile = get_role_profile(request.user)
+    if not profile.is_hapu_leader:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('dashboard')
     
     # Get the hapus this user leads
-    user_hapus = [hl.hapu for hl in hapu_leaderships]
+    user_hapus = list(Hapu.objects.filter(id__in=profile.hapu_ids).order_by('id'))
     
     # Get selected hapu (default to first hapu if none selected)
     selected_hapu_id = request.GET.get('hapu')
     if selected_hapu_id:
-        selected_hapu = get_object_or_404(Hapu, id=selected_hapu_id, leaders__user=request.user)
+        try:
+            selected_hapu_id = int(selected_hapu_id)
+        except ValueError:
+            raise Http404('No Hapu matches the given query.')
+        # The cached profile may still list a hapu that has since been deleted
+        selected_hapu = next((hapu for hapu in user_hapus if hapu.id == selected_hapu_id), None)
+        if selected_hapu is None or not profile.leads_hapu(selected_hapu_id):
+            raise Http404('No Hapu matches the given query.')
     else:
         selected_hapu = user_hapus[0] if user_hapus else None
     
@@ -181,6 +267,7 @@ def hapu_user_approval(request):
     paginator = Paginator(pending_users, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    _attach_thumbnails(page_obj.object_list, request.user)
     
     if request.method == 'POST':
         user_id = request.POST.get('verify_user_id')
@@ -217,3 +304,50 @@ def hapu_user_approval(request):
         'selected_hapu': selected_hapu,
         'user_hapus': user_hapus,
     })
+
+@login_required
+def member_search(request):
+    """JSON member search for admins, and for iwi leaders within the iwi they lead"""
+    profile = get_role_profile(request.user)
+    users = CustomUser.objects.all()
+    if not profile.is_staff:
+        if not profile.is_iwi_leader:
+            return HttpResponseForbidden()
+        users = users.filter(iwi_id__in=profile.iwi_ids)
+    for field in ('iwi', 'hapu'):
+        value = request.GET.get(field, '')
+        if value.isdigit():
+            users = users.filter(**{f'{field}_id': value})
+    results = search_members(request.GET.get('q', ''), users)
+    return JsonResponse({'results': [
+        {
+            'id': user.id,
+            'full_name': user.full_name,
+            'email': user.email,
+            'iwi': user.iwi.name if user.iwi else None,
+            'hapu': user.hapu.name if user.hapu else None,
+            'state': user.state,
+        }
+        for user in results
+    ]})
+
+@login_required
+def export_members(request):
+    """Stream the member roll of an iwi (?iwi=) or hapu (?hapu=) as CSV"""
+    profile = get_role_profile(request.user)
+    hapu_id = request.GET.get('hapu', '')
+    iwi_id = request.GET.get('iwi', '')
+    if hapu_id.isdigit():
+        group = get_object_or_404(Hapu, pk=hapu_id)
+        allowed = profile.is_staff or profile.can_manage_hapu(group)
+        members = CustomUser.objects.filter(hapu=group)
+    elif iwi_id.isdigit():
+        group = get_object_or_404(Iwi, pk=iwi_id)
+        allowed = profile.is_staff or profile.leads_iwi(group.pk)
+        members = CustomUser.objects.filter(iwi=group)
+    else:
+        raise Http404()
+    if not allowed:
+        return HttpResponseForbidden()
+    return members_csv_response(members, group.name)
+
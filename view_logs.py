@@ -1,61 +1,256 @@
 #!/usr/bin/env python3
 """
-Simple script to view Django logs
-Usage: python view_logs.py [log_type] [lines]
+View and filter the application logs
+Usage: python view_logs.py [email|django|PATH] [lines] [options]
 Examples:
-    python view_logs.py email 50    # Show last 50 lines of email log
-    python view_logs.py django 100  # Show last 100 lines of django log
-    python view_logs.py email       # Show all email log
+    python view_logs.py email 50                    # Last 50 entries of the email log
+    python view_logs.py django --level warning      # Warnings and errors
+    python view_logs.py django --logger core.cache  # Entries of one logger (and its children)
+    python view_logs.py django --since 2h           # The last two hours (also 30m, 1d or 2025-06-01T09:00)
+    python view_logs.py email 20 -f                 # Last 20 entries, then follow new ones
+
+Logs are JSON lines (see core/logs.py); older plain-text lines are still shown.
+The tail is read backwards from the end of the file and --since is found by
+binary search, so memory use and the amount read do not grow with the size of
+the log.
 """
 
-import sys
+import argparse
+import json
 import os
+import re
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-def view_log(log_type, lines=None):
-    """View log file with optional line limit"""
-    log_file = Path('logs') / f'{log_type}.log'
-    
-    if not log_file.exists():
-        print(f"Log file {log_file} does not exist.")
-        return
-    
+LOG_DIR = Path(__file__).resolve().parent / 'logs'
+BLOCK_SIZE = 64 * 1024
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+
+# Lines written by the former plain-text formatter: "LEVEL 2025-06-01 09:00:00,123 module ..."
+_PLAIN_LINE = re.compile(r'^(?P<level>[A-Z]+) (?P<ts>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ (?P<rest>.*)$')
+_RELATIVE = re.compile(r'^(\d+)([smhd])$')
+
+
+def parse_entry(line):
+    """The log entry on ``line`` as a dict with at least level, message and ts (an aware datetime or None)"""
+    line = line.rstrip('\r\n')
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+            entry['ts'] = datetime.fromisoformat(entry['ts']) if entry.get('ts') else None
+            return entry
+        except (ValueError, KeyError, TypeError):
+            pass
+    match = _PLAIN_LINE.match(line)
+    if match:
+        ts = datetime.strptime(match['ts'], '%Y-%m-%d %H:%M:%S').astimezone()
+        return {'ts': ts, 'level': match['level'], 'logger': '', 'message': match['rest'], 'raw': line}
+    # A continuation line (e.g. a traceback) of an old plain-text entry
+    return {'ts': None, 'level': '', 'logger': '', 'message': line, 'raw': line}
+
+
+def parse_time(value):
+    """An aware datetime from an ISO date/time (local time unless it has an offset) or a relative 30m/2h/1d"""
+    match = _RELATIVE.match(value.strip())
+    if match:
+        unit = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}[match[2]]
+        return datetime.now(timezone.utc) - timedelta(**{unit: int(match[1])})
+    try:
+        moment = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid time "{value}"; use e.g. 2h, 30m or 2025-06-01T09:00')
+    return moment if moment.tzinfo else moment.astimezone()
+
+
+class Filter:
+    def __init__(self, level=None, logger=None, since=None, until=None):
+        self.level = LEVELS[level.upper()] if level else None
+        self.logger = logger
+        self.since = since
+        self.until = until
+
+    def matches(self, entry):
+        if self.level is not None and LEVELS.get(entry['level'], 0) < self.level:
+            return False
+        if self.logger and not (entry['logger'] == self.logger or entry['logger'].startswith(self.logger + '.')):
+            return False
+        if (self.since or self.until) and entry['ts'] is None:
+            return False
+        if self.since and entry['ts'] < self.since:
+            return False
+        if self.until and entry['ts'] > self.until:
+            return False
+        return True
+
+
+def reverse_lines(file):
+    """The lines of binary ``file`` from last to first, reading one block at a time"""
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    partial = b''
+    while position > 0:
+        size = min(BLOCK_SIZE, position)
+        position -= size
+        file.seek(position)
+        lines = (file.read(size) + partial).split(b'\n')
+        # The first piece may continue in the previous block
+        partial = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line.decode('utf-8', 'replace')
+    if partial:
+        yield partial.decode('utf-8', 'replace')
+
+
+def _first_time_after(file, position):
+    """Timestamp of the first complete, timestamped line starting after byte ``position``, or None"""
+    file.seek(position)
+    if position:
+        file.readline()  # Skip the line the position falls in
+    for _ in range(100):
+        line = file.readline()
+        if not line:
+            return None
+        ts = parse_entry(line.decode('utf-8', 'replace'))['ts']
+        if ts is not None:
+            return ts
+    return None
+
+
+def seek_to_time(file, since):
+    """Position ``file`` at a line boundary at or shortly before the first entry at ``since`` or later"""
+    low, high = 0, file.seek(0, os.SEEK_END)
+    while high - low > BLOCK_SIZE:
+        middle = (low + high) // 2
+        ts = _first_time_after(file, middle)
+        if ts is None or ts >= since:
+            high = middle
+        else:
+            low = middle
+    file.seek(low)
+    if low:
+        file.readline()
+
+
+def tail(file, count, entry_filter):
+    """The last ``count`` matching entries of ``file``, oldest first"""
+    found = deque(maxlen=count)
+    for line in reverse_lines(file):
+        entry = parse_entry(line)
+        if entry_filter.since and entry['ts'] is not None and entry['ts'] < entry_filter.since:
+            break  # Everything further back is older still
+        if entry_filter.matches(entry):
+            found.appendleft(entry)
+            if len(found) == count:
+                break
+    return found
+
+
+def forward(file, entry_filter):
+    """Every matching entry of ``file`` from its current position, oldest first"""
+    for line in file:
+        entry = parse_entry(line.decode('utf-8', 'replace'))
+        if entry_filter.until and entry['ts'] is not None and entry['ts'] > entry_filter.until:
+            return
+        if entry_filter.matches(entry):
+            yield entry
+
+
+def format_entry(entry, as_json=False):
+    if 'raw' in entry:
+        return entry['raw']
+    if as_json:
+        return json.dumps({**entry, 'ts': entry['ts'].isoformat() if entry['ts'] else None}, default=str)
+    ts = entry['ts'].astimezone().strftime('%Y-%m-%d %H:%M:%S') if entry['ts'] else '-'
+    text = f"{ts} {entry['level']:<8} {entry['logger']}: {entry['message']}"
+    if entry.get('exc'):
+        text += '\n    ' + entry['exc'].replace('\n', '\n    ')
+    return text
+
+
+def follow(path, file, entry_filter, as_json, interval=0.5):
+    """Print entries appended to ``path`` until interrupted, reopening it when it is rotated"""
+    while True:
+        line = file.readline()
+        if line.endswith(b'\n'):
+            entry = parse_entry(line.decode('utf-8', 'replace'))
+            if entry_filter.matches(entry):
+                print(format_entry(entry, as_json), flush=True)
+            continue
+        # Incomplete line: wait for the rest of it
+        file.seek(-len(line), os.SEEK_CUR)
+        time.sleep(interval)
+        try:
+            rotated = os.stat(path).st_ino != os.fstat(file.fileno()).st_ino or os.path.getsize(path) < file.tell()
+        except FileNotFoundError:
+            continue
+        if rotated:
+            # Print what was written to the old file before it was moved
+            for entry in forward(file, entry_filter):
+                print(format_entry(entry, as_json), flush=True)
+            file.close()
+            file = open(path, 'rb')
+
+
+def resolve_path(log):
+    if log in ('email', 'django'):
+        return LOG_DIR / f'{log}.log'
+    return Path(log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='View and filter the application logs')
+    parser.add_argument('log', help='email, django or the path of a log file')
+    parser.add_argument('lines', nargs='?', type=int, help='Show only the last N matching entries')
+    parser.add_argument('-n', '--lines', dest='lines_option', type=int, help='Same as the positional lines')
+    parser.add_argument('--level', type=str.upper, choices=list(LEVELS), help='Minimum level')
+    parser.add_argument('--logger', help='Logger name; its child loggers are included')
+    parser.add_argument('--since', type=parse_time, help='Entries from this time: 30m, 2h, 1d or an ISO date/time')
+    parser.add_argument('--until', type=parse_time, help='Entries up to this time')
+    parser.add_argument('-f', '--follow', action='store_true', help='Keep printing new entries as they are written')
+    parser.add_argument('--json', action='store_true', help='Print entries as JSON lines')
+    args = parser.parse_args(argv)
+
+    path = resolve_path(args.log)
+    if not path.exists():
+        print(f'Log file {path} does not exist.')
+        return 1
+    lines = args.lines_option or args.lines
+    entry_filter = Filter(args.level, args.logger, args.since, args.until)
+
+    file = open(path, 'rb')
     try:
-        with open(log_file, 'r') as f:
-            log_lines = f.readlines()
-        
         if lines:
-            # Show last N lines
-            log_lines = log_lines[-lines:]
-        
-        print(f"\n=== {log_type.upper()} LOG ===")
-        print(f"File: {log_file}")
-        print(f"Total lines: {len(log_lines)}")
-        print("=" * 50)
-        
-        for line in log_lines:
-            print(line.rstrip())
-            
-    except Exception as e:
-        print(f"Error reading log file: {e}")
-
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python view_logs.py [email|django] [lines]")
-        print("Examples:")
-        print("  python view_logs.py email 50    # Show last 50 lines of email log")
-        print("  python view_logs.py django 100  # Show last 100 lines of django log")
-        print("  python view_logs.py email       # Show all email log")
-        return
-    
-    log_type = sys.argv[1]
-    lines = int(sys.argv[2]) if len(sys.argv) > 2 else None
-    
-    if log_type not in ['email', 'django']:
-        print("Log type must be 'email' or 'django'")
-        return
-    
-    view_log(log_type, lines)
+            if entry_filter.until:
+                # A tail ending in the past is read forwards from the start of the range
+                if entry_filter.since:
+                    seek_to_time(file, entry_filter.since)
+                entries = deque(forward(file, entry_filter), maxlen=lines)
+                file.seek(0, os.SEEK_END)
+            else:
+                entries = tail(file, lines, entry_filter)
+            for entry in entries:
+                print(format_entry(entry, args.json))
+        elif not args.follow or entry_filter.since:
+            if entry_filter.since:
+                seek_to_time(file, entry_filter.since)
+            for entry in forward(file, entry_filter):
+                print(format_entry(entry, args.json))
+        if args.follow:
+            file.seek(0, os.SEEK_END)
+            follow(path, file, entry_filter, args.json)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # Output piped into e.g. head, which has exited
+        sys.stderr.close()
+    finally:
+        file.close()
+    return 0
+
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    sys.exit(main())